@@ -0,0 +1,44 @@
+"""Add composite indexes for keyset pagination
+
+Revision ID: a7c3e9f1b254
+Revises: f3a8c1d5e207
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7c3e9f1b254'
+down_revision = 'f3a8c1d5e207'
+branch_labels = None
+depends_on = None
+
+# (имя индекса, таблица, колонки) - порядок колонок совпадает с KeysetOrder
+INDEXES = [
+    ('ix_products_created_at_id', 'products', 'created_at, id'),
+    ('ix_products_category_created_at_id', 'products', 'category_id, created_at, id'),
+    ('ix_product_tags_tag_id_product_id', 'product_tags', 'tag_id, product_id'),
+    ('ix_orders_user_id_created_at_id', 'orders', 'user_id, created_at, id'),
+    ('ix_orders_created_at_id', 'orders', 'created_at, id'),
+    ('ix_orders_status_created_at_id', 'orders', 'status, created_at, id'),
+    ('ix_favorites_user_id_created_at_id', 'favorites', 'user_id, created_at, id'),
+    ('ix_analysis_history_user_id_created_at_id', 'analysis_history', 'user_id, created_at, id'),
+    ('ix_analysis_history_created_at_id', 'analysis_history', 'created_at, id'),
+    ('ix_promotions_priority_created_at_id', 'promotions', 'priority, created_at, id'),
+    ('ix_promotions_created_at_id', 'promotions', 'created_at, id'),
+]
+
+
+def upgrade() -> None:
+    # CONCURRENTLY не блокирует запись в большие таблицы, но не работает в транзакции
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({columns})")
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
@@ -0,0 +1,35 @@
+"""Add stored_objects table
+
+Revision ID: b5e2d8f1c3a6
+Revises: a7c3e9f1b254
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e2d8f1c3a6'
+down_revision = 'a7c3e9f1b254'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Таблица может быть создана через Base.metadata.create_all.
+    # Изображения, загруженные до адресации по содержимому (uuid-ключи),
+    # в таблицу не попадают и удаляются как раньше - без подсчёта ссылок
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS stored_objects (
+            key VARCHAR(255) PRIMARY KEY,
+            size INTEGER NOT NULL,
+            content_type VARCHAR(100),
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('stored_objects')
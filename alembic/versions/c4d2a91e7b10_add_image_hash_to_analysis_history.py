@@ -0,0 +1,27 @@
+"""Add image_hash to analysis_history
+
+Revision ID: c4d2a91e7b10
+Revises: 8fe4d4f56e43
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d2a91e7b10'
+down_revision = '8fe4d4f56e43'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Таблица может быть создана через Base.metadata.create_all уже с колонкой
+    op.execute("ALTER TABLE analysis_history ADD COLUMN IF NOT EXISTS image_hash VARCHAR(64)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_analysis_history_image_hash ON analysis_history (image_hash)")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_analysis_history_image_hash'), table_name='analysis_history')
+    op.drop_column('analysis_history', 'image_hash')
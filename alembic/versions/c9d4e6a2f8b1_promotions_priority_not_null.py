@@ -0,0 +1,37 @@
+"""Make promotions.priority NOT NULL
+
+Revision ID: c9d4e6a2f8b1
+Revises: b5e2d8f1c3a6
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9d4e6a2f8b1'
+down_revision = 'b5e2d8f1c3a6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Keyset-курсор акций сравнивает кортежи (priority, created_at, id):
+    # с NULL сравнение не истинно, и такие акции выпадали бы из выдачи
+    op.execute("UPDATE promotions SET priority = 0 WHERE priority IS NULL")
+    op.alter_column(
+        'promotions', 'priority',
+        existing_type=sa.Integer(),
+        nullable=False,
+        server_default='0'
+    )
+
+
+def downgrade() -> None:
+    op.alter_column(
+        'promotions', 'priority',
+        existing_type=sa.Integer(),
+        nullable=True,
+        server_default=None
+    )
@@ -0,0 +1,40 @@
+"""Add analysis_jobs table
+
+Revision ID: e1f7b3c9a042
+Revises: c4d2a91e7b10
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1f7b3c9a042'
+down_revision = 'c4d2a91e7b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Таблица может быть создана через Base.metadata.create_all
+    op.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id VARCHAR(36) PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            status VARCHAR(20) NOT NULL,
+            image_url VARCHAR(500) NOT NULL,
+            image_hash VARCHAR(64),
+            analysis_id INTEGER REFERENCES analysis_history (id) ON DELETE SET NULL,
+            result JSON,
+            error TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+            updated_at TIMESTAMP WITH TIME ZONE DEFAULT now()
+        )
+    """)
+    op.execute("CREATE INDEX IF NOT EXISTS ix_analysis_jobs_user_id ON analysis_jobs (user_id)")
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_analysis_jobs_user_id'), table_name='analysis_jobs')
+    op.drop_table('analysis_jobs')
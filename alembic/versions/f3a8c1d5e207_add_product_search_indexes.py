@@ -0,0 +1,50 @@
+"""Add product full-text search vector and trigram indexes
+
+Revision ID: f3a8c1d5e207
+Revises: e1f7b3c9a042
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c1d5e207'
+down_revision = 'e1f7b3c9a042'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    # Колонка может быть создана через Base.metadata.create_all.
+    # Генерируемая колонка перезаписывает таблицу - на большом каталоге
+    # миграцию лучше запускать вне пиковой нагрузки
+    op.execute("""
+        ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+            setweight(to_tsvector('russian', coalesce(description, '')), 'B')
+        ) STORED
+    """)
+
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_tags_name_trgm ON tags USING gin (name gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_categories_name_trgm ON categories USING gin (name gin_trgm_ops)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_product_tags_tag_id ON product_tags (tag_id)")
+    op.execute("CREATE INDEX IF NOT EXISTS ix_order_items_product_id ON order_items (product_id)")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_order_items_product_id")
+    op.execute("DROP INDEX IF EXISTS ix_product_tags_tag_id")
+    op.execute("DROP INDEX IF EXISTS ix_categories_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_tags_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_category_id")
+    op.execute("DROP INDEX IF EXISTS ix_products_name_trgm")
+    op.execute("DROP INDEX IF EXISTS ix_products_search_vector")
+    op.execute("ALTER TABLE products DROP COLUMN IF EXISTS search_vector")
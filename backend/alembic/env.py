@@ -16,6 +16,7 @@ from app.models.order import Order, OrderItem, Address, OrderPromotion
 from app.models.cart import CartItem
 from app.models.favorite import Favorite
 from app.models.promotions import Promotion, PromotionCategory, PromotionProduct
+from app.models.stored_object import StoredObject
 
 config = context.config
 
@@ -1,19 +1,41 @@
 # analysis.py - исправленная версия
-from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Query, BackgroundTasks, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 import logging
+import asyncio
 import base64
+import json
 import os
-from typing import Dict, List, Optional
+from typing import TYPE_CHECKING, AsyncIterator, Dict, List, Optional, Tuple, Union
 
 from app.models.database import get_db
 from app.models.user import User
 from app.models.analysis import AnalysisHistory
-from app.api.endpoints.auth import get_current_user
-from app.schemas.analysis import Base64ImageRequest, AnalysisResponse, AnalysisHistoryResponse
+from app.api.endpoints.auth import get_current_user, get_current_admin
+from app.schemas.analysis import Base64ImageRequest, AnalysisResponse, AnalysisHistoryResponse, AnalysisJobResponse
 from app.services.analysis_history_service import AnalysisHistoryService
-from app.services.tag_service import TagService
-from app.core.file_storage import save_image_base64
+from app.services.analysis_pipeline import (
+    find_alternatives, build_analysis_response, build_response_from_record
+)
+from app.services.analysis_jobs import (
+    AnalysisJobService, analysis_results_hub, job_to_dict, JOB_QUEUE, FINAL_STATUSES
+)
+from app.services.inference_batcher import inference_batcher
+from app.services.tag_index import tag_index
+from app.services.dish_knowledge_base import dish_knowledge_base
+from app.services.inference_executor import InferenceQueueFull
+from app.services.analysis_cache import analysis_cache, compute_image_hashes
+from app.core.file_storage import delete_image, save_image_bytes
+from app.core.config import settings
+from app.core.pagination import set_next_cursor
+from app.models.database import SessionLocal
+from app.services.rabbitmq import rabbitmq_client
+
+if TYPE_CHECKING:
+    from PIL import Image
+    from app.services.image_preprocessing import PreparedImage
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -22,105 +44,54 @@ logger = logging.getLogger(__name__)
 async def analyze_base64_image(
     request: Base64ImageRequest,
     background_tasks: BackgroundTasks,
+    top_k: int = Query(1, ge=1, le=settings.ANALYSIS_MAX_TOP_K, description="Число вероятных блюд для подбора ингредиентов"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Анализ изображения в формате base64"""
     try:
         # Декодируем base64 изображение
-        if ',' in request.image_data:
-            image_bytes = base64.b64decode(request.image_data.split(',')[1])
-        else:
-            image_bytes = base64.b64decode(request.image_data)
+        image_bytes = await run_in_threadpool(_decode_base64_image, request.image_data)
         
-        logger.info(f"Analyzing image for user {current_user.id}, size: {len(image_bytes)} bytes")
+        return await _analyze_image(image_bytes, background_tasks, current_user, db, top_k)
         
-        # Анализируем изображение с помощью модели
-        from app.services.food_classification_model import FoodClassificationModel
-        food_model = FoodClassificationModel()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Food analysis error: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-        dish_result = food_model.detect_dish_with_ingredients(image_bytes)
-        
-        logger.info(f"Detected dish: {dish_result['dish_name']} with confidence: {dish_result['confidence']}")
 
-        # Ищем альтернативы продуктов
-        tag_service = TagService(db)
-
-        basic_alternatives = []
-        for ingredient in dish_result["basic_ingredients"]:
-            products = tag_service.get_products_by_tag(ingredient, current_user.id, limit=5)
-            if products:
-                basic_alternatives.append({
-                    "ingredient": ingredient,
-                    "products": products
-                })
-
-        additional_alternatives = []
-        for ingredient in dish_result["additional_ingredients"]:
-            products = tag_service.get_products_by_tag(ingredient, current_user.id, limit=3)
-            if products:
-                additional_alternatives.append({
-                    "ingredient": ingredient,
-                    "products": products
-                })
-
-        # Создаем запись в истории с новым методом
-        history_service = AnalysisHistoryService(db)
-        
-        try:
-            # Используем новый метод без image_bytes
-            history_record = history_service.create_analysis_record_simple(
-                user_id=current_user.id,
-                detected_dish=dish_result["dish_name"],
-                confidence=dish_result["confidence"],
-                ingredients={
-                    "basic": dish_result["basic_ingredients"],
-                    "additional": dish_result["additional_ingredients"]
+@router.post(
+    "/image",
+    response_model=AnalysisResponse,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
                 },
-                alternatives_found={
-                    "basic": basic_alternatives,
-                    "additional": additional_alternatives
-                }
-            )
-            logger.info(f"Analysis record created with ID: {history_record.id}")
-            
-            # Добавляем задачу на сохранение изображения в фоне
-            background_tasks.add_task(
-                save_analysis_image_background,
-                db=db,
-                history_service=history_service,
-                image_bytes=image_bytes,
-                analysis_id=history_record.id,
-                user_id=current_user.id
-            )
-            
-            analysis_id = history_record.id
-            
-        except Exception as history_error:
-            logger.error(f"Could not create analysis record: {history_error}")
-            analysis_id = 0
-
-        # Генерируем рекомендации
-        recommendations = _generate_recommendations(dish_result, basic_alternatives, additional_alternatives)
-
-        # Формируем ответ
-        response = {
-            "success": True,
-            "user_id": current_user.id,
-            "analysis_id": analysis_id,
-            "detected_dish": dish_result["dish_name"],
-            "confidence": dish_result["confidence"],
-            "message": dish_result["message"],
-            "basic_ingredients": dish_result["basic_ingredients"],
-            "additional_ingredients": dish_result["additional_ingredients"],
-            "basic_alternatives": basic_alternatives,
-            "additional_alternatives": additional_alternatives,
-            "recommendations": recommendations
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}}
+            },
+            "required": True
         }
-        
-        logger.info(f"Analysis completed. Found {len(basic_alternatives)} basic and {len(additional_alternatives)} additional alternatives")
-        
-        return response
+    }
+)
+async def analyze_image_upload(
+    request: Request,
+    background_tasks: BackgroundTasks,
+    top_k: int = Query(1, ge=1, le=settings.ANALYSIS_MAX_TOP_K, description="Число вероятных блюд для подбора ингредиентов"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Анализ изображения из multipart/form-data (поле file) или сырого тела запроса"""
+    try:
+        image_bytes = await _read_image_upload(request)
+        return await _analyze_image(image_bytes, background_tasks, current_user, db, top_k)
         
     except HTTPException:
         raise
@@ -129,26 +100,105 @@ async def analyze_base64_image(
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
 
+async def _analyze_image(
+    image_bytes: Union[bytes, bytearray],
+    background_tasks: BackgroundTasks,
+    current_user: User,
+    db: Session,
+    top_k: int = 1
+) -> Dict:
+    """Общий конвейер анализа: декодирование, кэш, модель, подбор товаров, история"""
+    logger.info(f"Analyzing image for user {current_user.id}, size: {len(image_bytes)} bytes")
+    
+    prepared, image_hash, perceptual_hash = await run_in_threadpool(_prepare_image, image_bytes)
+    history_service = AnalysisHistoryService(db)
+
+    # Повторная загрузка того же фото - возвращаем недавний анализ
+    # (в истории хранится только режим одного блюда)
+    if top_k == 1:
+        recent_record = await run_in_threadpool(
+            history_service.find_recent_duplicate, current_user.id, image_hash
+        )
+        if recent_record:
+            logger.info(f"Reusing analysis {recent_record.id} for duplicate image")
+            return build_response_from_record(recent_record, current_user.id)
+    
+    # Анализируем изображение с помощью модели (один инференс при любом top_k)
+    dish_result = await _classify_image_cached(
+        prepared.model_input, image_hash, perceptual_hash, current_user.id, top_k
+    )
+    
+    logger.info(f"Detected dish: {dish_result['dish_name']} with confidence: {dish_result['confidence']}")
+
+    # Ищем альтернативы продуктов
+    basic_alternatives, additional_alternatives = await run_in_threadpool(
+        find_alternatives, db, dish_result, current_user.id
+    )
+
+    # Создаем запись в истории с новым методом
+    try:
+        # Используем новый метод без image_bytes
+        history_record = await run_in_threadpool(
+            history_service.create_analysis_record_simple,
+            user_id=current_user.id,
+            detected_dish=dish_result["dish_name"],
+            confidence=dish_result["confidence"],
+            ingredients={
+                "basic": dish_result["basic_ingredients"],
+                "additional": dish_result["additional_ingredients"]
+            },
+            alternatives_found={
+                "basic": basic_alternatives,
+                "additional": additional_alternatives
+            },
+            # Хэш - только у записей режима одного блюда: иначе повторная загрузка
+            # с top_k=1 получила бы объединённые ингредиенты нескольких блюд
+            image_hash=image_hash if top_k == 1 else None
+        )
+        logger.info(f"Analysis record created with ID: {history_record.id}")
+        
+        # Добавляем задачу на сохранение изображения в фоне
+        background_tasks.add_task(
+            save_analysis_image_background,
+            db=db,
+            history_service=history_service,
+            image_jpeg=prepared.storage_jpeg,
+            analysis_id=history_record.id,
+            user_id=current_user.id
+        )
+        
+        analysis_id = history_record.id
+        
+    except Exception as history_error:
+        logger.error(f"Could not create analysis record: {history_error}")
+        analysis_id = 0
+
+    response = build_analysis_response(
+        current_user.id, analysis_id, dish_result, basic_alternatives, additional_alternatives
+    )
+    
+    logger.info(f"Analysis completed. Found {len(basic_alternatives)} basic and {len(additional_alternatives)} additional alternatives")
+    
+    return response
+
+
 async def save_analysis_image_background(
     db: Session,
     history_service: AnalysisHistoryService,
-    image_bytes: bytes,
+    image_jpeg: bytes,
     analysis_id: int,
     user_id: int
 ):
     """Фоновая задача для сохранения изображения анализа"""
+    image_url = None
     try:
-        # Преобразуем в base64
-        base64_image = base64.b64encode(image_bytes).decode('utf-8')
-        full_base64 = f"data:image/jpeg;base64,{base64_image}"
-        
-        # Сохраняем изображение через file_storage
-        from app.core.file_storage import save_image_base64
-        image_url = await save_image_base64(full_base64)
+        # Сохраняем уже подготовленный JPEG без повторного декодирования
+        image_url = await save_image_bytes(image_jpeg)
         
         if image_url:
             # Обновляем запись с URL изображения
-            success = history_service.update_analysis_image(
+            success = await run_in_threadpool(
+                history_service.update_analysis_image,
                 analysis_id=analysis_id,
                 user_id=user_id,
                 image_url=image_url
@@ -158,17 +208,193 @@ async def save_analysis_image_background(
                 logger.info(f"Image saved for analysis {analysis_id}: {image_url}")
             else:
                 logger.warning(f"Failed to update image URL for analysis {analysis_id}")
+                # Запись не ссылается на изображение - освобождаем его ссылку
+                await delete_image(image_url)
         else:
             logger.warning(f"Failed to save image for analysis {analysis_id}")
             
     except Exception as e:
         logger.error(f"Failed to save analysis image: {e}")
+        if image_url:
+            await delete_image(image_url)
+
+@router.get("/inference/stats")
+async def get_inference_stats(
+    current_user: User = Depends(get_current_user)
+):
+    """Метрики очереди инференса (глубина очереди, размеры пачек, задержки) и кэша"""
+    return {
+        **inference_batcher.get_stats(),
+        "cache": analysis_cache.get_stats(),
+        "tag_index": tag_index.get_stats(),
+        "knowledge_base": dish_knowledge_base.get_stats()
+    }
+
+@router.post("/knowledge-base/reload")
+async def reload_knowledge_base(
+    admin: User = Depends(get_current_admin)
+):
+    """Перечитать файл базы ингредиентов блюд в этом процессе (админ)"""
+    try:
+        await run_in_threadpool(dish_knowledge_base.load)
+    except Exception as e:
+        logger.error(f"Dish knowledge base reload failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Knowledge base reload failed: {str(e)}")
+    return dish_knowledge_base.get_stats()
+
+
+@router.post(
+    "/jobs",
+    response_model=AnalysisJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    openapi_extra={
+        "requestBody": {
+            "content": {
+                "application/json": {"schema": {"$ref": "#/components/schemas/Base64ImageRequest"}},
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {"file": {"type": "string", "format": "binary"}},
+                        "required": ["file"]
+                    }
+                },
+                "application/octet-stream": {"schema": {"type": "string", "format": "binary"}}
+            },
+            "required": True
+        }
+    }
+)
+async def create_analysis_job(
+    request: Request,
+    top_k: int = Query(1, ge=1, le=settings.ANALYSIS_MAX_TOP_K, description="Число вероятных блюд для подбора ингредиентов"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Постановка анализа в очередь: результат - GET /ai/jobs/{job_id} или SSE /ai/jobs/{job_id}/events"""
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = Base64ImageRequest(**(await request.json()))
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        image_bytes = await run_in_threadpool(_decode_base64_image, payload.image_data)
+    else:
+        image_bytes = await _read_image_upload(request)
+
+    prepared, image_hash, perceptual_hash = await run_in_threadpool(_prepare_image, image_bytes)
+    image_url = await save_image_bytes(prepared.storage_jpeg)
+
+    job_service = AnalysisJobService(db)
+    try:
+        job = await run_in_threadpool(job_service.create_job, current_user.id, image_url, image_hash)
+    except Exception:
+        await run_in_threadpool(db.rollback)
+        await delete_image(image_url)
+        raise
+
+    published = await run_in_threadpool(rabbitmq_client.publish_message, JOB_QUEUE, {
+        "job_id": job.id,
+        "user_id": current_user.id,
+        "image_url": image_url,
+        "image_hash": image_hash,
+        "perceptual_hash": perceptual_hash,
+        "top_k": top_k
+    })
+    if not published:
+        await run_in_threadpool(
+            job_service.update_job, job, status="failed", error="Analysis queue unavailable"
+        )
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis queue unavailable",
+            headers={"Retry-After": "5"}
+        )
+
+    logger.info(f"Analysis job {job.id} queued for user {current_user.id}")
+    return job_to_dict(job)
+
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Статус и результат задачи анализа"""
+    job = await run_in_threadpool(AnalysisJobService(db).get_job, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+    return job_to_dict(job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job(
+    job_id: str,
+    current_user: User = Depends(get_current_user)
+):
+    """Server-Sent Events: событие с результатом, как только задача завершится"""
+    job = await run_in_threadpool(_load_job, job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Analysis job not found")
+
+    return StreamingResponse(
+        _job_events(job_id, current_user.id, job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _load_job(job_id: str, user_id: int) -> Optional[Dict]:
+    # Отдельная сессия: поток SSE живёт дольше зависимости get_db
+    db = SessionLocal()
+    try:
+        job = AnalysisJobService(db).get_job(job_id, user_id)
+        return job_to_dict(job) if job else None
+    finally:
+        db.close()
+
+
+def _sse_event(job: Dict) -> str:
+    return f"event: {job['status']}\ndata: {json.dumps(job, default=str)}\n\n"
+
+
+async def _job_events(job_id: str, user_id: int, job: Dict):
+    """Ждём сообщение из ai_results; БД перепроверяем на случай, если
+    результат забрал consumer другого экземпляра API"""
+    if job["status"] in FINAL_STATUSES:
+        yield _sse_event(job)
+        return
+
+    queue = analysis_results_hub.subscribe(job_id)
+    try:
+        yield _sse_event(job)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.ANALYSIS_JOB_TIMEOUT_SECONDS + settings.ANALYSIS_JOB_POLL_SECONDS
+
+        while loop.time() < deadline:
+            try:
+                job = await asyncio.wait_for(queue.get(), timeout=settings.ANALYSIS_JOB_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                job = await run_in_threadpool(_load_job, job_id, user_id)
+                if job is None:
+                    return
+                if job["status"] not in FINAL_STATUSES:
+                    yield ": keep-alive\n\n"
+                    continue
+
+            if job["status"] in FINAL_STATUSES:
+                yield _sse_event(job)
+                return
+    finally:
+        analysis_results_hub.unsubscribe(job_id, queue)
+
 
 @router.get("/my-history", response_model=List[AnalysisHistoryResponse])
 async def get_my_analysis_history(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -178,18 +404,21 @@ async def get_my_analysis_history(
         
         # Используем отдельный метод для фильтрации по уверенности
         if min_confidence is not None:
-            history = history_service.get_user_analysis_history(
+            page = history_service.get_user_analysis_history(
                 user_id=current_user.id,
                 offset=skip,
                 limit=limit,
-                min_confidence=min_confidence
+                min_confidence=min_confidence,
+                cursor=cursor
             )
         else:
-            history = history_service.get_analysis_history(
+            page = history_service.get_analysis_history(
                 user_id=current_user.id,
                 offset=skip,
-                limit=limit
+                limit=limit,
+                cursor=cursor
             )
+        history = set_next_cursor(response, page)
         
         # Преобразуем в формат ответа СОГЛАСНО СХЕМЕ
         result = []
@@ -211,6 +440,8 @@ async def get_my_analysis_history(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting analysis history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get history: {str(e)}")
@@ -218,10 +449,12 @@ async def get_my_analysis_history(
 
 @router.get("/all-history", response_model=List[AnalysisHistoryResponse])
 async def get_all_analysis_history(
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=1, le=100),
     user_id: Optional[int] = Query(None, description="ID конкретного пользователя"),
     min_confidence: Optional[float] = Query(None, ge=0.0, le=1.0),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -236,12 +469,14 @@ async def get_all_analysis_history(
                 raise HTTPException(status_code=403, detail="Not authorized to view other users' history")
         
         # Используем параметры фильтрации
-        history = history_service.get_analysis_history(
+        page = history_service.get_analysis_history(
             user_id=user_id,
             offset=skip,
             limit=limit,
-            min_confidence=min_confidence
+            min_confidence=min_confidence,
+            cursor=cursor
         )
+        history = set_next_cursor(response, page)
         
         # Преобразуем в формат ответа
         result = []
@@ -261,6 +496,8 @@ async def get_all_analysis_history(
         
         return result
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting all analysis history: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get history: {str(e)}")
@@ -296,18 +533,15 @@ async def delete_analysis_record(
         if not record:
             raise HTTPException(status_code=404, detail="Record not found")
         
-        # Удаляем связанное изображение если оно есть
-        if record.image_url:
-            try:
-                from app.core.file_storage import delete_image
-                delete_image(record.image_url)
-            except Exception as img_error:
-                logger.warning(f"Could not delete analysis image: {img_error}")
-        
         # Удаляем запись из БД
+        image_url = record.image_url
         db.delete(record)
         db.commit()
         
+        # Изображение освобождаем после commit: при ошибке запись сохранит ссылку
+        if image_url:
+            await delete_image(image_url)
+        
         return {"success": True, "message": "Analysis record deleted"}
         
     except HTTPException:
@@ -317,42 +551,114 @@ async def delete_analysis_record(
         raise HTTPException(status_code=500, detail=f"Failed to delete record: {str(e)}")
 
 
-def _generate_recommendations(dish_result: Dict, basic_alts: List, additional_alts: List) -> List[str]:
-    """Генерация рекомендаций на основе результатов анализа"""
-    recommendations = []
-    
-    if dish_result["confidence"] > 0.7:
-        recommendations.append(f"Высокая уверенность в определении блюда: {dish_result['dish_name']}")
-    elif dish_result["confidence"] > 0.3:
-        recommendations.append(f"Средняя уверенность в определении блюда. Проверьте предложенные ингредиенты")
+def _decode_base64_image(image_data: str) -> bytes:
+    """Декодирование base64 (с data:-префиксом или без)"""
+    if ',' in image_data:
+        return base64.b64decode(image_data.split(',')[1])
+    return base64.b64decode(image_data)
+
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File too large. Max size: {settings.MAX_FILE_SIZE // 1024 // 1024}MB"
+    )
+
+
+async def _limited_body(request: Request, limit: int) -> AsyncIterator[bytes]:
+    """Тело запроса по кускам; превышение limit прерывает чтение (и без Content-Length)"""
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > limit:
+            raise _file_too_large()
+        yield chunk
+
+
+async def _read_image_upload(request: Request) -> bytearray:
+    """Чтение изображения из multipart или сырого тела с ограничением MAX_FILE_SIZE"""
+    # Запас на заголовки частей multipart
+    body_limit = settings.MAX_FILE_SIZE + 64 * 1024
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and int(content_length) > body_limit:
+        raise _file_too_large()
+
+    buffer = bytearray()
+    content_type = request.headers.get("content-type", "")
+
+    if content_type.startswith("multipart/form-data"):
+        from starlette.datastructures import UploadFile as StarletteUploadFile
+        from starlette.formparsers import MultiPartParser
+
+        # Разбор из ограниченного потока: тело сверх лимита не попадает во временный файл
+        parser = MultiPartParser(request.headers, _limited_body(request, body_limit), max_files=1, max_fields=10)
+        form = await parser.parse()
+        try:
+            upload = form.get("file")
+            # Парсер возвращает UploadFile Starlette (fastapi.UploadFile - его подкласс)
+            if not isinstance(upload, StarletteUploadFile):
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Field 'file' is required")
+            while chunk := await upload.read(64 * 1024):
+                buffer.extend(chunk)
+                if len(buffer) > settings.MAX_FILE_SIZE:
+                    raise _file_too_large()
+        finally:
+            await form.close()
     else:
-        recommendations.append("Низкая уверенность в определении. Попробуйте другое изображение")
-    
-    basic_found = len(basic_alts)
-    basic_total = len(dish_result["basic_ingredients"])
-    
-    if basic_found == basic_total:
-        recommendations.append("✅ Найдены все основные ингредиенты!")
-    elif basic_found > 0:
-        recommendations.append(f"🔍 Найдено {basic_found} из {basic_total} основных ингредиентов")
+        async for chunk in _limited_body(request, settings.MAX_FILE_SIZE):
+            buffer.extend(chunk)
+
+    if not buffer:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty image")
+    return buffer
+
+
+def _prepare_image(image_bytes: Union[bytes, bytearray]) -> Tuple["PreparedImage", str, Optional[str]]:
+    """Однократное декодирование изображения и вычисление его хэшей"""
+    from app.services.image_preprocessing import prepare_image
+
+    try:
+        prepared = prepare_image(image_bytes)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Invalid image for analysis: {e}")
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image data")
+    image_hash, perceptual_hash = compute_image_hashes(image_bytes, prepared.model_input)
+    return prepared, image_hash, perceptual_hash
+
+
+async def _classify_image(image: "Image.Image") -> Dict:
+    """Распознавание блюда через очередь инференса с отказом при перегрузке"""
+    try:
+        return await inference_batcher.classify(image)
+    except InferenceQueueFull:
+        logger.warning("Inference queue is full, rejecting analysis request")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis service is overloaded, try again later",
+            headers={"Retry-After": "1"}
+        )
+
+
+async def _classify_image_cached(
+    image: "Image.Image",
+    image_hash: str,
+    perceptual_hash: Optional[str],
+    user_id: int,
+    top_k: int = 1
+) -> Dict:
+    """Распознавание с кэшем по SHA-256/перцептивному хэшу изображения"""
+    dish_result = await run_in_threadpool(analysis_cache.get, image_hash, perceptual_hash, user_id)
+    if dish_result is not None:
+        logger.info(f"Analysis cache hit for image {image_hash[:12]}")
     else:
-        recommendations.append("❌ Основные ингредиенты не найдены в магазине")
-    
-    additional_found = len(additional_alts)
-    if additional_found > 0:
-        recommendations.append(f"✨ Найдено {additional_found} дополнительных ингредиентов для улучшения блюда")
-    
-    # Добавляем рекомендации на основе ингредиентов
-    if "соль" in [ing.lower() for ing in dish_result["basic_ingredients"]]:
-        recommendations.append("🧂 Для этого блюда понадобится соль")
-    
-    if "перец" in [ing.lower() for ing in dish_result["basic_ingredients"]]:
-        recommendations.append("🌶️ Не забудьте про перец для вкуса")
-    
-    if len(recommendations) < 3:
-        recommendations.append("🍽️ Приятного аппетита!")
-    
-    return recommendations
+        dish_result = await _classify_image(image)
+
+        # Ошибки модели (confidence == 0) не кэшируем
+        if dish_result["confidence"] > 0:
+            await run_in_threadpool(analysis_cache.set, image_hash, perceptual_hash, dish_result, user_id)
+
+    # Ингредиенты - по текущей версии базы и запрошенному top_k
+    return dish_knowledge_base.attach_ingredients(dish_result, top_k)
 
 
 # Упрощенная версия без BackgroundTasks
@@ -365,56 +671,45 @@ async def analyze_base64_image_simple(
     """Упрощенная версия анализа"""
     try:
         # Декодируем base64 изображение
-        if ',' in request.image_data:
-            image_bytes = base64.b64decode(request.image_data.split(',')[1])
-        else:
-            image_bytes = base64.b64decode(request.image_data)
+        image_bytes = await run_in_threadpool(_decode_base64_image, request.image_data)
         
         logger.info(f"Analyzing image for user {current_user.id}, size: {len(image_bytes)} bytes")
         
-        # Анализируем изображение
-        from app.services.food_classification_model import FoodClassificationModel
-        food_model = FoodClassificationModel()
+        prepared, image_hash, perceptual_hash = await run_in_threadpool(_prepare_image, image_bytes)
+        history_service = AnalysisHistoryService(db)
+
+        recent_record = await run_in_threadpool(
+            history_service.find_recent_duplicate, current_user.id, image_hash
+        )
+        if recent_record:
+            return build_response_from_record(recent_record, current_user.id)
         
-        dish_result = food_model.detect_dish_with_ingredients(image_bytes)
+        # Анализируем изображение
+        dish_result = await _classify_image_cached(
+            prepared.model_input, image_hash, perceptual_hash, current_user.id
+        )
         
         # Ищем альтернативы продуктов
-        tag_service = TagService(db)
-        
-        basic_alternatives = []
-        for ingredient in dish_result["basic_ingredients"]:
-            products = tag_service.get_products_by_tag(ingredient, current_user.id, limit=5)
-            if products:
-                basic_alternatives.append({
-                    "ingredient": ingredient,
-                    "products": products
-                })
-        
-        additional_alternatives = []
-        for ingredient in dish_result["additional_ingredients"]:
-            products = tag_service.get_products_by_tag(ingredient, current_user.id, limit=3)
-            if products:
-                additional_alternatives.append({
-                    "ingredient": ingredient,
-                    "products": products
-                })
+        basic_alternatives, additional_alternatives = await run_in_threadpool(
+            find_alternatives, db, dish_result, current_user.id
+        )
         
         # Сохраняем изображение
         image_url = None
         try:
-            base64_image = base64.b64encode(image_bytes).decode('utf-8')
-            full_base64 = f"data:image/jpeg;base64,{base64_image}"
-            image_url = await save_image_base64(full_base64)
+            image_url = await save_image_bytes(prepared.storage_jpeg)
         except Exception as img_error:
             logger.warning(f"Could not save image: {img_error}")
         
         # Создаем запись в истории
-        history_service = AnalysisHistoryService(db)
         analysis_id = 0
+        image_attached = False
         
         try:
-            history_record = history_service.create_analysis_record(
+            history_record = await run_in_threadpool(
+                history_service.create_analysis_record,
                 user_id=current_user.id,
+                image_bytes=image_bytes,
                 detected_dish=dish_result["dish_name"],
                 confidence=dish_result["confidence"],
                 ingredients={
@@ -431,32 +726,24 @@ async def analyze_base64_image_simple(
             # Если изображение было сохранено, обновляем запись
             if image_url and history_record:
                 history_record.image_url = image_url
-                db.commit()
+                await run_in_threadpool(db.commit)
+                image_attached = True
                 logger.info(f"Image saved for analysis {analysis_id}")
             
         except Exception as history_error:
             logger.error(f"History creation error: {history_error}")
+            await run_in_threadpool(db.rollback)
         
-        # Генерируем рекомендации
-        recommendations = _generate_recommendations(dish_result, basic_alternatives, additional_alternatives)
+        if image_url and not image_attached:
+            # Ни одна запись не ссылается на сохранённое изображение
+            await delete_image(image_url)
         
-        # Формируем ответ
-        response = {
-            "success": True,
-            "user_id": current_user.id,
-            "analysis_id": analysis_id,
-            "detected_dish": dish_result["dish_name"],
-            "confidence": dish_result["confidence"],
-            "message": dish_result["message"],
-            "basic_ingredients": dish_result["basic_ingredients"],
-            "additional_ingredients": dish_result["additional_ingredients"],
-            "basic_alternatives": basic_alternatives,
-            "additional_alternatives": additional_alternatives,
-            "recommendations": recommendations
-        }
-        
-        return response
+        return build_analysis_response(
+            current_user.id, analysis_id, dish_result, basic_alternatives, additional_alternatives
+        )
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Food analysis error: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
\ No newline at end of file
@@ -9,6 +9,7 @@ from app.models.user import User
 from app.schemas.cart import CartItemResponse, CartItemCreate, CartItemUpdate, CartResponse
 from app.api.endpoints.auth import get_current_user
 from app.services.promotion_service import PromotionService
+from app.core.query_options import cart_item_response_options
 
 router = APIRouter()
 
@@ -18,7 +19,7 @@ async def get_cart(
     current_user: User = Depends(get_current_user)
 ):
     """Получение корзины пользователя с учетом скидок"""
-    cart_items = db.query(CartItem).filter(
+    cart_items = db.query(CartItem).options(*cart_item_response_options()).filter(
         CartItem.user_id == current_user.id
     ).order_by(CartItem.created_at.desc()).all()
     
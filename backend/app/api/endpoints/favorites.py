@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
@@ -8,22 +8,32 @@ from app.models.product import Product
 from app.models.user import User
 from app.schemas.favorite import FavoriteResponse, FavoriteWithProductResponse, FavoriteCreate
 from app.api.endpoints.auth import get_current_user
+from app.core.pagination import KeysetOrder, paginate, set_next_cursor
+from app.core.query_options import favorite_response_options
 
 router = APIRouter()
 
+FAVORITES_ORDER = KeysetOrder("favorites", (Favorite.created_at, Favorite.id))
+
 @router.get("/", response_model=List[FavoriteWithProductResponse])
 async def get_favorites(
+    response: Response,
     search: Optional[str] = Query(None, description="Поиск по названию товара"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Размер страницы; без него - весь список"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """Получить список избранных товаров пользователя с возможностью поиска"""
-    query = db.query(Favorite).filter(Favorite.user_id == current_user.id)
+    query = db.query(Favorite).options(*favorite_response_options()).filter(
+        Favorite.user_id == current_user.id
+    )
     
     if search:
         query = query.join(Product).filter(Product.name.ilike(f"%{search}%"))
     
-    favorites = query.all()
+    page = paginate(query, FAVORITES_ORDER, limit, cursor=cursor)
+    favorites = set_next_cursor(response, page)
     
     result = []
     for favorite in favorites:
@@ -1,20 +1,119 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Response
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Request, Response
 from sqlalchemy.orm import Session
 import base64
 import io
-from minio.error import S3Error
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
 
 from app.models.database import get_db
 from app.models.product import Product, Category
 from app.models.analysis import AnalysisHistory
 from app.models.user import User
-from app.core.file_storage import save_image_base64, delete_image, save_image
-from app.core.minio_client import minio_client
+from app.core.file_storage import save_image_base64, delete_image, save_image, image_cache_control, is_content_addressed
+from app.core.config import settings
+from app.core.image_streaming import stream_object
+from app.core.presigned_urls import presigned_urls
+from app.services.image_variants import image_variant_pipeline, select_variant
+from app.services.catalog_cache import catalog_cache, PRODUCTS, CATEGORIES
 from app.api.endpoints.auth import get_current_user
 from app.schemas.image import ImageBase64
 
 router = APIRouter()
 
+IMAGE_CORS_HEADERS = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET, OPTIONS",
+    "Access-Control-Allow-Headers": "*"
+}
+
+# Ширина варианта для списков; без параметра отдаётся оригинал
+VARIANT_WIDTH_QUERY = Query(None, ge=1, le=4096, description="Ширина варианта (WebP/AVIF по Accept)")
+
+
+# (таблица, id) -> (версии каталога, срок, image_url): горячие изображения
+# отдаются без запроса к БД, пока не изменились товары/категории
+_IMAGE_URLS: "OrderedDict[Tuple[str, int], Tuple[str, float, Optional[str]]]" = OrderedDict()
+_IMAGE_URLS_MAX_ENTRIES = 4096
+
+
+def _lookup_image_url(db: Session, model, object_id: int, scopes: Tuple[str, ...]) -> Optional[str]:
+    if not catalog_cache.enabled:
+        return db.query(model.image_url).filter(model.id == object_id).scalar()
+
+    cache_key = (model.__tablename__, object_id)
+    version = catalog_cache.version_tag(scopes)
+    cached = _IMAGE_URLS.get(cache_key)
+    if cached is not None and cached[0] == version and cached[1] > time.monotonic():
+        _IMAGE_URLS.move_to_end(cache_key)
+        return cached[2]
+
+    image_url = db.query(model.image_url).filter(model.id == object_id).scalar()
+    _IMAGE_URLS[cache_key] = (
+        version,
+        time.monotonic() + settings.CATALOG_CACHE_LOCAL_TTL_SECONDS,
+        image_url
+    )
+    _IMAGE_URLS.move_to_end(cache_key)
+    while len(_IMAGE_URLS) > _IMAGE_URLS_MAX_ENTRIES:
+        _IMAGE_URLS.popitem(last=False)
+    return image_url
+
+
+def _image_response_headers(filename: str, width: Optional[int]):
+    headers = {"Content-Disposition": f"inline; filename={filename}", **IMAGE_CORS_HEADERS}
+    if width:
+        # Формат варианта зависит от Accept
+        headers["Vary"] = "Accept"
+    return headers
+
+
+async def _replace_image(db: Session, entity, image_url: str):
+    """Сохраняет новый URL изображения; старое освобождается после commit,
+    при ошибке commit - новое, на которое никто не сослался"""
+    old_image_url = entity.image_url
+    entity.image_url = image_url
+    try:
+        db.commit()
+    except Exception:
+        db.rollback()
+        await delete_image(image_url)
+        raise
+    if old_image_url:
+        # После commit: повторная загрузка того же изображения не удаляет общий объект
+        await delete_image(old_image_url)
+
+
+async def _serve_image(
+    request: Request,
+    filename: str,
+    width: Optional[int],
+    cache_control: str = settings.IMAGE_CACHE_CONTROL
+) -> Response:
+    """С ?w= - уменьшенный вариант, пока его нет - оригинал"""
+    variant = select_variant(filename, width, request.headers.get("accept"))
+    headers = _image_response_headers(filename, width)
+    fallback = filename if variant else None
+    if variant:
+        # Ответ зависит от того, построен ли уже вариант
+        cache_control = settings.IMAGE_CACHE_CONTROL
+
+    if settings.IMAGE_DELIVERY == "redirect":
+        # 307 на подписанную ссылку MinIO - байты идут мимо воркера
+        redirect = await presigned_urls.redirect(variant or filename, headers, fallback=fallback)
+        if redirect is not None:
+            return redirect
+
+    # Потоком из MinIO: Range, 304 и Content-Type из метаданных объекта
+    return await stream_object(
+        request,
+        variant or filename,
+        cache_control,
+        headers,
+        fallback=fallback
+    )
+
+
 @router.post("/products/{product_id}/image")
 async def upload_product_image(
     product_id: int,
@@ -33,13 +132,11 @@ async def upload_product_image(
         )
     
     try:
-        if product.image_url:
-            delete_image(product.image_url)
-        
         image_url = await save_image_base64(image_data.image_data)
         
-        product.image_url = image_url
-        db.commit()
+        await _replace_image(db, product, image_url)
+        catalog_cache.invalidate(PRODUCTS)
+        image_variant_pipeline.schedule(image_url)
         
         return {
             "message": "Image uploaded successfully to MinIO",
@@ -70,13 +167,11 @@ async def upload_product_image_file(
         )
     
     try:
-        if product.image_url:
-            delete_image(product.image_url)
-        
         image_url = await save_image(file)
         
-        product.image_url = image_url
-        db.commit()
+        await _replace_image(db, product, image_url)
+        catalog_cache.invalidate(PRODUCTS)
+        image_variant_pipeline.schedule(image_url)
         
         return {
             "message": "Image file uploaded successfully to MinIO",
@@ -92,55 +187,27 @@ async def upload_product_image_file(
 @router.get("/products/{product_id}/image")
 async def get_product_image(
     product_id: int,
+    request: Request,
+    w: Optional[int] = VARIANT_WIDTH_QUERY,
     db: Session = Depends(get_db)
 ):
     """Получение изображения товара по ID товара"""
     try:
-        product = db.query(Product).filter(Product.id == product_id).first()
-        if not product or not product.image_url:
+        image_url = _lookup_image_url(db, Product, product_id, (PRODUCTS,))
+        if not image_url:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Product or image not found"
             )
         
-        filename = product.image_url.split('/')[-1]
+        filename = image_url.split('/')[-1]
         if not filename:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Image filename not found"
             )
 
-        try:
-            response = minio_client.client.get_object(
-                minio_client.bucket_name,
-                filename
-            )
-            
-            image_data = response.read()
-            
-            # Используем Response вместо StreamingResponse
-            return Response(
-                content=image_data,
-                media_type="image/jpeg",
-                headers={
-                    "Content-Disposition": f"inline; filename={filename}",
-                    "Cache-Control": "public, max-age=3600",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-            
-        except Exception as e:
-            print(f"MinIO error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Image not found in storage"
-            )
-        finally:
-            if 'response' in locals():
-                response.close()
-                response.release_conn()
+        return await _serve_image(request, filename, w)
                 
     except HTTPException:
         raise
@@ -179,13 +246,11 @@ async def upload_category_image_base64(
         )
     
     try:
-        if category.image_url:
-            delete_image(category.image_url)
-        
         image_url = await save_image_base64(image_data.image_data)
 
-        category.image_url = image_url
-        db.commit()
+        await _replace_image(db, category, image_url)
+        catalog_cache.invalidate(CATEGORIES, PRODUCTS)
+        image_variant_pipeline.schedule(image_url)
         
         return {
             "message": "Category image uploaded successfully to MinIO",
@@ -225,16 +290,13 @@ async def upload_category_image_file(
         )
     
     try:
-        # Удаляем старое изображение, если оно есть
-        if category.image_url:
-            delete_image(category.image_url)
-        
         # Сохраняем новое изображение
         image_url = await save_image(file)
         
         # Обновляем URL изображения в категории
-        category.image_url = image_url
-        db.commit()
+        await _replace_image(db, category, image_url)
+        catalog_cache.invalidate(CATEGORIES, PRODUCTS)
+        image_variant_pipeline.schedule(image_url)
         
         return {
             "message": "Category image file uploaded successfully to MinIO",
@@ -251,71 +313,28 @@ async def upload_category_image_file(
 @router.get("/categories/{category_id}/image")
 async def get_category_image(
     category_id: int,
+    request: Request,
+    w: Optional[int] = VARIANT_WIDTH_QUERY,
     db: Session = Depends(get_db)
 ):
     """Получение изображения категории по ID категории"""
     try:
-        category = db.query(Category).filter(Category.id == category_id).first()
-        if not category or not category.image_url:
+        image_url = _lookup_image_url(db, Category, category_id, (CATEGORIES,))
+        if not image_url:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Category or image not found"
             )
         
         # Извлекаем имя файла из URL
-        filename = category.image_url.split('/')[-1]
+        filename = image_url.split('/')[-1]
         if not filename:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Image filename not found"
             )
 
-        try:
-            # Получаем изображение из MinIO
-            response = minio_client.client.get_object(
-                minio_client.bucket_name,
-                filename
-            )
-            
-            image_data = response.read()
-            
-            # Определяем Content-Type на основе расширения файла
-            content_type = "image/jpeg"  # значение по умолчанию
-            if filename.lower().endswith('.png'):
-                content_type = "image/png"
-            elif filename.lower().endswith('.gif'):
-                content_type = "image/gif"
-            elif filename.lower().endswith('.webp'):
-                content_type = "image/webp"
-            
-            return Response(
-                content=image_data,
-                media_type=content_type,
-                headers={
-                    "Content-Disposition": f"inline; filename={filename}",
-                    "Cache-Control": "public, max-age=3600",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-            
-        except S3Error as e:
-            print(f"MinIO error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Image not found in storage"
-            )
-        except Exception as e:
-            print(f"Error reading image: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="Error retrieving image"
-            )
-        finally:
-            if 'response' in locals():
-                response.close()
-                response.release_conn()
+        return await _serve_image(request, filename, w)
                 
     except HTTPException:
         raise
@@ -349,12 +368,15 @@ async def delete_category_image(
         )
     
     try:
-        # Удаляем изображение из хранилища
-        delete_image(category.image_url)
-        
+        old_image_url = category.image_url
+
         # Очищаем поле image_url в категории
         category.image_url = None
         db.commit()
+
+        # Освобождаем ссылку на объект (удаляется, если он больше нигде не используется)
+        await delete_image(old_image_url)
+        catalog_cache.invalidate(CATEGORIES, PRODUCTS)
         
         return {
             "message": "Category image deleted successfully",
@@ -407,13 +429,9 @@ async def upload_analysis_image_base64(
         )
     
     try:
-        if analysis.image_url:
-            delete_image(analysis.image_url)
-        
         image_url = await save_image_base64(image_data.image_data)
         
-        analysis.image_url = image_url
-        db.commit()
+        await _replace_image(db, analysis, image_url)
         
         return {
             "message": "Analysis image uploaded successfully to MinIO",
@@ -459,13 +477,9 @@ async def upload_analysis_image_file(
         )
     
     try:
-        if analysis.image_url:
-            delete_image(analysis.image_url)
-        
         image_url = await save_image(file)
         
-        analysis.image_url = image_url
-        db.commit()
+        await _replace_image(db, analysis, image_url)
         
         return {
             "message": "Analysis image file uploaded successfully to MinIO",
@@ -481,6 +495,7 @@ async def upload_analysis_image_file(
 @router.get("/analysis/{analysis_id}/image")
 async def get_analysis_image(
     analysis_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
     """Получение изображения анализа по ID анализа"""
@@ -499,45 +514,13 @@ async def get_analysis_image(
                 detail="Image filename not found"
             )
 
-        try:
-            response = minio_client.client.get_object(
-                minio_client.bucket_name,
-                filename
-            )
-            
-            image_data = response.read()
-            
-            # Определяем Content-Type на основе расширения файла
-            content_type = "image/jpeg"  # значение по умолчанию
-            if filename.lower().endswith('.png'):
-                content_type = "image/png"
-            elif filename.lower().endswith('.gif'):
-                content_type = "image/gif"
-            elif filename.lower().endswith('.webp'):
-                content_type = "image/webp"
-            
-            return Response(
-                content=image_data,
-                media_type=content_type,
-                headers={
-                    "Content-Disposition": f"inline; filename={filename}",
-                    "Cache-Control": "public, max-age=3600",
-                    "Access-Control-Allow-Origin": "*",
-                    "Access-Control-Allow-Methods": "GET, OPTIONS",
-                    "Access-Control-Allow-Headers": "*"
-                }
-            )
-            
-        except Exception as e:
-            print(f"MinIO error: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Image not found in storage"
-            )
-        finally:
-            if 'response' in locals():
-                response.close()
-                response.release_conn()
+        # Потоком из MinIO: Range, 304 и Content-Type из метаданных объекта
+        return await stream_object(
+            request,
+            filename,
+            settings.IMAGE_CACHE_CONTROL,
+            {"Content-Disposition": f"inline; filename={filename}", **IMAGE_CORS_HEADERS}
+        )
                 
     except HTTPException:
         raise
@@ -577,12 +560,14 @@ async def delete_analysis_image(
         )
     
     try:
-        # Удаляем изображение из хранилища
-        delete_image(analysis.image_url)
-        
+        old_image_url = analysis.image_url
+
         # Очищаем поле image_url в анализе
         analysis.image_url = None
         db.commit()
+
+        # Освобождаем ссылку на объект (удаляется, если он больше нигде не используется)
+        await delete_image(old_image_url)
         
         return {
             "message": "Analysis image deleted successfully",
@@ -605,4 +590,23 @@ async def options_analysis_image():
             "Access-Control-Allow-Methods": "GET, POST, DELETE, OPTIONS",
             "Access-Control-Allow-Headers": "*"
         }
-    )
\ No newline at end of file
+    )
+
+
+@router.get("/objects/{key}")
+async def get_object_image(
+    key: str,
+    request: Request,
+    w: Optional[int] = VARIANT_WIDTH_QUERY
+):
+    """Изображение по ключу объекта из image_url (без запроса к БД).
+
+    Ключ по содержимому (<sha256>.jpg) не меняется, поэтому оригинал
+    отдаётся с Cache-Control: immutable.
+    """
+    if not is_content_addressed(key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Image not found"
+        )
+    return await _serve_image(request, key, w, image_cache_control(key))
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func
 from typing import List, Optional
 from datetime import datetime
@@ -10,9 +10,14 @@ from app.models.product import Product
 from app.models.user import User
 from app.schemas.order import OrderResponse, OrderCreate, OrderUpdate
 from app.api.endpoints.auth import get_current_user, get_current_admin
+from app.core.pagination import KeysetOrder, paginate, set_next_cursor
+from app.core.query_options import order_response_options
+from app.services.catalog_cache import catalog_cache, PRODUCTS
 
 router = APIRouter()
 
+ORDERS_ORDER = KeysetOrder("orders", (Order.created_at, Order.id))
+
 @router.post("/", response_model=OrderResponse)
 async def create_order(
     order_data: OrderCreate,
@@ -23,12 +28,19 @@ async def create_order(
 
     total_amount = 0
     order_items = []
+
+    # Все товары заказа одним запросом
+    product_ids = [item.product_id for item in order_data.items]
+    products = {
+        product.id: product
+        for product in db.query(Product).filter(
+            Product.id.in_(product_ids),
+            Product.is_active == True
+        ).all()
+    }
     
     for item in order_data.items:
-        product = db.query(Product).filter(
-            Product.id == item.product_id,
-            Product.is_active == True
-        ).first()
+        product = products.get(item.product_id)
         
         if not product:
             raise HTTPException(
@@ -68,29 +80,30 @@ async def create_order(
     db.add_all(order_items)
 
     for item in order_data.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        product.stock_quantity -= item.quantity
+        products[item.product_id].stock_quantity -= item.quantity
     
     db.commit()
-    db.refresh(order)
+    # Остаток входит в ответы каталога
+    catalog_cache.invalidate(PRODUCTS)
     
-    return order
+    return db.query(Order).options(*order_response_options()).filter(Order.id == order.id).first()
 
 @router.get("/", response_model=List[OrderResponse])
 async def get_my_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """Получение списка заказов текущего пользователя"""
-    orders = db.query(Order).filter(
+    query = db.query(Order).filter(
         Order.user_id == current_user.id
-    ).options(
-        joinedload(Order.items).joinedload(OrderItem.product) 
-    ).order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
+    ).options(*order_response_options())
     
-    return orders
+    page = paginate(query, ORDERS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 @router.get("/{order_id}", response_model=OrderResponse)
 async def get_order(
@@ -102,9 +115,7 @@ async def get_order(
     order = db.query(Order).filter(
         Order.id == order_id,
         Order.user_id == current_user.id
-    ).options(
-        joinedload(Order.items).joinedload(OrderItem.product) 
-    ).first()
+    ).options(*order_response_options()).first()
     
     if not order:
         raise HTTPException(
@@ -139,9 +150,8 @@ async def update_order(
     
     order.updated_at = datetime.utcnow()
     db.commit()
-    db.refresh(order)
     
-    return order
+    return db.query(Order).options(*order_response_options()).filter(Order.id == order.id).first()
 
 @router.delete("/{order_id}")
 async def cancel_order(
@@ -154,7 +164,7 @@ async def cancel_order(
         Order.id == order_id,
         Order.user_id == current_user.id,
         Order.status == 'pending'
-    ).first()
+    ).options(selectinload(Order.items).selectinload(OrderItem.product)).first()
     
     if not order:
         raise HTTPException(
@@ -163,15 +173,16 @@ async def cancel_order(
         )
 
     for item in order.items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        if product:
-            product.stock_quantity += item.quantity
+        if item.product:
+            item.product.stock_quantity += item.quantity
     
     # Меняем статус заказа
     order.status = 'cancelled'
     order.updated_at = datetime.utcnow()
     
     db.commit()
+    # Остаток входит в ответы каталога
+    catalog_cache.invalidate(PRODUCTS)
     
     return {"message": "Order cancelled successfully"}
 
@@ -179,22 +190,22 @@ async def cancel_order(
 
 @router.get("/admin/orders", response_model=List[OrderResponse])
 async def get_all_orders(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     status: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
     """Получение всех заказов (админ)"""
-    query = db.query(Order).options(
-        joinedload(Order.items).joinedload(OrderItem.product)
-    )
+    query = db.query(Order).options(*order_response_options())
     
     if status:
         query = query.filter(Order.status == status)
     
-    orders = query.order_by(Order.created_at.desc()).offset(skip).limit(limit).all()
-    return orders
+    page = paginate(query, ORDERS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 @router.put("/admin/orders/{order_id}/status")
 async def update_order_status(
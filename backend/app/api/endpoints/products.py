@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from pydantic import TypeAdapter
 from typing import List, Optional
 
 from app.models.database import get_db
@@ -13,18 +14,42 @@ from app.schemas.product import (
 )
 from app.api.endpoints.auth import get_current_user, get_current_admin
 from app.models.user import User
+from app.services.product_search import ProductSearchService
+from app.core.pagination import KeysetOrder, cursor_headers, paginate, set_next_cursor
+from app.core.query_options import product_response_options
+from app.core.http_cache import format_http_date
+from app.services.catalog_cache import (
+    catalog_cache, serialize, PRODUCTS, CATEGORIES, TAGS, SCOPES
+)
 
 router = APIRouter()
 
+# Порядок выдачи каталога: новые товары первыми
+PRODUCTS_ORDER = KeysetOrder("products", (Product.created_at, Product.id))
+# Товары тега - по id (индекс product_tags (tag_id, product_id))
+TAG_PRODUCTS_ORDER = KeysetOrder("tag_products", (Product.id,), descending=False)
+
+# Схемы кэшируемых ответов каталога (сериализуются один раз при промахе)
+PRODUCT_ADAPTER = TypeAdapter(ProductResponse)
+PRODUCT_LIST_ADAPTER = TypeAdapter(List[ProductResponse])
+CATEGORY_LIST_ADAPTER = TypeAdapter(List[CategoryResponse])
+TAG_LIST_ADAPTER = TypeAdapter(List[TagResponse])
+
 @router.get("/categories", response_model=List[CategoryResponse])
 async def get_categories(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     db: Session = Depends(get_db)
 ):
     """Получение списка категорий"""
-    categories = db.query(Category).offset(skip).limit(limit).all()
-    return categories
+    def load():
+        categories = db.query(Category).offset(skip).limit(limit).all()
+        return serialize(CATEGORY_LIST_ADAPTER, categories)
+
+    return await catalog_cache.get_or_load(
+        "categories", {"skip": skip, "limit": limit}, (CATEGORIES,), load, request
+    )
 
 @router.post("/categories", response_model=CategoryResponse)
 async def create_category(
@@ -37,64 +62,92 @@ async def create_category(
     db.add(category)
     db.commit()
     db.refresh(category)
+    catalog_cache.invalidate(CATEGORIES)
     return category
 
 @router.get("/", response_model=List[ProductResponse])
 async def get_products(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     category_id: Optional[int] = Query(None, description="Фильтр по категории"),
-    search: Optional[str] = Query(None, description="Поиск по названию"),
+    search: Optional[str] = Query(None, description="Поиск по названию, описанию, тегам и категории"),
+    sort: str = Query("relevance", pattern="^(relevance|price_asc|price_desc|popularity)$", description="Сортировка результатов поиска"),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
-    """Получение списка товаров с фильтрацией"""
-    query = db.query(Product).filter(Product.is_active == True)
-    
-    if category_id:
-        query = query.filter(Product.category_id == category_id)
-    
-    if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
-    
-    products = query.offset(skip).limit(limit).all()
-    return products
+    """Получение списка товаров с фильтрацией.
+
+    Страницы - по курсору (X-Next-Cursor); skip остаётся для совместимости.
+    Результаты поиска ранжируются по релевантности и листаются через skip.
+    """
+    def load():
+        if search and search.strip():
+            products = ProductSearchService(db).search(
+                search, category_id=category_id, sort=sort, limit=limit, offset=skip
+            )
+            return serialize(PRODUCT_LIST_ADAPTER, products)
+
+        query = db.query(Product).options(*product_response_options()).filter(Product.is_active == True)
+
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+
+        page = paginate(query, PRODUCTS_ORDER, limit, cursor=cursor, skip=skip)
+        return serialize(PRODUCT_LIST_ADAPTER, page.items, cursor_headers(page))
+
+    params = {
+        "skip": skip, "limit": limit, "category_id": category_id,
+        "search": search, "sort": sort, "cursor": cursor
+    }
+    return await catalog_cache.get_or_load("products", params, SCOPES, load, request)
 
 @router.get("/search", response_model=List[ProductResponse])
 async def search_products(
+    response: Response,
     name: Optional[str] = Query(None, min_length=1, max_length=100),
     category_id: Optional[int] = Query(None),
+    sort: str = Query("relevance", pattern="^(relevance|price_asc|price_desc|popularity)$"),
     limit: int = Query(100, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """
-    Расширенный поиск продуктов
+    Расширенный поиск продуктов: полнотекстовый с учётом опечаток,
+    по названию, описанию, тегам и категории
     """
-    query = db.query(Product).filter(Product.is_active == True)
-    
-    if name:
-        name_term = f"%{name.strip()}%"
-        query = query.filter(Product.name.ilike(name_term))
+    if name and name.strip():
+        return ProductSearchService(db).search(
+            name, category_id=category_id, sort=sort, limit=limit, offset=offset
+        )
+
+    query = db.query(Product).options(*product_response_options()).filter(Product.is_active == True)
     
     if category_id:
         query = query.filter(Product.category_id == category_id)
     
-    products = query.offset(offset).limit(limit).all()
-    return products
+    page = paginate(query, PRODUCTS_ORDER, limit, cursor=cursor, skip=offset)
+    return set_next_cursor(response, page)
 
 @router.get("/items/{product_id}", response_model=ProductResponse)
 async def get_product(
     product_id: int,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """Получение товара по ID"""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Product not found"
-        )
-    return product
+    """Получение товара по ID (Last-Modified - по updated_at товара)"""
+    def load():
+        product = db.query(Product).options(*product_response_options()).filter(Product.id == product_id).first()
+        if not product:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        last_modified = format_http_date(product.updated_at or product.created_at)
+        return serialize(PRODUCT_ADAPTER, product, {"Last-Modified": last_modified})
+
+    return await catalog_cache.get_or_load("product", {"id": product_id}, SCOPES, load, request)
 
 @router.post("/", response_model=ProductResponse)
 async def create_product(
@@ -116,6 +169,7 @@ async def create_product(
     db.add(product)
     db.commit()
     db.refresh(product)
+    catalog_cache.invalidate(PRODUCTS)
     return product
 
 @router.put("/items/{product_id}", response_model=ProductResponse)
@@ -139,6 +193,7 @@ async def update_product(
     
     db.commit()
     db.refresh(product)
+    catalog_cache.invalidate(PRODUCTS)
     return product
 
 @router.delete("/items/{product_id}")
@@ -157,30 +212,31 @@ async def delete_product(
 
     product.is_active = False
     db.commit()
+    catalog_cache.invalidate(PRODUCTS)
     
     return {"message": "Product deleted successfully"}
 
 @router.get("/tags", response_model=List[TagResponse])
 async def get_tags(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     search: Optional[str] = Query(None, description="Поиск по названию тега"),
     db: Session = Depends(get_db)
 ):
     """Получение списка тегов с количеством продуктов"""
-    query = db.query(Tag)
-    
-    if search:
-        query = query.filter(Tag.name.ilike(f"%{search}%"))
+    def load():
+        query = db.query(Tag)
 
-    tags = query.offset(skip).limit(limit).all()
+        if search:
+            query = query.filter(Tag.name.ilike(f"%{search}%"))
 
-    result = []
-    for tag in tags:
-        tag_data = TagResponse.from_orm(tag)
-        result.append(tag_data)
-    
-    return result
+        tags = query.offset(skip).limit(limit).all()
+        return serialize(TAG_LIST_ADAPTER, tags)
+
+    return await catalog_cache.get_or_load(
+        "tags", {"skip": skip, "limit": limit, "search": search}, (TAGS,), load, request
+    )
 
 @router.get("/tags/{tag_id}", response_model=TagResponse)
 async def get_tag(
@@ -217,6 +273,7 @@ async def create_tag(
     db.add(tag)
     db.commit()
     db.refresh(tag)
+    catalog_cache.invalidate(TAGS)
     return tag
 
 @router.delete("/tags/{tag_id}")
@@ -237,6 +294,7 @@ async def delete_tag(
 
     db.delete(tag)
     db.commit()
+    catalog_cache.invalidate(TAGS, PRODUCTS)
     
     return {"message": "Tag deleted successfully"}
 
@@ -290,7 +348,10 @@ async def add_tags_to_product(
             db.add(product_tag)
             added_tags.append(tag)
     
+    if added_tags:
+        product.updated_at = func.now()
     db.commit()
+    catalog_cache.invalidate(PRODUCTS, TAGS)
     return added_tags
 
 @router.delete("/items/{product_id}/tags/{tag_id}")
@@ -313,7 +374,12 @@ async def remove_tag_from_product(
         )
     
     db.delete(product_tag)
+    # Теги входят в ответ товара - его Last-Modified должен измениться
+    db.query(Product).filter(Product.id == product_id).update(
+        {Product.updated_at: func.now()}, synchronize_session=False
+    )
     db.commit()
+    catalog_cache.invalidate(PRODUCTS)
     
     return {"message": "Tag removed from product successfully"}
 
@@ -347,11 +413,14 @@ async def set_product_tags(
         db.add(product_tag)
         new_tags.append(tag)
     
+    product.updated_at = func.now()
     db.commit()
+    catalog_cache.invalidate(PRODUCTS, TAGS)
     return new_tags
 
 @router.get("/search/by-tags", response_model=List[ProductResponse])
 async def search_products_by_tags(
+    response: Response,
     tags: List[str] = Query(..., description="Список тегов для поиска"),
     category_id: Optional[int] = Query(None, description="Фильтр по категории"),
     min_price: Optional[float] = Query(None, description="Минимальная цена"),
@@ -359,10 +428,11 @@ async def search_products_by_tags(
     in_stock: Optional[bool] = Query(None, description="Только в наличии"),
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """Поиск продуктов по тегам"""
-    query = db.query(Product).join(Product.product_tags).join(Tag)
+    query = db.query(Product).options(*product_response_options()).join(Product.product_tags).join(Tag)
 
     query = query.filter(Tag.name.in_(tags))
 
@@ -382,14 +452,16 @@ async def search_products_by_tags(
 
     query = query.group_by(Product.id).having(func.count(Tag.id) >= len(tags))
     
-    products = query.offset(skip).limit(limit).all()
-    return products
+    page = paginate(query, TAG_PRODUCTS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 @router.get("/tags/{tag_id}/products", response_model=List[ProductResponse])
 async def get_products_by_tag(
     tag_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """Получение всех продуктов с определенным тегом"""
@@ -400,31 +472,34 @@ async def get_products_by_tag(
             detail="Tag not found"
         )
     
-    products = db.query(Product).join(Product.product_tags).filter(
+    query = db.query(Product).options(*product_response_options()).join(Product.product_tags).filter(
         ProductTag.tag_id == tag_id,
         Product.is_active == True
-    ).offset(skip).limit(limit).all()
+    )
     
-    return products
+    page = paginate(query, TAG_PRODUCTS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 # В products.py добавим админ-эндпоинты
 
 @router.get("/admin/products", response_model=List[ProductResponse])
 async def get_all_products_admin(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     include_inactive: bool = False,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
     """Получение всех товаров (включая неактивные) для админа"""
-    query = db.query(Product)
+    query = db.query(Product).options(*product_response_options())
     
     if not include_inactive:
         query = query.filter(Product.is_active == True)
     
-    products = query.offset(skip).limit(limit).all()
-    return products
+    page = paginate(query, PRODUCTS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 @router.post("/admin/products", response_model=ProductResponse)
 async def create_product_admin(
@@ -452,6 +527,7 @@ async def create_product_admin(
     db.add(product)
     db.commit()
     db.refresh(product)
+    catalog_cache.invalidate(PRODUCTS)
     return product
 
 @router.put("/admin/products/{product_id}", response_model=ProductResponse)
@@ -491,9 +567,11 @@ async def update_product_admin(
     if product_data.tag_ids is not None:
         tags = db.query(Tag).filter(Tag.id.in_(product_data.tag_ids)).all()
         product.tags = tags
+        product.updated_at = func.now()
     
     db.commit()
     db.refresh(product)
+    catalog_cache.invalidate(PRODUCTS)
     return product
 
 @router.delete("/admin/products/{product_id}")
@@ -517,6 +595,7 @@ async def delete_product_admin(
     # Теперь удаляем сам товар
     db.delete(product)
     db.commit()
+    catalog_cache.invalidate(PRODUCTS)
     
     return {"message": "Product deleted successfully"}
 
@@ -552,6 +631,7 @@ async def create_category_admin(
     db.add(category)
     db.commit()
     db.refresh(category)
+    catalog_cache.invalidate(CATEGORIES)
     return category
 
 @router.put("/admin/categories/{category_id}", response_model=CategoryResponse)
@@ -585,6 +665,7 @@ async def update_category_admin(
     
     db.commit()
     db.refresh(category)
+    catalog_cache.invalidate(CATEGORIES, PRODUCTS)
     return category
 
 @router.delete("/admin/categories/{category_id}")
@@ -611,6 +692,7 @@ async def delete_category_admin(
 
     db.delete(category)
     db.commit()
+    catalog_cache.invalidate(CATEGORIES)
     
     return {"message": "Category deleted successfully"}
 
@@ -648,6 +730,7 @@ async def create_tag(
     db.add(tag)
     db.commit()
     db.refresh(tag)
+    catalog_cache.invalidate(TAGS)
     return tag
 
 @router.put("/admin/tags/{tag_id}", response_model=TagResponse)
@@ -679,6 +762,7 @@ async def update_tag(
     
     db.commit()
     db.refresh(tag)
+    catalog_cache.invalidate(TAGS, PRODUCTS)
     return tag
 
 @router.delete("/admin/tags/{tag_id}")
@@ -697,13 +781,16 @@ async def delete_tag(
     
     db.delete(tag)
     db.commit()
+    catalog_cache.invalidate(TAGS, PRODUCTS)
     return {"message": "Tag deleted successfully"}
 
 @router.get("/admin/tags/{tag_id}/products", response_model=List[ProductResponse])
 async def get_products_by_tag_admin(
     tag_id: int,
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
@@ -715,8 +802,9 @@ async def get_products_by_tag_admin(
             detail="Tag not found"
         )
     
-    products = db.query(Product).join(Product.product_tags).filter(
+    query = db.query(Product).options(*product_response_options()).join(Product.product_tags).filter(
         ProductTag.tag_id == tag_id
-    ).offset(skip).limit(limit).all()
+    )
     
-    return products
\ No newline at end of file
+    page = paginate(query, TAG_PRODUCTS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
\ No newline at end of file
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime
@@ -9,17 +9,23 @@ from app.models.product import Product
 from app.models.promotions import Promotion, PromotionType, PromotionCategory, PromotionProduct
 from app.schemas.promotions import PromotionCreate, PromotionUpdate, PromotionResponse
 from app.api.endpoints.auth import get_current_user, get_current_admin
+from app.core.pagination import KeysetOrder, paginate, set_next_cursor
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+PROMOTIONS_ORDER = KeysetOrder("promotions", (Promotion.priority, Promotion.created_at, Promotion.id))
+ADMIN_PROMOTIONS_ORDER = KeysetOrder("admin_promotions", (Promotion.created_at, Promotion.id))
+
 @router.get("/", response_model=List[PromotionResponse])
 async def get_promotions(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     is_active: Optional[bool] = None,
     promotion_type: Optional[PromotionType] = None,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db)
 ):
     """Получить список акций"""
@@ -34,8 +40,8 @@ async def get_promotions(
     now = datetime.now()
     query = query.filter(Promotion.start_date <= now, Promotion.end_date >= now)
     
-    promotions = query.order_by(Promotion.priority.desc(), Promotion.created_at.desc()).offset(skip).limit(limit).all()
-    return promotions
+    page = paginate(query, PROMOTIONS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 @router.get("/{promotion_id}", response_model=PromotionResponse)
 async def get_promotion(
@@ -154,9 +160,11 @@ async def get_active_promotions_for_cart(
 
 @router.get("/admin/promotions", response_model=List[PromotionResponse])
 async def get_all_promotions_admin(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
     is_active: Optional[bool] = None,
+    cursor: Optional[str] = Query(None, description="Курсор следующей страницы из заголовка X-Next-Cursor"),
     db: Session = Depends(get_db),
     admin: User = Depends(get_current_admin)
 ):
@@ -166,8 +174,8 @@ async def get_all_promotions_admin(
     if is_active is not None:
         query = query.filter(Promotion.is_active == is_active)
     
-    promotions = query.order_by(Promotion.created_at.desc()).offset(skip).limit(limit).all()
-    return promotions
+    page = paginate(query, ADMIN_PROMOTIONS_ORDER, limit, cursor=cursor, skip=skip)
+    return set_next_cursor(response, page)
 
 @router.post("/admin/promotions", response_model=PromotionResponse)
 async def create_promotion_admin(
@@ -1,5 +1,6 @@
+import os
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 
 class Settings(BaseSettings):
     # Database
@@ -27,7 +28,130 @@ class Settings(BaseSettings):
     MINIO_ENDPOINT: str = "localhost:9000"
     MINIO_ACCESS_KEY: str = "minioadmin"
     MINIO_SECRET_KEY: str = "minioadmin"
-    
+
+    # Хранилище объектов: "minio" или "local" (каталог STORAGE_LOCAL_PATH - тесты, разработка)
+    STORAGE_BACKEND: str = "minio"
+    STORAGE_LOCAL_PATH: str = "uploads/objects"
+    STORAGE_THREADS: int = 8  # пул потоков для синхронного SDK
+    STORAGE_MAX_CONNECTIONS: int = 32  # потоки x параллельные части multipart
+    STORAGE_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    STORAGE_READ_TIMEOUT_SECONDS: float = 60.0
+    STORAGE_MULTIPART_PART_SIZE: int = 8 * 1024 * 1024  # больше - multipart (минимум S3 - 5 МБ)
+    STORAGE_MULTIPART_CONCURRENCY: int = 4
+    STORAGE_RETRY_ATTEMPTS: int = 3
+    STORAGE_RETRY_BASE_DELAY_SECONDS: float = 0.1
+    STORAGE_RETRY_MAX_DELAY_SECONDS: float = 2.0
+
+    # AI модель распознавания блюд
+    FOOD_MODEL_NAME: str = "prithivMLmods/Food-101-93M"
+    FOOD_MODEL_PRELOAD: bool = True  # False - загрузка при первом запросе
+    FOOD_MODEL_WARMUP: bool = True
+    FOOD_MODEL_BACKEND: str = "transformers"  # "transformers" или "onnx"
+    FOOD_MODEL_RETRY_SECONDS: float = 60.0  # повторная загрузка после неудачной, не чаще
+
+    # ONNX Runtime (python -m app.services.onnx_food_classifier для экспорта)
+    ONNX_MODEL_DIR: str = "models/food101-onnx"
+    ONNX_MODEL_FILE: str = "model.int8.onnx"
+    ONNX_INTRA_OP_THREADS: int = 0  # 0 - по числу ядер
+    ONNX_INTER_OP_THREADS: int = 1
+
+    # Предобработка изображений для анализа
+    FOOD_MODEL_INPUT_SIZE: int = 224
+    ANALYSIS_IMAGE_MAX_SIZE: int = 1024  # сторона сохраняемого в MinIO изображения
+    ANALYSIS_IMAGE_QUALITY: int = 85
+
+    # Micro-batching инференса
+    INFERENCE_MAX_BATCH_SIZE: int = 8
+    INFERENCE_MAX_WAIT_MS: float = 10.0
+
+    # Пул инференса: "thread" или "process" (своя копия модели в каждом процессе)
+    INFERENCE_EXECUTOR: str = "thread"
+    INFERENCE_WORKERS: int = 1
+    INFERENCE_MAX_QUEUE_SIZE: int = 32  # при переполнении - HTTP 503
+
+    # Кэш результатов анализа по хэшу изображения
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 1024
+    ANALYSIS_CACHE_TTL_SECONDS: int = 24 * 60 * 60
+    ANALYSIS_CACHE_REDIS: bool = False  # второй уровень кэша в REDIS_URL
+    ANALYSIS_DUPLICATE_WINDOW_MINUTES: int = 60  # повторное использование записи истории
+
+    # Индекс тегов в памяти для сопоставления ингредиентов
+    TAG_MATCH_MIN_SIMILARITY: float = 0.3  # минимальное триграммное сходство
+    TAG_INDEX_REFRESH_SECONDS: int = 300  # перечитывание изменений из других процессов
+
+    # База "блюдо -> ингредиенты" (data-файл, перечитывается при изменении)
+    DISH_KNOWLEDGE_BASE_PATH: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "dish_ingredients.json")
+    DISH_KNOWLEDGE_BASE_CHECK_SECONDS: int = 30
+
+    # Режим нескольких блюд (top_k > 1): объединение ингредиентов по уверенности
+    ANALYSIS_MAX_TOP_K: int = 5
+    ANALYSIS_MIN_INGREDIENT_WEIGHT: float = 0.1  # доля суммарной уверенности top-k
+    ANALYSIS_MAX_BASIC_INGREDIENTS: int = 8
+    ANALYSIS_MAX_ADDITIONAL_INGREDIENTS: int = 10
+
+    # Асинхронные задачи анализа (POST /ai/jobs, python worker.py)
+    ANALYSIS_WORKER_IN_API: bool = False  # True - API сам обрабатывает image_processing
+    ANALYSIS_JOB_TIMEOUT_SECONDS: int = 120  # задача в очереди дольше - считается проваленной
+    ANALYSIS_JOB_POLL_SECONDS: float = 2.0  # резервная проверка БД в SSE-потоке
+
+    # Запуск: проверки зависимостей идут параллельно и не блокируют приём запросов
+    STARTUP_CHECK_TIMEOUT_SECONDS: float = 3.0
+    STARTUP_CHECK_INTERVAL_SECONDS: float = 15.0  # фоновая проверка зависимостей для /health/ready
+    STARTUP_RETRY_SECONDS: float = 2.0  # повтор подготовки БД, если она ещё недоступна
+    STARTUP_CREATE_TABLES: bool = True  # create_all при старте (схему ведёт alembic)
+
+    # Поиск товаров: полнотекстовый (russian) + pg_trgm для опечаток
+    SEARCH_TYPO_THRESHOLD: float = 0.5  # word_similarity запроса и названия
+    SEARCH_CANDIDATE_LIMIT: int = 10000  # кандидатов из каждого источника перед ранжированием
+    SEARCH_MAX_MATCHED_TAGS: int = 20
+    SEARCH_MAX_MATCHED_CATEGORIES: int = 5
+
+    # Подсчёт SQL-запросов на HTTP-запрос (заголовок X-SQL-Statements, бюджеты эндпоинтов)
+    SQL_STATEMENT_COUNTING: bool = False
+
+    # Кэш ответов каталога (товары, категории, теги): память процесса + Redis
+    CATALOG_CACHE_ENABLED: bool = True
+    CATALOG_CACHE_REDIS: bool = True  # второй уровень и pub/sub инвалидации в REDIS_URL
+    CATALOG_CACHE_MAX_ENTRIES: int = 2048
+    CATALOG_CACHE_LOCAL_TTL_SECONDS: int = 60  # предел устаревания, если pub/sub недоступен
+    CATALOG_CACHE_REDIS_TTL_SECONDS: int = 600
+    CATALOG_CACHE_LOCK_TTL_MS: int = 5000  # блокировка загрузки ключа между воркерами
+    CATALOG_CACHE_LOCK_WAIT_MS: int = 2000  # ожидание чужой загрузки до собственной
+    CATALOG_CACHE_RESUBSCRIBE_SECONDS: float = 5.0
+    # Клиент хранит ответ каталога, но перед использованием проверяет ETag (304)
+    CATALOG_CACHE_CONTROL: str = "public, no-cache"
+    # Изображения: max-age без запроса, затем проверка ETag из MinIO
+    IMAGE_CACHE_CONTROL: str = "public, max-age=3600"
+    # Объекты с ключом по содержимому (<sha256>.jpg) не меняются
+    IMAGE_IMMUTABLE_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+    IMAGE_STREAM_CHUNK_SIZE: int = 64 * 1024  # кусок потоковой отдачи из MinIO
+    # Отдача изображений: "proxy" - байты через воркер (Range, 304, кэш горячих изображений),
+    # "redirect" - 307 на подписанную ссылку MinIO (MINIO_PUBLIC_ENDPOINT), воркер байты не видит
+    IMAGE_DELIVERY: str = "proxy"
+    IMAGE_PRESIGN_WINDOW_SECONDS: int = 3600  # одна подпись на объект за окно - одинаковый URL у всех воркеров
+    IMAGE_PRESIGN_EXPIRES_SECONDS: int = 3 * 3600  # не меньше двух окон
+    # Отсутствие варианта помнится недолго: без stat на каждый запрос, и
+    # редирект на оригинал кэшируется клиентом не дольше этого
+    IMAGE_MISSING_VARIANT_TTL_SECONDS: int = 10
+
+    # Кэш горячих изображений в процессе: память для миниатюр, локальный диск для крупных
+    IMAGE_CACHE_ENABLED: bool = True
+    IMAGE_CACHE_MEMORY_BYTES: int = 64 * 1024 * 1024
+    IMAGE_CACHE_MEMORY_MAX_OBJECT: int = 256 * 1024  # крупнее - на диск
+    IMAGE_CACHE_DISK_PATH: str = "uploads/image_cache"  # подкаталог на каждый процесс
+    IMAGE_CACHE_DISK_BYTES: int = 2 * 1024 * 1024 * 1024  # 0 - без дискового уровня
+    IMAGE_CACHE_DISK_MAX_OBJECT: int = 10 * 1024 * 1024
+    IMAGE_CACHE_ADMIT_AFTER: int = 2  # обращений до попадания в кэш
+    IMAGE_CACHE_FREQUENCY_WINDOW: int = 10000  # обращений до старения счётчиков частоты
+    IMAGE_CACHE_TTL_SECONDS: int = 3600  # удалённый в другом воркере объект живёт не дольше
+
+    # Варианты изображений каталога (?w=): ширины и форматы, кодирование в пуле процессов
+    IMAGE_VARIANT_WIDTHS: List[int] = [128, 256, 512, 1024]
+    IMAGE_VARIANT_WEBP_QUALITY: int = 80
+    IMAGE_VARIANT_AVIF: bool = False  # нужен Pillow с поддержкой AVIF
+    IMAGE_VARIANT_AVIF_QUALITY: int = 60
+    IMAGE_VARIANT_WORKERS: int = 1
+
     class Config:
         env_file = ".env"
 
@@ -1,10 +1,493 @@
+# app/core/file_storage.py
+"""Асинхронное хранилище объектов (изображения товаров, категорий, анализов).
+
+SDK minio синхронный: все обращения к нему идут в выделенный пул потоков
+STORAGE_THREADS с пулом соединений urllib3 STORAGE_MAX_CONNECTIONS, поэтому
+загрузка не блокирует event loop и не занимает пул потоков FastAPI.
+Объекты больше STORAGE_MULTIPART_PART_SIZE загружаются multipart-частями
+параллельно, временные ошибки повторяются с экспоненциальной задержкой
+и случайным разбросом (full jitter). Перекодирование PIL тоже вне loop.
+
+Бэкенд "local" хранит объекты в каталоге STORAGE_LOCAL_PATH - для тестов
+и разработки без MinIO. save_image*/delete_image - прежний интерфейс
+для эндпоинтов.
+
+Изображения хранятся под ключом по содержимому - SHA-256 нормализованных
+байт (после перекодирования в JPEG): "<sha256>.jpg". Число ссылок ведётся
+в таблице stored_objects, поэтому повторная загрузка того же изображения -
+только +1 ссылка без записи в хранилище, а delete_image удаляет объект
+вместе с последней ссылкой. Объект под таким ключом не меняется -
+ответы с ним кэшируются как immutable.
+"""
+import asyncio
+import base64
+import functools
+import hashlib
+import io
+import logging
+import mimetypes
+import os
+import random
+import re
+import shutil
+import tempfile
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Callable, Optional
+
 from fastapi import UploadFile, HTTPException
-from .minio_client import minio_client
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.minio_client import MINIO_BUCKET_NAME, minio_client, presigned_object_url, variant_prefix
+
+logger = logging.getLogger(__name__)
+
+mimetypes.add_type("image/webp", ".webp")
+mimetypes.add_type("image/avif", ".avif")
+
+
+class ObjectNotFound(Exception):
+    """Объекта нет в хранилище"""
+
+
+@dataclass(frozen=True)
+class ObjectInfo:
+    key: str
+    size: int
+    etag: str
+    last_modified: Optional[datetime]
+    content_type: Optional[str]
+
+
+def object_key(image_url: str) -> str:
+    """Ключ объекта из URL вида /minio/{bucket}/{key}"""
+    return image_url.split('/')[-1] if image_url else ""
+
+
+# Ключ по содержимому: <sha256>.<расширение>
+_CONTENT_KEY = re.compile(r"^[0-9a-f]{64}\.\w+$")
+
+
+def is_content_addressed(key: str) -> bool:
+    """Объект под ключом по содержимому никогда не меняется"""
+    return bool(_CONTENT_KEY.match(key))
+
+
+def image_cache_control(key: str) -> str:
+    if is_content_addressed(key):
+        return settings.IMAGE_IMMUTABLE_CACHE_CONTROL
+    return settings.IMAGE_CACHE_CONTROL
+
+
+def _is_transient(error: Exception) -> bool:
+    from minio.error import S3Error, ServerError
+    from urllib3.exceptions import HTTPError
+
+    if isinstance(error, S3Error):
+        return error.code in ("SlowDown", "InternalError", "RequestTimeout", "ServiceUnavailable")
+    return isinstance(error, (ServerError, HTTPError, ConnectionError, TimeoutError))
+
+
+def _close_response(response):
+    try:
+        response.close()
+    finally:
+        response.release_conn()
+
+
+class ObjectStorage(ABC):
+    """Асинхронный интерфейс хранилища; блокирующие операции - в своём пуле потоков"""
+
+    def __init__(self, threads: int):
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="Storage")
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _retry(self, func: Callable, *args, **kwargs):
+        """Повтор временных ошибок: задержка случайна в [0, base * 2^попытка]"""
+        attempts = max(1, settings.STORAGE_RETRY_ATTEMPTS)
+        for attempt in range(attempts):
+            try:
+                return await self._run(func, *args, **kwargs)
+            except Exception as e:
+                if attempt == attempts - 1 or not _is_transient(e):
+                    raise
+                delay = random.uniform(0, min(
+                    settings.STORAGE_RETRY_MAX_DELAY_SECONDS,
+                    settings.STORAGE_RETRY_BASE_DELAY_SECONDS * 2 ** attempt
+                ))
+                logger.warning(f"⚠️ Storage operation failed ({e}), retry {attempt + 1} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    @abstractmethod
+    def url_for(self, key: str) -> str:
+        ...
+
+    @abstractmethod
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        """Сохраняет объект и возвращает его URL"""
+
+    @abstractmethod
+    async def get(self, key: str) -> bytes:
+        ...
+
+    @abstractmethod
+    async def stat(self, key: str) -> ObjectInfo:
+        ...
+
+    @abstractmethod
+    def iter_range(self, key: str, offset: int, length: int, chunk_size: int) -> AsyncIterator[bytes]:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    @abstractmethod
+    async def delete_prefix(self, prefix: str) -> None:
+        ...
+
+    def presigned_url(self, key: str, request_date: datetime, expires: timedelta) -> Optional[str]:
+        """Прямая ссылка на объект в обход API; None - бэкенд их не поддерживает"""
+        return None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+class MinIOStorage(ObjectStorage):
+    """MinIO/S3 через синхронный SDK в выделенном пуле потоков.
+
+    К minio_client обращаются только методы, выполняемые в пуле: первое
+    обращение создаёт клиент и проверяет bucket по сети.
+    """
+
+    def url_for(self, key: str) -> str:
+        return f"/minio/{MINIO_BUCKET_NAME}/{key}"
+
+    def _put(self, key: str, data: bytes, content_type: str):
+        minio_client.client.put_object(
+            bucket_name=minio_client.bucket_name,
+            object_name=key,
+            data=io.BytesIO(data),
+            length=len(data),
+            content_type=content_type,
+            part_size=settings.STORAGE_MULTIPART_PART_SIZE,
+            num_parallel_uploads=settings.STORAGE_MULTIPART_CONCURRENCY
+        )
+
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        await self._retry(self._put, key, data, content_type)
+        return self.url_for(key)
+
+    def _get(self, key: str) -> bytes:
+        from minio.error import S3Error
+
+        try:
+            response = minio_client.client.get_object(minio_client.bucket_name, key)
+        except S3Error as e:
+            if e.code == "NoSuchKey":
+                raise ObjectNotFound(key)
+            raise
+        try:
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
+
+    async def get(self, key: str) -> bytes:
+        return await self._retry(self._get, key)
+
+    def _stat(self, key: str) -> ObjectInfo:
+        from minio.error import S3Error
+
+        try:
+            stat = minio_client.client.stat_object(minio_client.bucket_name, key)
+        except S3Error as e:
+            if e.code in ("NoSuchKey", "NoSuchObject"):
+                raise ObjectNotFound(key)
+            raise
+        return ObjectInfo(key, stat.size, stat.etag, stat.last_modified, stat.content_type)
+
+    async def stat(self, key: str) -> ObjectInfo:
+        return await self._retry(self._stat, key)
+
+    def _open(self, key: str, offset: int, length: int):
+        return minio_client.client.get_object(minio_client.bucket_name, key, offset=offset, length=length)
+
+    async def iter_range(self, key: str, offset: int, length: int, chunk_size: int) -> AsyncIterator[bytes]:
+        response = await self._retry(self._open, key, offset, length)
+        try:
+            chunks = response.stream(chunk_size)
+            while True:
+                chunk = await self._run(next, chunks, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # Без await: при разрыве соединения клиентом поток ответа отменяется,
+            # и отменённый await не вернул бы соединение в пул urllib3
+            self._executor.submit(_close_response, response)
+
+    def _delete(self, key: str):
+        minio_client.client.remove_object(minio_client.bucket_name, key)
+
+    def _delete_prefix(self, prefix: str):
+        for obj in minio_client.client.list_objects(minio_client.bucket_name, prefix=prefix, recursive=True):
+            minio_client.client.remove_object(minio_client.bucket_name, obj.object_name)
+
+    async def delete(self, key: str) -> None:
+        await self._retry(self._delete, key)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await self._retry(self._delete_prefix, prefix)
+
+    def presigned_url(self, key: str, request_date: datetime, expires: timedelta) -> Optional[str]:
+        return presigned_object_url(
+            key,
+            expires=expires,
+            request_date=request_date,
+            response_headers={"response-cache-control": image_cache_control(key)}
+        )
+
+
+class LocalFileStorage(ObjectStorage):
+    """Объекты в каталоге файловой системы (тесты, разработка без MinIO)"""
+
+    def __init__(self, root: str, threads: int):
+        super().__init__(threads)
+        self.root = os.path.abspath(root)
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid object key: {key}")
+        return path
+
+    def url_for(self, key: str) -> str:
+        return f"/local/{key}"
+
+    def _put(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись во временный файл и rename - читатели не видят частичный объект
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def put(self, key: str, data: bytes, content_type: str) -> str:
+        await self._run(self._put, key, data)
+        return self.url_for(key)
+
+    def _get(self, key: str) -> bytes:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+
+    async def get(self, key: str) -> bytes:
+        return await self._run(self._get, key)
+
+    def _stat(self, key: str) -> ObjectInfo:
+        try:
+            st = os.stat(self._path(key))
+        except FileNotFoundError:
+            raise ObjectNotFound(key)
+        return ObjectInfo(
+            key=key,
+            size=st.st_size,
+            etag=f"{st.st_mtime_ns:x}-{st.st_size:x}",
+            last_modified=datetime.fromtimestamp(st.st_mtime, tz=timezone.utc),
+            content_type=mimetypes.guess_type(key)[0]
+        )
+
+    async def stat(self, key: str) -> ObjectInfo:
+        return await self._run(self._stat, key)
+
+    async def iter_range(self, key: str, offset: int, length: int, chunk_size: int) -> AsyncIterator[bytes]:
+        f = await self._run(open, self._path(key), "rb")
+        try:
+            await self._run(f.seek, offset)
+            remaining = length
+            while remaining > 0:
+                chunk = await self._run(f.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            # Синхронно - закрытие не должно зависеть от отмены потока ответа
+            f.close()
+
+    def _delete(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete, key)
+
+    async def delete_prefix(self, prefix: str) -> None:
+        await self._run(shutil.rmtree, self._path(prefix.rstrip("/")), True)
+
+
+def create_storage() -> ObjectStorage:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalFileStorage(settings.STORAGE_LOCAL_PATH, settings.STORAGE_THREADS)
+    if settings.STORAGE_BACKEND != "minio":
+        raise ValueError(f"Unknown storage backend: {settings.STORAGE_BACKEND}")
+    return MinIOStorage(settings.STORAGE_THREADS)
+
+
+# Глобальное хранилище объектов
+storage = create_storage()
+
+
+def _encode_jpeg(image_bytes: bytes) -> bytes:
+    """Перекодирование загрузки в JPEG (выполняется в пуле потоков)"""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(image_bytes))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGB')
+
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, "JPEG", quality=85, optimize=True)
+    return output_buffer.getvalue()
+
+
+def _acquire_reference(key: str, size: int, content_type: str) -> int:
+    """+1 ссылка на объект (upsert); возвращает число ссылок после увеличения"""
+    from sqlalchemy.dialects.postgresql import insert
+    from app.models.database import SessionLocal
+    from app.models.stored_object import StoredObject
+
+    statement = insert(StoredObject).values(
+        key=key, size=size, content_type=content_type, ref_count=1
+    ).on_conflict_do_update(
+        index_elements=[StoredObject.key],
+        set_={"ref_count": StoredObject.ref_count + 1}
+    ).returning(StoredObject.ref_count)
+
+    db = SessionLocal()
+    try:
+        ref_count = db.execute(statement).scalar()
+        db.commit()
+        return ref_count
+    finally:
+        db.close()
+
+
+def _release_reference(db, key: str) -> Optional[int]:
+    """-1 ссылка; строка заблокирована до commit. None - объект без учёта ссылок"""
+    from app.models.stored_object import StoredObject
+
+    stored = db.query(StoredObject).filter(StoredObject.key == key).with_for_update().first()
+    if stored is None:
+        return None
+    stored.ref_count -= 1
+    if stored.ref_count <= 0:
+        db.delete(stored)
+    db.flush()
+    return stored.ref_count
+
+
+def add_image_reference(db, image_url: str) -> bool:
+    """+1 ссылка на уже сохранённое изображение в транзакции db - для
+    копирования URL в другую запись. False - объект без учёта ссылок
+    (ключ до перехода на адресацию по содержимому), делить его нельзя."""
+    from sqlalchemy import update
+    from app.models.stored_object import StoredObject
+
+    key = object_key(image_url)
+    if not key:
+        return False
+    ref_count = db.execute(
+        update(StoredObject).where(StoredObject.key == key).values(
+            ref_count=StoredObject.ref_count + 1
+        ).returning(StoredObject.ref_count)
+    ).scalar()
+    return ref_count is not None
+
+
+async def _exists(key: str) -> bool:
+    try:
+        await storage.stat(key)
+        return True
+    except ObjectNotFound:
+        return False
+
+
+async def _put_content(data: bytes, content_type: str, extension: str) -> str:
+    """Сохранение под ключом по содержимому: повторная загрузка - только +1 ссылка"""
+    key = f"{hashlib.sha256(data).hexdigest()}{extension}"
+    ref_count = await run_in_threadpool(_acquire_reference, key, len(data), content_type)
+    try:
+        # Объекта может не быть, если первая загрузка ещё идёт или не удалась
+        if ref_count > 1 and await _exists(key):
+            logger.info(f"♻️ Duplicate image {key} stored once (references: {ref_count})")
+            return storage.url_for(key)
+        return await storage.put(key, data, content_type)
+    except Exception:
+        await _release(key)
+        raise
+
+
+async def _delete_object(key: str):
+    from app.core.image_cache import image_cache
+
+    image_cache.invalidate(key)
+    image_cache.invalidate_prefix(variant_prefix(key))
+    try:
+        await storage.delete(key)
+        await storage.delete_prefix(variant_prefix(key))
+    except Exception as e:
+        logger.warning(f"Error deleting image {key}: {e}")
+
+
+async def _release(key: str):
+    """Освобождение ссылки; объект удаляется вместе с последней ссылкой"""
+    from app.models.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        ref_count = await run_in_threadpool(_release_reference, db, key)
+        if ref_count is None or ref_count <= 0:
+            # Удаление до commit: параллельная загрузка того же содержимого
+            # ждёт блокировку строки и после commit запишет объект заново
+            await _delete_object(key)
+        await run_in_threadpool(db.commit)
+    except Exception:
+        await run_in_threadpool(db.rollback)
+        raise
+    finally:
+        db.close()
+
+
+async def _save_jpeg(image_bytes: bytes) -> str:
+    jpeg_bytes = await run_in_threadpool(_encode_jpeg, image_bytes)
+    return await _put_content(jpeg_bytes, 'image/jpeg', '.jpg')
+
 
 async def save_image(file: UploadFile) -> str:
-    """Сохранение изображения через MinIO"""
+    """Сохранение загруженного файла изображения"""
     try:
-        return await minio_client.upload_image_file(file)
+        contents = await file.read()
+        if len(contents) > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=400,
+                detail=f"File too large. Max size: {settings.MAX_FILE_SIZE // 1024 // 1024}MB"
+            )
+        return await _save_jpeg(contents)
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -14,9 +497,11 @@ async def save_image(file: UploadFile) -> str:
         )
 
 async def save_image_base64(base64_data: str) -> str:
-    """Сохранение изображения из base64 через MinIO"""
+    """Сохранение изображения из base64"""
     try:
-        return await minio_client.upload_image_base64(base64_data)
+        if ',' in base64_data:
+            base64_data = base64_data.split(',')[1]
+        return await _save_jpeg(base64.b64decode(base64_data))
     except Exception as e:
         if isinstance(e, HTTPException):
             raise e
@@ -25,9 +510,28 @@ async def save_image_base64(base64_data: str) -> str:
             detail=f"Error saving base64 image: {str(e)}"
         )
 
-def delete_image(image_url: str) -> None:
-    """Удаление изображения через MinIO"""
+async def save_image_bytes(image_bytes: bytes, content_type: str = 'image/jpeg') -> str:
+    """Сохранение уже подготовленного изображения без перекодирования"""
+    try:
+        extension = mimetypes.guess_extension(content_type) or ".jpg"
+        if extension == ".jpe":
+            extension = ".jpg"
+        return await _put_content(image_bytes, content_type, extension)
+    except Exception as e:
+        if isinstance(e, HTTPException):
+            raise e
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error saving image: {str(e)}"
+        )
+
+async def delete_image(image_url: str) -> None:
+    """Освобождение изображения: объект и его варианты удаляются,
+    когда на них не осталось ссылок"""
+    key = object_key(image_url)
+    if not key:
+        return
     try:
-        minio_client.delete_image(image_url)
+        await _release(key)
     except Exception as e:
-        print(f"Error deleting image: {e}")
\ No newline at end of file
+        logger.warning(f"Error deleting image {key}: {e}")
@@ -0,0 +1,90 @@
+# app/core/http_cache.py
+"""Условные запросы (RFC 9110): ETag / Last-Modified и ответ 304.
+
+Валидатор известен без чтения тела (хэш закэшированного ответа каталога,
+stat_object в MinIO), поэтому 304 не требует ни загрузки объекта, ни
+сериализации.
+"""
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+
+def quote_etag(value: str, weak: bool = False) -> str:
+    value = value.strip('"')
+    return f'W/"{value}"' if weak else f'"{value}"'
+
+
+def format_http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _strip_weak(etag: str) -> str:
+    etag = etag.strip()
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Слабое сравнение, как требуется для If-None-Match"""
+    if if_none_match.strip() == "*":
+        return True
+    current = _strip_weak(etag)
+    return any(_strip_weak(candidate) == current for candidate in if_none_match.split(","))
+
+
+def is_not_modified(
+    request: Request,
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None
+) -> bool:
+    """If-None-Match имеет приоритет; If-Modified-Since - только без него"""
+    if request.method not in ("GET", "HEAD"):
+        return False
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag is not None and etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        # HTTP-дата с точностью до секунды
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def validator_headers(
+    etag: Optional[str] = None,
+    last_modified: Optional[datetime] = None,
+    cache_control: Optional[str] = None
+) -> Dict[str, str]:
+    headers = {}
+    if etag:
+        headers["ETag"] = etag
+    if last_modified is not None:
+        headers["Last-Modified"] = format_http_date(last_modified)
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+
+# Заголовки, которые сохраняются в ответе 304 (RFC 9110, 15.4.5)
+_NOT_MODIFIED_HEADERS = ("etag", "last-modified", "cache-control", "vary", "expires", "content-location")
+
+
+def not_modified_response(headers: Dict[str, str]) -> Response:
+    return Response(
+        status_code=304,
+        headers={name: value for name, value in headers.items() if name.lower() in _NOT_MODIFIED_HEADERS}
+    )
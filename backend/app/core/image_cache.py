@@ -0,0 +1,390 @@
+# app/core/image_cache.py
+"""Кэш горячих изображений перед хранилищем объектов.
+
+Несколько сотен изображений каталога получают большую часть запросов,
+поэтому они держатся в процессе на двух уровнях:
+- память - объекты до IMAGE_CACHE_MEMORY_MAX_OBJECT (миниатюры, варианты ?w=);
+- локальный диск IMAGE_CACHE_DISK_PATH - объекты крупнее, отдаются через
+  FileResponse (sendfile, если сервер его поддерживает) мимо памяти Python.
+
+Вытеснение LRU по байтам, допуск по частоте (как в TinyLFU): объект попадает
+в кэш начиная с IMAGE_CACHE_ADMIT_AFTER-го обращения и только если он
+запрашивался не реже вытесняемых им записей - разовые запросы не вымывают
+горячие изображения. Счётчики частоты делятся пополам каждые
+IMAGE_CACHE_FREQUENCY_WINDOW обращений.
+
+Кэш заполняется при полной (не Range) отдаче из хранилища: куски ответа
+одновременно пишутся в кэш, отдельного чтения из MinIO нет.
+
+Ключи оригиналов неизменяемы (SHA-256 содержимого в имени); варианты
+перестраиваются под тем же ключом - их сбрасывает invalidate. Кэш свой у каждого процесса,
+IMAGE_CACHE_TTL_SECONDS ограничивает время, в течение которого другой
+воркер отдаёт уже удалённый объект.
+"""
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.file_storage import ObjectInfo
+
+logger = logging.getLogger(__name__)
+
+MEMORY = "memory"
+DISK = "disk"
+
+
+@dataclass
+class CachedImage:
+    info: ObjectInfo
+    tier: str
+    expires_at: float
+    data: Optional[bytes] = None  # уровень memory
+    path: Optional[str] = None  # уровень disk
+
+
+class _Tier:
+    """LRU с ограничением по суммарному размеру"""
+
+    def __init__(self, name: str, capacity: int, max_object: int):
+        self.name = name
+        self.capacity = capacity
+        self.max_object = max_object
+        self.entries: "OrderedDict[str, CachedImage]" = OrderedDict()
+        self.bytes = 0
+
+        self.hits = 0
+        self.bytes_served = 0
+
+    def accepts(self, size: int) -> bool:
+        return 0 < size <= min(self.max_object, self.capacity)
+
+    def get_stats(self) -> Dict:
+        return {
+            "entries": len(self.entries),
+            "bytes": self.bytes,
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "bytes_served": self.bytes_served
+        }
+
+
+def _unlink(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ImageCache:
+    """Двухуровневый кэш объектов хранилища (память + локальный диск)"""
+
+    # Удалённый из кэша файл может ещё открываться начатым FileResponse
+    UNLINK_DELAY_SECONDS = 30.0
+
+    def __init__(
+        self,
+        enabled: bool,
+        memory_bytes: int,
+        memory_max_object: int,
+        disk_path: str,
+        disk_bytes: int,
+        disk_max_object: int,
+        admit_after: int,
+        frequency_window: int,
+        ttl_seconds: int
+    ):
+        self.enabled = enabled
+        self.disk_path = disk_path
+        self.admit_after = admit_after
+        self.frequency_window = frequency_window
+        self.ttl_seconds = ttl_seconds
+        self._tiers = {
+            MEMORY: _Tier(MEMORY, memory_bytes, memory_max_object),
+            DISK: _Tier(DISK, disk_bytes, disk_max_object)
+        }
+        self._lock = threading.Lock()
+        self._frequency: Dict[str, int] = {}
+        self._accesses = 0
+        self._filling = set()
+        self._disk_dir: Optional[str] = None
+
+        self.misses = 0
+        self.bytes_from_storage = 0
+        self.admissions = 0
+        self.rejections = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def _record_access(self, key: str):
+        self._frequency[key] = self._frequency.get(key, 0) + 1
+        self._accesses += 1
+        if self._accesses >= self.frequency_window:
+            # Старение: давняя популярность постепенно забывается
+            self._accesses = 0
+            self._frequency = {k: v // 2 for k, v in self._frequency.items() if v > 1}
+
+    def lookup(self, key: str) -> Optional[CachedImage]:
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            self._record_access(key)
+            for tier in self._tiers.values():
+                entry = tier.entries.get(key)
+                if entry is None:
+                    continue
+                if entry.expires_at <= now:
+                    self._remove(tier, key)
+                    break
+                tier.entries.move_to_end(key)
+                tier.hits += 1
+                return entry
+            self.misses += 1
+        return None
+
+    def count_served(self, entry: Optional[CachedImage], length: int):
+        """Байты ответа: из кэша (по уровню) или из хранилища"""
+        with self._lock:
+            if entry is None:
+                self.bytes_from_storage += length
+            else:
+                self._tiers[entry.tier].bytes_served += length
+
+    async def iter_file(self, path: str, offset: int, length: int, chunk_size: int) -> AsyncIterator[bytes]:
+        """Диапазон файла дискового уровня (Range-запросы)"""
+        f = await run_in_threadpool(open, path, "rb")
+        try:
+            await run_in_threadpool(f.seek, offset)
+            remaining = length
+            while remaining > 0:
+                chunk = await run_in_threadpool(f.read, min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+        finally:
+            await run_in_threadpool(f.close)
+
+    # ------------------------------------------------------------------
+    # Заполнение
+    # ------------------------------------------------------------------
+
+    def admission_tier(self, info: ObjectInfo) -> Optional[str]:
+        """Уровень для объекта или None, если он пока не заслужил места в кэше"""
+        if not self.enabled:
+            return None
+        for tier in self._tiers.values():
+            if tier.accepts(info.size):
+                break
+        else:
+            return None
+        with self._lock:
+            if info.key in self._filling or self._frequency.get(info.key, 0) < self.admit_after:
+                return None
+            self._filling.add(info.key)
+        return tier.name
+
+    def _get_disk_dir(self) -> str:
+        if self._disk_dir is None:
+            os.makedirs(self.disk_path, exist_ok=True)
+            # Каталоги завершившихся процессов остаются после перезапуска воркеров
+            for name in os.listdir(self.disk_path):
+                if name.isdigit() and int(name) != os.getpid() and not _pid_alive(int(name)):
+                    shutil.rmtree(os.path.join(self.disk_path, name), ignore_errors=True)
+            disk_dir = os.path.join(self.disk_path, str(os.getpid()))
+            shutil.rmtree(disk_dir, ignore_errors=True)
+            os.makedirs(disk_dir, exist_ok=True)
+            self._disk_dir = disk_dir
+        return self._disk_dir
+
+    def _open_disk_file(self):
+        fd, path = tempfile.mkstemp(dir=self._get_disk_dir())
+        return os.fdopen(fd, "wb"), path
+
+    async def fill(self, info: ObjectInfo, tier_name: str, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        """Отдаёт куски ответа и одновременно сохраняет объект в кэш.
+
+        Вызывается только после admission_tier; незавершённая отдача
+        (разрыв соединения, ошибка хранилища) в кэш не попадает.
+        """
+        buffer = []
+        f = path = None
+        received = 0
+        complete = False
+        try:
+            if tier_name == DISK:
+                try:
+                    f, path = await run_in_threadpool(self._open_disk_file)
+                except OSError as e:
+                    logger.warning(f"⚠️ Image cache disk unavailable: {e}")
+                    tier_name = None
+
+            async for chunk in chunks:
+                received += len(chunk)
+                if tier_name == DISK:
+                    try:
+                        await run_in_threadpool(f.write, chunk)
+                    except OSError as e:
+                        # Диск заполнен - отдача продолжается без кэширования
+                        logger.warning(f"⚠️ Image cache write failed: {e}")
+                        tier_name = None
+                elif tier_name == MEMORY:
+                    buffer.append(chunk)
+                yield chunk
+            complete = tier_name is not None and received == info.size
+        finally:
+            # Без await: при разрыве соединения Starlette отменяет поток ответа,
+            # и отменённый await оставил бы ключ в _filling, файл открытым и
+            # временный файл на диске
+            with self._lock:
+                self._filling.discard(info.key)
+            if f is not None:
+                try:
+                    f.close()
+                except OSError:
+                    complete = False
+            stored = complete and self._store(
+                info, tier_name, data=b"".join(buffer) if tier_name == MEMORY else None, path=path
+            )
+            if path is not None and not stored:
+                _unlink(path)
+
+    def _store(self, info: ObjectInfo, tier_name: str, data: Optional[bytes], path: Optional[str]) -> bool:
+        tier = self._tiers[tier_name]
+        entry = CachedImage(
+            info=info,
+            tier=tier_name,
+            expires_at=time.monotonic() + self.ttl_seconds,
+            data=data,
+            path=path
+        )
+        with self._lock:
+            for other in self._tiers.values():
+                if info.key in other.entries:
+                    self._remove(other, info.key)
+
+            # Вытесняются самые давние записи, но не более популярные, чем новая
+            frequency = self._frequency.get(info.key, 0)
+            victims = []
+            free = tier.capacity - tier.bytes
+            for victim_key, victim in tier.entries.items():
+                if free >= info.size:
+                    break
+                if self._frequency.get(victim_key, 0) > frequency:
+                    self.rejections += 1
+                    return False
+                victims.append(victim_key)
+                free += victim.info.size
+            if free < info.size:
+                self.rejections += 1
+                return False
+
+            for victim_key in victims:
+                self._remove(tier, victim_key)
+                self.evictions += 1
+            tier.entries[info.key] = entry
+            tier.bytes += info.size
+            self.admissions += 1
+        return True
+
+    def _remove(self, tier: _Tier, key: str):
+        entry = tier.entries.pop(key)
+        tier.bytes -= entry.info.size
+        if entry.path is not None:
+            self._discard_file(entry.path)
+
+    def _discard_file(self, path: str):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            _unlink(path)
+            return
+        loop.call_later(self.UNLINK_DELAY_SECONDS, _unlink, path)
+
+    # ------------------------------------------------------------------
+    # Инвалидация
+    # ------------------------------------------------------------------
+
+    def invalidate(self, key: str):
+        """Вызывается после удаления или перезаписи объекта"""
+        with self._lock:
+            for tier in self._tiers.values():
+                if key in tier.entries:
+                    self._remove(tier, key)
+                    self.invalidations += 1
+
+    def invalidate_prefix(self, prefix: str):
+        with self._lock:
+            for tier in self._tiers.values():
+                for key in [key for key in tier.entries if key.startswith(prefix)]:
+                    self._remove(tier, key)
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            for tier in self._tiers.values():
+                tier.entries.clear()
+                tier.bytes = 0
+            self._frequency.clear()
+        logger.info("🧹 Image cache cleared")
+
+    def shutdown(self):
+        self.clear()
+        if self._disk_dir is not None:
+            shutil.rmtree(self._disk_dir, ignore_errors=True)
+            self._disk_dir = None
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            hits = sum(tier.hits for tier in self._tiers.values())
+            total = hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hit_ratio": round(hits / total, 3) if total else 0.0,
+                "misses": self.misses,
+                "bytes_from_storage": self.bytes_from_storage,
+                "admissions": self.admissions,
+                "rejections": self.rejections,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "tracked_keys": len(self._frequency),
+                **{name: tier.get_stats() for name, tier in self._tiers.items()}
+            }
+
+
+# Глобальный кэш горячих изображений
+image_cache = ImageCache(
+    enabled=settings.IMAGE_CACHE_ENABLED,
+    memory_bytes=settings.IMAGE_CACHE_MEMORY_BYTES,
+    memory_max_object=settings.IMAGE_CACHE_MEMORY_MAX_OBJECT,
+    disk_path=settings.IMAGE_CACHE_DISK_PATH,
+    disk_bytes=settings.IMAGE_CACHE_DISK_BYTES,
+    disk_max_object=settings.IMAGE_CACHE_DISK_MAX_OBJECT,
+    admit_after=settings.IMAGE_CACHE_ADMIT_AFTER,
+    frequency_window=settings.IMAGE_CACHE_FREQUENCY_WINDOW,
+    ttl_seconds=settings.IMAGE_CACHE_TTL_SECONDS
+)
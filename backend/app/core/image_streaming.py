@@ -0,0 +1,163 @@
+# app/core/image_streaming.py
+"""Отдача объектов хранилища потоком: Range (206), условные запросы (304).
+
+Тело не читается в память целиком: чтение диапазона по кускам
+IMAGE_STREAM_CHUNK_SIZE через асинхронное хранилище, поэтому память на
+запрос не зависит от размера изображения, а event loop не блокируется.
+Content-Type берётся из метаданных объекта (stat).
+
+Горячие объекты отдаются из image_cache без обращения к хранилищу: из памяти
+или с локального диска через FileResponse.
+"""
+import logging
+import mimetypes
+import re
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import FileResponse, StreamingResponse
+
+from app.core.config import settings
+from app.core.file_storage import ObjectNotFound, storage
+from app.core.image_cache import image_cache
+from app.core.http_cache import (
+    etag_matches, format_http_date, is_not_modified, not_modified_response, quote_etag, validator_headers
+)
+
+logger = logging.getLogger(__name__)
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Один диапазон "bytes=a-b" / "bytes=a-" / "bytes=-n" -> (start, end) включительно.
+
+    None - отдать объект целиком (нет заголовка или несколько диапазонов);
+    недопустимый диапазон - HTTP 416.
+    """
+    if not header:
+        return None
+    match = _RANGE.match(header.strip())
+    if not match:
+        # Несколько диапазонов или другой формат - RFC разрешает ответить 200
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if first:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Суффикс: последние n байт
+        length = int(last)
+        if length == 0:
+            start, end = size, size - 1
+        else:
+            start, end = max(size - length, 0), size - 1
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def _range_allowed(request: Request, etag: str, last_modified) -> bool:
+    """If-Range: диапазон действует, только если объект не изменился"""
+    if_range = request.headers.get("if-range")
+    if not if_range:
+        return True
+    if if_range.strip().startswith(("\"", "W/")):
+        # Для If-Range нужно строгое сравнение
+        return not if_range.strip().startswith("W/") and etag_matches(if_range, etag)
+    return last_modified is not None and if_range.strip() == format_http_date(last_modified)
+
+
+async def stream_object(
+    request: Request,
+    object_name: str,
+    cache_control: Optional[str] = None,
+    headers: Optional[Dict[str, str]] = None,
+    fallback: Optional[str] = None
+) -> Response:
+    """Ответ с объектом бакета: 200, 206 по Range или 304.
+
+    fallback - объект, который отдаётся, если object_name ещё нет
+    (вариант изображения до окончания фоновой генерации).
+    """
+    cached = image_cache.lookup(object_name)
+    if cached is not None:
+        stat = cached.info
+    else:
+        try:
+            stat = await storage.stat(object_name)
+        except ObjectNotFound:
+            if fallback:
+                # Под URL варианта ненадолго: вариант скоро появится
+                fallback_cache_control = f"public, max-age={settings.IMAGE_MISSING_VARIANT_TTL_SECONDS}"
+                return await stream_object(request, fallback, fallback_cache_control, headers)
+            logger.warning(f"Object {object_name} not found in storage")
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Image not found in storage"
+            )
+
+    etag = quote_etag(stat.etag)
+    response_headers = {
+        **(headers or {}),
+        **validator_headers(etag, stat.last_modified, cache_control),
+        "Accept-Ranges": "bytes"
+    }
+    if is_not_modified(request, etag, stat.last_modified):
+        not_modified = not_modified_response(response_headers)
+        not_modified.headers.update(headers or {})
+        return not_modified
+
+    size = stat.size
+    byte_range = None
+    if _range_allowed(request, etag, stat.last_modified):
+        byte_range = parse_range(request.headers.get("range"), size)
+
+    status_code = status.HTTP_200_OK
+    start, end = 0, size - 1
+    if byte_range is not None:
+        start, end = byte_range
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    length = end - start + 1
+    response_headers["Content-Length"] = str(length)
+
+    media_type = stat.content_type or mimetypes.guess_type(object_name)[0] or "application/octet-stream"
+    if length <= 0:
+        return Response(status_code=status_code, media_type=media_type, headers=response_headers)
+
+    image_cache.count_served(cached, length)
+    if cached is not None and cached.data is not None:
+        return Response(
+            content=cached.data[start:end + 1],
+            status_code=status_code,
+            media_type=media_type,
+            headers=response_headers
+        )
+    if cached is not None and "range" not in request.headers:
+        # Целиком с локального диска - FileResponse (sendfile, если есть у сервера)
+        return FileResponse(cached.path, headers=response_headers, media_type=media_type)
+
+    if cached is not None:
+        body = image_cache.iter_file(cached.path, start, length, settings.IMAGE_STREAM_CHUNK_SIZE)
+    else:
+        body = storage.iter_range(object_name, start, length, settings.IMAGE_STREAM_CHUNK_SIZE)
+        tier = image_cache.admission_tier(stat) if byte_range is None else None
+        if tier is not None:
+            # Полная отдача одновременно заполняет кэш
+            body = image_cache.fill(stat, tier, body)
+
+    return StreamingResponse(
+        body,
+        status_code=status_code,
+        media_type=media_type,
+        headers=response_headers
+    )
@@ -1,11 +1,10 @@
 import os
+from datetime import datetime, timedelta
+from typing import Optional
 from minio import Minio
 from minio.error import S3Error
 from fastapi import HTTPException
-import uuid
-from PIL import Image
-import io
-import base64
+import threading
 
 # Конфигурация MinIO
 MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
@@ -13,14 +12,70 @@ MINIO_ACCESS_KEY = os.getenv("MINIO_ACCESS_KEY", "minioadmin")
 MINIO_SECRET_KEY = os.getenv("MINIO_SECRET_KEY", "minioadmin")
 MINIO_SECURE = os.getenv("MINIO_SECURE", "False").lower() == "true"
 MINIO_BUCKET_NAME = os.getenv("MINIO_BUCKET_NAME", "images")
+# Адрес MinIO (или CDN перед ним), доступный браузеру - для подписанных ссылок
+MINIO_PUBLIC_ENDPOINT = os.getenv("MINIO_PUBLIC_ENDPOINT", "") or MINIO_ENDPOINT
+MINIO_PUBLIC_SECURE = os.getenv("MINIO_PUBLIC_SECURE", str(MINIO_SECURE)).lower() == "true"
+MINIO_REGION = os.getenv("MINIO_REGION", "us-east-1")
+
+# Уменьшенные варианты изображения: variants/<имя без расширения>/w<ширина>.<формат>
+VARIANTS_PREFIX = "variants/"
+
+
+def variant_prefix(object_name: str) -> str:
+    return f"{VARIANTS_PREFIX}{object_name.rsplit('.', 1)[0]}/"
+
+
+_signer: Optional[Minio] = None
+
+
+def presigned_object_url(
+    object_name: str,
+    expires: timedelta,
+    request_date: Optional[datetime] = None,
+    response_headers: Optional[dict] = None
+) -> str:
+    """Подписанная ссылка на объект для публичного адреса MinIO.
+
+    Подпись считается локально (регион задан - без запроса к серверу);
+    при одинаковом request_date ссылка одинакова во всех процессах.
+    """
+    global _signer
+    if _signer is None:
+        _signer = Minio(
+            MINIO_PUBLIC_ENDPOINT,
+            access_key=MINIO_ACCESS_KEY,
+            secret_key=MINIO_SECRET_KEY,
+            secure=MINIO_PUBLIC_SECURE,
+            region=MINIO_REGION
+        )
+    return _signer.presigned_get_object(
+        MINIO_BUCKET_NAME,
+        object_name,
+        expires=expires,
+        response_headers=response_headers,
+        request_date=request_date
+    )
 
 class MinIOClient:
     def __init__(self):
+        import urllib3
+        from app.core.config import settings
+
+        # Пул соединений под пул потоков хранилища и параллельные части
+        # multipart; повторы делает app/core/file_storage.py (с jitter)
         self.client = Minio(
             MINIO_ENDPOINT,
             access_key=MINIO_ACCESS_KEY,
             secret_key=MINIO_SECRET_KEY,
-            secure=MINIO_SECURE
+            secure=MINIO_SECURE,
+            http_client=urllib3.PoolManager(
+                maxsize=settings.STORAGE_MAX_CONNECTIONS,
+                timeout=urllib3.Timeout(
+                    connect=settings.STORAGE_CONNECT_TIMEOUT_SECONDS,
+                    read=settings.STORAGE_READ_TIMEOUT_SECONDS
+                ),
+                retries=False
+            )
         )
         self.bucket_name = MINIO_BUCKET_NAME
         self._ensure_bucket_exists()
@@ -38,82 +93,15 @@ class MinIOClient:
                 detail=f"MinIO bucket error: {str(e)}"
             )
 
-    async def upload_image_base64(self, base64_data: str) -> str:
-        """Загружает изображение из base64 в MinIO"""
-        try:
-            if ',' in base64_data:
-                base64_data = base64_data.split(',')[1]
-            
-            image_bytes = base64.b64decode(base64_data)
-            
-            image = Image.open(io.BytesIO(image_bytes))
-
-            if image.mode in ('RGBA', 'LA', 'P'):
-                image = image.convert('RGB')
-
-            output_buffer = io.BytesIO()
-            image.save(output_buffer, "JPEG", quality=85, optimize=True)
-            output_buffer.seek(0)
-
-            filename = f"{uuid.uuid4()}.jpg"
-
-            self.client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=filename,
-                data=output_buffer,
-                length=len(output_buffer.getvalue()),
-                content_type='image/jpeg'
-            )
-
-            return f"/minio/{self.bucket_name}/{filename}"
-            
-        except Exception as e:
-            print(f"MinIO upload error: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error uploading image to MinIO: {str(e)}"
-            )
-
-    async def upload_image_file(self, file) -> str:
-        """Загружает файл изображения в MinIO"""
+    def get_image_bytes(self, image_url: str) -> bytes:
+        """Читает изображение из MinIO по URL вида /minio/{bucket}/{filename}"""
+        filename = image_url.split('/')[-1]
+        response = self.client.get_object(self.bucket_name, filename)
         try:
-            contents = await file.read()
-            
-            MAX_FILE_SIZE = 10 * 1024 * 1024
-            if len(contents) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"File too large. Max size: {MAX_FILE_SIZE // 1024 // 1024}MB"
-                )
-            
-            image = Image.open(io.BytesIO(contents))
-            
-            if image.mode in ('RGBA', 'LA', 'P'):
-                image = image.convert('RGB')
-            
-            output_buffer = io.BytesIO()
-            image.save(output_buffer, "JPEG", quality=85, optimize=True)
-            output_buffer.seek(0)
-            
-            file_extension = ".jpg" 
-            filename = f"{uuid.uuid4()}{file_extension}"
-            
-            self.client.put_object(
-                bucket_name=self.bucket_name,
-                object_name=filename,
-                data=output_buffer,
-                length=len(output_buffer.getvalue()),
-                content_type='image/jpeg'
-            )
-            
-            return f"/minio/{self.bucket_name}/{filename}"
-            
-        except Exception as e:
-            print(f"MinIO upload error: {e}")
-            raise HTTPException(
-                status_code=500,
-                detail=f"Error uploading image to MinIO: {str(e)}"
-            )
+            return response.read()
+        finally:
+            response.close()
+            response.release_conn()
 
     def delete_image(self, image_url: str) -> bool:
         """Удаляет изображение из MinIO"""
@@ -127,6 +115,7 @@ class MinIOClient:
                 return False
                 
             self.client.remove_object(self.bucket_name, filename)
+            self._delete_variants(filename)
             return True
             
         except S3Error as e:
@@ -136,6 +125,11 @@ class MinIOClient:
             print(f"Error deleting image from MinIO: {e}")
             return False
 
+    def _delete_variants(self, filename: str):
+        """Удаляет уменьшенные варианты изображения вместе с оригиналом"""
+        for obj in self.client.list_objects(self.bucket_name, prefix=variant_prefix(filename), recursive=True):
+            self.client.remove_object(self.bucket_name, obj.object_name)
+
     def get_image_url(self, image_url: str) -> str:
         """Генерирует URL для доступа к изображению"""
         if not image_url:
@@ -146,13 +140,30 @@ class MinIOClient:
             
         filename = image_url.split('/')[-1]
         try:
-            return self.client.presigned_get_object(
-                self.bucket_name,
-                filename,
-                expires=604800 
-            )
+            return presigned_object_url(filename, expires=timedelta(days=7))
         except S3Error:
 
             return image_url
 
-minio_client = MinIOClient()
\ No newline at end of file
+class _LazyMinIOClient:
+    """Клиент создаётся при первом обращении: импорт модуля не ходит в MinIO"""
+
+    def __init__(self):
+        self._instance = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_initialized(self) -> bool:
+        return self._instance is not None
+
+    def _get_instance(self) -> MinIOClient:
+        if self._instance is None:
+            with self._lock:
+                if self._instance is None:
+                    self._instance = MinIOClient()
+        return self._instance
+
+    def __getattr__(self, name):
+        return getattr(self._get_instance(), name)
+
+minio_client = _LazyMinIOClient()
\ No newline at end of file
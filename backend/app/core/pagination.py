@@ -0,0 +1,106 @@
+# app/core/pagination.py
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+@dataclass(frozen=True)
+class KeysetOrder:
+    """Порядок выдачи списка: ключевые колонки и направление, последняя - уникальная (id).
+
+    Для каждого порядка должен быть составной индекс с теми же колонками
+    (см. миграцию a7c3e9f1b254).
+    """
+    name: str
+    columns: Tuple[Any, ...]
+    descending: bool = True
+
+    def order_by(self) -> List:
+        return [column.desc() if self.descending else column.asc() for column in self.columns]
+
+    def after(self, values: List) -> Any:
+        """Условие "строго после курсора" - сравнение кортежей, которое Postgres
+        выполняет по индексу (created_at, id) без чтения предыдущих страниц"""
+        row = tuple_(*self.columns)
+        bound = tuple_(*values)
+        return row < bound if self.descending else row > bound
+
+    def key_of(self, item) -> List:
+        return [getattr(item, column.key) for column in self.columns]
+
+
+class Page(NamedTuple):
+    items: List
+    next_cursor: Optional[str]
+
+
+def encode_cursor(order: KeysetOrder, values: List) -> str:
+    payload = {
+        "o": order.name,
+        "k": [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    }
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(order: KeysetOrder, cursor: str) -> List:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload["o"] != order.name or len(payload["k"]) != len(order.columns):
+            raise ValueError("cursor belongs to another listing")
+        return [
+            datetime.fromisoformat(value) if value is not None and column.type.python_type is datetime else value
+            for column, value in zip(order.columns, payload["k"])
+        ]
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid cursor: {e}"
+        )
+
+
+def paginate(
+    query: Query,
+    order: KeysetOrder,
+    limit: Optional[int],
+    cursor: Optional[str] = None,
+    skip: int = 0
+) -> Page:
+    """Страница по курсору; без курсора - совместимый режим со skip (offset).
+
+    Выбирается limit + 1 строка: лишняя строка означает, что есть следующая
+    страница, и её курсор строится по последнему элементу текущей.
+    """
+    query = query.order_by(*order.order_by())
+    if cursor:
+        query = query.filter(order.after(decode_cursor(order, cursor)))
+    elif skip:
+        query = query.offset(skip)
+
+    if limit is None:
+        return Page(query.all(), None)
+
+    items = query.limit(limit + 1).all()
+    if len(items) <= limit:
+        return Page(items, None)
+    items = items[:limit]
+    return Page(items, encode_cursor(order, order.key_of(items[-1])))
+
+
+def cursor_headers(page: Page) -> Dict[str, str]:
+    return {NEXT_CURSOR_HEADER: page.next_cursor} if page.next_cursor else {}
+
+
+def set_next_cursor(response: Response, page: Page) -> List:
+    """Курсор следующей страницы - в заголовке, тело ответа остаётся списком"""
+    response.headers.update(cursor_headers(page))
+    return page.items
@@ -0,0 +1,172 @@
+# app/core/presigned_urls.py
+"""Отдача изображений редиректом на подписанную ссылку хранилища.
+
+В режиме IMAGE_DELIVERY="redirect" эндпоинты изображений отвечают 307 на
+presigned URL MinIO, и байты изображений идут мимо воркеров Python.
+
+Подписи выровнены по окнам IMAGE_PRESIGN_WINDOW_SECONDS: дата подписи -
+начало текущего окна, поэтому в течение окна ссылка на объект одна и та же
+во всех воркерах (браузер и CDN кэшируют её как обычный URL), а подпись
+вычисляется один раз на объект за окно. Ссылка действует
+IMAGE_PRESIGN_EXPIRES_SECONDS от начала окна, редирект кэшируется клиентом
+до конца окна - к моменту перехода по нему ссылка гарантированно жива.
+
+Пока варианта изображения нет, редирект ведёт на оригинал и кэшируется
+только IMAGE_MISSING_VARIANT_TTL_SECONDS: построенный вариант клиент
+получит вскоре, а не через окно.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi import Response
+from fastapi.responses import RedirectResponse
+
+from app.core.config import settings
+from app.core.file_storage import ObjectNotFound, storage
+
+logger = logging.getLogger(__name__)
+
+
+class PresignedUrlCache:
+    """Подписанные ссылки на объекты, действительные в пределах окна"""
+
+    def __init__(
+        self,
+        window_seconds: int,
+        expires_seconds: int,
+        missing_ttl_seconds: int,
+        max_entries: int = 10000
+    ):
+        self.window_seconds = window_seconds
+        # Редирект, закэшированный в конце окна, должен вести на живую ссылку
+        self.expires_seconds = max(expires_seconds, 2 * window_seconds)
+        self.missing_ttl_seconds = missing_ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        # Ключ -> момент (monotonic), до которого считаем объект отсутствующим
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.signed = 0
+        self.fallbacks = 0
+
+    def _window_start(self, now: float) -> int:
+        return int(now // self.window_seconds) * self.window_seconds
+
+    def _cached(self, key: str, window: int) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != window:
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def _sign(self, key: str, window: int) -> Optional[str]:
+        url = storage.presigned_url(
+            key,
+            request_date=datetime.fromtimestamp(window, tz=timezone.utc),
+            expires=timedelta(seconds=self.expires_seconds)
+        )
+        if url is None:
+            return None
+        with self._lock:
+            self._entries[key] = (window, url)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self.signed += 1
+        return url
+
+    def _known_missing(self, key: str) -> bool:
+        with self._lock:
+            deadline = self._missing.get(key)
+            if deadline is None:
+                return False
+            if deadline <= time.monotonic():
+                del self._missing[key]
+                return False
+            return True
+
+    def _mark_missing(self, key: str):
+        with self._lock:
+            self._missing[key] = time.monotonic() + self.missing_ttl_seconds
+            self._missing.move_to_end(key)
+            while len(self._missing) > self.max_entries:
+                self._missing.popitem(last=False)
+
+    async def _resolve(self, key: str, fallback: Optional[str]) -> Tuple[Optional[str], bool]:
+        """(ссылка, использован ли fallback)"""
+        window = self._window_start(time.time())
+        url = self._cached(key, window)
+        if url is not None:
+            return url, False
+        if fallback:
+            missing = self._known_missing(key)
+            if not missing:
+                try:
+                    await storage.stat(key)
+                except ObjectNotFound:
+                    self._mark_missing(key)
+                    missing = True
+            if missing:
+                self.fallbacks += 1
+                return await self.url_for(fallback), True
+        return self._sign(key, window), False
+
+    async def url_for(self, key: str, fallback: Optional[str] = None) -> Optional[str]:
+        """Подписанная ссылка на key или на fallback, если key ещё нет.
+
+        Существование проверяется только при наличии fallback (вариант
+        изображения до окончания генерации): найденный объект - один раз
+        за окно, отсутствие - раз в IMAGE_MISSING_VARIANT_TTL_SECONDS.
+        """
+        url, _ = await self._resolve(key, fallback)
+        return url
+
+    async def redirect(
+        self,
+        key: str,
+        headers: Optional[Dict[str, str]] = None,
+        fallback: Optional[str] = None
+    ) -> Optional[Response]:
+        """307 на подписанную ссылку; None - бэкенд хранилища без подписанных ссылок"""
+        url, fell_back = await self._resolve(key, fallback)
+        if url is None:
+            return None
+        now = time.time()
+        max_age = max(1, int(self._window_start(now) + self.window_seconds - now))
+        if fell_back:
+            # Вариант скоро появится - редирект на оригинал ненадолго
+            max_age = min(max_age, self.missing_ttl_seconds)
+        return RedirectResponse(
+            url,
+            status_code=307,
+            headers={**(headers or {}), "Cache-Control": f"public, max-age={max_age}"}
+        )
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                "mode": settings.IMAGE_DELIVERY,
+                "window_seconds": self.window_seconds,
+                "expires_seconds": self.expires_seconds,
+                "entries": len(self._entries),
+                "missing": len(self._missing),
+                "hits": self.hits,
+                "signed": self.signed,
+                "fallbacks": self.fallbacks
+            }
+
+
+# Глобальный кэш подписанных ссылок на изображения
+presigned_urls = PresignedUrlCache(
+    window_seconds=settings.IMAGE_PRESIGN_WINDOW_SECONDS,
+    expires_seconds=settings.IMAGE_PRESIGN_EXPIRES_SECONDS,
+    missing_ttl_seconds=settings.IMAGE_MISSING_VARIANT_TTL_SECONDS
+)
@@ -0,0 +1,75 @@
+# app/core/process_metrics.py
+import os
+import resource
+from typing import Dict, List, Optional
+
+# Поля /proc/<pid>/smaps_rollup, в кБ
+_SMAPS_FIELDS = {
+    "Rss": "rss_mb",
+    "Pss": "pss_mb",
+    "Shared_Clean": "shared_clean_mb",
+    "Shared_Dirty": "shared_dirty_mb",
+    "Private_Clean": "private_clean_mb",
+    "Private_Dirty": "private_dirty_mb"
+}
+
+
+def _read_smaps_rollup(pid: int) -> Optional[Dict]:
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    usage = {}
+    for line in lines:
+        parts = line.split()
+        if len(parts) >= 2 and parts[0].rstrip(":") in _SMAPS_FIELDS:
+            usage[_SMAPS_FIELDS[parts[0].rstrip(":")]] = round(int(parts[1]) / 1024, 1)
+    return usage
+
+
+def get_memory_usage(pid: Optional[int] = None) -> Dict:
+    """Память процесса: RSS, PSS (доля общих страниц) и разделяемые/частные страницы.
+
+    У воркеров, разделяющих модель с master через fork, RSS включает общие
+    страницы целиком, а PSS делит их между процессами - суммировать нужно PSS.
+    """
+    pid = pid or os.getpid()
+    usage = _read_smaps_rollup(pid)
+    if usage is None and pid == os.getpid():
+        # Не Linux - только пиковый RSS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage = {"max_rss_mb": round(max_rss / 1024, 1)}
+    return {"pid": pid, **(usage or {})}
+
+
+def _children(pid: int) -> List[int]:
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # Имя процесса в скобках может содержать пробелы - берём поля после ")"
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def get_workers_memory() -> Dict:
+    """Память master-процесса gunicorn и всех его воркеров (из любого воркера)"""
+    master_pid = os.getppid()
+    try:
+        workers = [get_memory_usage(pid) for pid in _children(master_pid)]
+    except OSError:
+        workers = []
+
+    return {
+        "master": get_memory_usage(master_pid),
+        "workers": workers,
+        "total_pss_mb": round(sum(worker.get("pss_mb", 0) for worker in workers), 1)
+    }
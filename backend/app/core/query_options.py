@@ -0,0 +1,58 @@
+# app/core/query_options.py
+"""Профили загрузки связей под схемы ответов.
+
+Схемы с from_attributes читают связи (category, tags, items.product)
+у каждой строки - без заранее загруженных связей это отдельный SELECT на
+строку. Профиль загружает их пакетно: по одному SELECT ... WHERE id IN (...)
+на связь, поэтому число запросов не зависит от размера страницы.
+
+Используется selectinload, а не joinedload: он не раздувает строки
+основного запроса и совместим с LIMIT, GROUP BY и курсорной пагинацией.
+"""
+from typing import Tuple
+
+from sqlalchemy.orm import selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+
+from app.models.cart import CartItem
+from app.models.favorite import Favorite
+from app.models.order import Order, OrderItem
+from app.models.product import Product
+from app.models.promotions import Promotion
+
+
+def product_response_options() -> Tuple[LoaderOption, ...]:
+    """ProductResponse: категория и теги"""
+    return (
+        selectinload(Product.category),
+        selectinload(Product.tags)
+    )
+
+
+def order_response_options() -> Tuple[LoaderOption, ...]:
+    """OrderResponse: позиции заказа -> товар -> ProductResponse"""
+    return (
+        selectinload(Order.items).selectinload(OrderItem.product).options(*product_response_options()),
+    )
+
+
+def cart_item_response_options() -> Tuple[LoaderOption, ...]:
+    """CartItemResponse: товар -> ProductResponse"""
+    return (
+        selectinload(CartItem.product).options(*product_response_options()),
+    )
+
+
+def favorite_response_options() -> Tuple[LoaderOption, ...]:
+    """FavoriteWithProductResponse: товар и его категория (теги не отдаются)"""
+    return (
+        selectinload(Favorite.product).selectinload(Product.category),
+    )
+
+
+def promotion_rules_options() -> Tuple[LoaderOption, ...]:
+    """Расчёт скидок корзины: категории и товары каждой акции"""
+    return (
+        selectinload(Promotion.categories),
+        selectinload(Promotion.products)
+    )
@@ -0,0 +1,82 @@
+# app/core/sql_statements.py
+"""Подсчёт SQL-запросов на HTTP-запрос и бюджеты по эндпоинтам.
+
+Бюджет - максимум запросов на один вызов эндпоинта вместе с
+аутентификацией. С профилями загрузки (app/core/query_options.py) число
+запросов не зависит от размера страницы; превышение бюджета означает
+новую N+1-загрузку. Проверка: python -m pytest tests (база с тестовыми
+данными создаётся фикстурами) или python -m scripts.check_sql_statements
+на существующей базе.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS_HEADER = "X-SQL-Statements"
+
+# Шаблон пути эндпоинта -> максимум SQL-запросов
+STATEMENT_BUDGETS: Dict[str, int] = {
+    "/products/": 3,
+    "/products/search": 4,
+    "/products/search/by-tags": 3,
+    "/products/items/{product_id}": 3,
+    "/products/tags/{tag_id}/products": 4,
+    "/products/admin/products": 5,
+    "/products/admin/tags/{tag_id}/products": 6,
+    "/cart/": 9,
+    "/orders/": 6,
+    "/orders/{order_id}": 6,
+    "/orders/admin/orders": 7,
+    "/favorites/": 4
+}
+
+
+class StatementCounter:
+    def __init__(self):
+        self.count = 0
+        self.statements: List[str] = []
+
+
+_current_counter: ContextVar[Optional[StatementCounter]] = ContextVar("sql_statement_counter", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Контекст копируется в потоки пула FastAPI, объект счётчика - общий
+    counter = _current_counter.get()
+    if counter is not None:
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+def install_statement_counter(engine: Engine) -> None:
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+
+@contextmanager
+def count_statements() -> Iterator[StatementCounter]:
+    """Считает запросы, выполненные внутри блока (в том числе в дочерних задачах)"""
+    counter = StatementCounter()
+    token = _current_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _current_counter.reset(token)
+
+
+def check_budget(route_path: str, counter: StatementCounter) -> Optional[int]:
+    """Возвращает бюджет, если он превышен"""
+    budget = STATEMENT_BUDGETS.get(route_path)
+    if budget is not None and counter.count > budget:
+        logger.warning(
+            f"⚠️ {route_path}: {counter.count} SQL statements (budget {budget}). "
+            f"Last: {counter.statements[-1][:200] if counter.statements else ''}"
+        )
+        return budget
+    return None
@@ -0,0 +1,177 @@
+# app/core/startup.py
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def _check_database():
+    from sqlalchemy import text
+    from app.models.database import engine
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def _check_minio():
+    if settings.STORAGE_BACKEND == "local":
+        return
+    from app.core.minio_client import minio_client
+    # Первое обращение создаёт клиент и проверяет bucket
+    minio_client.client.bucket_exists(minio_client.bucket_name)
+
+
+def _check_rabbitmq():
+    import pika
+    connection = pika.BlockingConnection(pika.URLParameters(settings.RABBITMQ_URL))
+    connection.close()
+
+
+def _bootstrap_database():
+    """Таблицы и начальная роль - раньше выполнялось при импорте main"""
+    from app.models.database import engine, Base, SessionLocal
+    from app.models.user import Role
+
+    if settings.STARTUP_CREATE_TABLES:
+        from app.services.product_search import ensure_search_indexes
+        import app.models.stored_object  # noqa: F401 - счётчики ссылок на изображения
+        Base.metadata.create_all(bind=engine)
+        # pg_trgm и триграммные индексы create_all не создаёт
+        with engine.begin() as connection:
+            ensure_search_indexes(connection)
+
+    db = SessionLocal()
+    try:
+        if not db.query(Role).filter(Role.id == 1).first():
+            role = Role(id=1, name='user', description='Regular User')
+            db.add(role)
+            db.commit()
+            logger.info("✅ Initial role created")
+    finally:
+        db.close()
+
+
+class StartupManager:
+    """Запуск приложения по фазам: API принимает запросы сразу, тяжёлое - в фоне.
+
+    Проверки Postgres, MinIO и RabbitMQ выполняются параллельно с таймаутом;
+    готовность (readiness) зависит только от базы данных, остальное
+    отображается в /health/ready для диагностики.
+    """
+
+    CHECKS: Dict[str, Callable[[], None]] = {
+        "database": _check_database,
+        "minio": _check_minio,
+        "rabbitmq": _check_rabbitmq
+    }
+    REQUIRED = ("database", "bootstrap")
+
+    def __init__(self):
+        self._started_at = time.monotonic()
+        self._phases: Dict[str, Dict] = {}
+        self._checks: Dict[str, Dict] = {}
+        self._tasks = []
+        self._lock = threading.Lock()
+        # Проверки, поток которых ещё не вернулся (после таймаута он продолжает работать)
+        self._running = set()
+
+    def _record(self, target: Dict, name: str, started: float, error: Optional[Exception] = None):
+        entry = {
+            "status": "failed" if error else "ok",
+            "duration_ms": round((time.monotonic() - started) * 1000, 1),
+            "finished_at_ms": round((time.monotonic() - self._started_at) * 1000, 1)
+        }
+        if error:
+            entry["error"] = str(error) or type(error).__name__
+        with self._lock:
+            target[name] = entry
+
+    async def _run_phase(self, name: str, func: Callable[[], None]) -> bool:
+        """Синхронная фаза в пуле потоков; ошибка фазы не останавливает остальные"""
+        started = time.monotonic()
+        with self._lock:
+            self._phases[name] = {"status": "running"}
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, func)
+        except Exception as e:
+            logger.warning(f"⚠️ Startup phase '{name}' failed: {e}")
+            self._record(self._phases, name, started, e)
+            return False
+        self._record(self._phases, name, started)
+        logger.info(f"✅ Startup phase '{name}' done in {self._phases[name]['duration_ms']} ms")
+        return True
+
+    async def _run_check(self, name: str) -> bool:
+        if name in self._running:
+            # Предыдущая проверка зависла - новую не запускаем, результат прежний
+            return False
+        started = time.monotonic()
+        self._running.add(name)
+        future = asyncio.get_running_loop().run_in_executor(None, self.CHECKS[name])
+        future.add_done_callback(lambda _: self._running.discard(name))
+        try:
+            # shield: по таймауту перестаём ждать, но отметка снимается по окончании потока
+            await asyncio.wait_for(asyncio.shield(future), settings.STARTUP_CHECK_TIMEOUT_SECONDS)
+        except Exception as e:
+            self._record(self._checks, name, started, e)
+            return False
+        self._record(self._checks, name, started)
+        return True
+
+    async def check_dependencies(self) -> Dict[str, Dict]:
+        """Параллельная проверка всех зависимостей, время - по самой медленной"""
+        await asyncio.gather(*(self._run_check(name) for name in self.CHECKS))
+        return self.get_checks()
+
+    def start(self, background_phases: Dict[str, Callable[[], None]]):
+        """Запускает фоновый старт; не ждёт его завершения"""
+        self._tasks.append(asyncio.create_task(self._startup(background_phases)))
+
+    async def _refresh_checks(self):
+        """Периодическая проверка зависимостей - /health/ready отдаёт последний результат"""
+        while True:
+            await asyncio.sleep(settings.STARTUP_CHECK_INTERVAL_SECONDS)
+            await self.check_dependencies()
+
+    async def _startup(self, background_phases: Dict[str, Callable[[], None]]):
+        await self.check_dependencies()
+        self._tasks.append(asyncio.create_task(self._refresh_checks()))
+        # База может подняться позже API (docker-compose) - повторяем до успеха
+        while not await self._run_phase("bootstrap", _bootstrap_database):
+            await asyncio.sleep(settings.STARTUP_RETRY_SECONDS)
+        await asyncio.gather(*(self._run_phase(name, func) for name, func in background_phases.items()))
+        logger.info(f"🚀 Startup finished in {round((time.monotonic() - self._started_at) * 1000)} ms")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    def get_checks(self) -> Dict[str, Dict]:
+        with self._lock:
+            return dict(self._checks)
+
+    def get_phases(self) -> Dict[str, Dict]:
+        with self._lock:
+            return dict(self._phases)
+
+    def is_ready(self) -> bool:
+        status = {**self.get_phases(), **self.get_checks()}
+        return all(status.get(name, {}).get("status") == "ok" for name in self.REQUIRED)
+
+    def get_status(self) -> Dict:
+        return {
+            "ready": self.is_ready(),
+            "uptime_ms": round((time.monotonic() - self._started_at) * 1000, 1),
+            "checks": self.get_checks(),
+            "phases": self.get_phases()
+        }
+
+
+# Глобальный менеджер запуска
+startup_manager = StartupManager()
@@ -1,6 +1,6 @@
 # app/models/analysis.py
 from sqlalchemy.orm import relationship
-from sqlalchemy import Column, Integer, String, DateTime, Float, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Float, JSON, Text, Index
 from sqlalchemy.sql import func
 from sqlalchemy import ForeignKey
 from app.models.database import Base
@@ -10,6 +10,7 @@ class AnalysisHistory(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    image_hash = Column(String(64), index=True)
     detected_dish = Column(String(255), nullable=False)
     confidence = Column(Float, nullable=False)
     ingredients = Column(JSON)
@@ -18,4 +19,24 @@ class AnalysisHistory(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    user = relationship("User", back_populates="analysis_history")
\ No newline at end of file
+    user = relationship("User", back_populates="analysis_history")
+
+    __table_args__ = (
+        Index('ix_analysis_history_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_analysis_history_created_at_id', 'created_at', 'id'),
+    )
+
+
+class AnalysisJob(Base):
+    __tablename__ = "analysis_jobs"
+
+    id = Column(String(36), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    status = Column(String(20), nullable=False, default="queued")  # queued, processing, done, failed
+    image_url = Column(String(500), nullable=False)
+    image_hash = Column(String(64))
+    analysis_id = Column(Integer, ForeignKey("analysis_history.id", ondelete="SET NULL"))
+    result = Column(JSON)
+    error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.models.database import Base
@@ -12,4 +12,8 @@ class Favorite(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     user = relationship("User")
-    product = relationship("Product")
\ No newline at end of file
+    product = relationship("Product")
+
+    __table_args__ = (
+        Index('ix_favorites_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.models.database import Base
@@ -20,6 +20,12 @@ class Order(Base):
     items = relationship("OrderItem", back_populates="order")
     promotions = relationship("OrderPromotion", back_populates="order")
 
+    __table_args__ = (
+        Index('ix_orders_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+        Index('ix_orders_created_at_id', 'created_at', 'id'),
+        Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+    )
+
 class OrderItem(Base):
     __tablename__ = "order_items"
     
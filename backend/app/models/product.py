@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, Float, DateTime, Boolean, ForeignKey, UniqueConstraint, Computed, Index
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, deferred
 from app.models.database import Base
 
 class Category(Base):
@@ -38,6 +39,13 @@ class Product(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    # Полнотекстовый поиск: название весомее описания (см. app/services/product_search.py)
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('russian', coalesce(name, '')), 'A') || "
+        "setweight(to_tsvector('russian', coalesce(description, '')), 'B')",
+        persisted=True
+    )))
     
     category = relationship("Category", back_populates="products")
     
@@ -45,6 +53,13 @@ class Product(Base):
     tags = relationship("Tag", secondary="product_tags", back_populates="products")
     product_tags = relationship("ProductTag", back_populates="product")
 
+    __table_args__ = (
+        Index('ix_products_search_vector', 'search_vector', postgresql_using='gin'),
+        # Курсорная пагинация каталога (app/core/pagination.py)
+        Index('ix_products_created_at_id', 'created_at', 'id'),
+        Index('ix_products_category_created_at_id', 'category_id', 'created_at', 'id'),
+    )
+
 class ProductTag(Base):
     __tablename__ = "product_tags"
     
@@ -55,6 +70,7 @@ class ProductTag(Base):
     
     __table_args__ = (
         UniqueConstraint('product_id', 'tag_id', name='uq_product_tag'),
+        Index('ix_product_tags_tag_id_product_id', 'tag_id', 'product_id'),
     )
     
     product = relationship("Product", back_populates="product_tags")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Enum, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Enum, ForeignKey, Text, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.models.enum.promotions import PromotionType
@@ -18,13 +18,18 @@ class Promotion(Base):
     start_date = Column(DateTime, nullable=False)    
     end_date = Column(DateTime, nullable=False) 
     is_active = Column(Boolean, default=True) 
-    priority = Column(Integer, default=0)  
+    priority = Column(Integer, nullable=False, default=0, server_default="0")  # NOT NULL - ключ keyset-курсора
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     gift_product = relationship("Product", foreign_keys=[gift_product_id])
     categories = relationship("PromotionCategory", back_populates="promotion")
     products = relationship("PromotionProduct", back_populates="promotion")
 
+    __table_args__ = (
+        Index('ix_promotions_priority_created_at_id', 'priority', 'created_at', 'id'),
+        Index('ix_promotions_created_at_id', 'created_at', 'id'),
+    )
+
 class PromotionCategory(Base):
     __tablename__ = "promotion_categories"
     
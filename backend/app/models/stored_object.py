@@ -0,0 +1,15 @@
+# app/models/stored_object.py
+from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy.sql import func
+from app.models.database import Base
+
+
+class StoredObject(Base):
+    """Объект хранилища с ключом по содержимому (SHA-256) и числом ссылок на него"""
+    __tablename__ = "stored_objects"
+
+    key = Column(String(255), primary_key=True)  # <sha256>.<расширение>
+    size = Column(Integer, nullable=False)
+    content_type = Column(String(100))
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
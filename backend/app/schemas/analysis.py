@@ -17,6 +17,7 @@ class AnalysisResponse(BaseModel):
     detected_dish: str
     confidence: float
     message: str
+    dishes: List[Dict] = []  # top-k блюд с уверенностью и весом
     basic_ingredients: List[str]
     additional_ingredients: List[str]
     basic_alternatives: List[Dict]
@@ -39,4 +40,14 @@ class AnalysisStatsResponse(BaseModel):
     total_analyses: int
     high_confidence_analyses: int
     recent_week_analyses: int
-    success_rate: float
\ No newline at end of file
+    success_rate: float
+
+class AnalysisJobResponse(BaseModel):
+    job_id: str
+    status: str
+    analysis_id: Optional[int] = None
+    image_url: Optional[str] = None
+    result: Optional[Dict] = None
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
@@ -42,6 +42,13 @@ class PromotionUpdate(BaseModel):
     is_active: Optional[bool] = None
     priority: Optional[int] = None
 
+    @validator('priority', pre=True)
+    def priority_not_null(cls, v):
+        # Поле можно не передавать, но не обнулять: колонка NOT NULL
+        if v is None:
+            raise ValueError('Priority cannot be null')
+        return v
+
 class PromotionResponse(PromotionBase):
     id: int
     is_active: bool
@@ -0,0 +1,180 @@
+# app/services/analysis_cache.py
+import hashlib
+import io
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+def compute_image_hashes(image_bytes: bytes, image: Optional["Image.Image"] = None) -> Tuple[str, Optional[str]]:
+    """SHA-256 байтов и перцептивный dHash (64 бита) изображения.
+
+    dHash совпадает у пережатых/пересохранённых копий одной фотографии,
+    поэтому повторная загрузка той же фотографии попадает в кэш даже
+    при другом байтовом представлении.
+    """
+    from PIL import Image
+
+    sha256 = hashlib.sha256(image_bytes).hexdigest()
+
+    try:
+        if image is None:
+            image = Image.open(io.BytesIO(image_bytes))
+            image.draft("L", (64, 64))
+        pixels = list(image.convert("L").resize((9, 8), Image.BILINEAR).getdata())
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {e}")
+        return sha256, None
+
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+
+    return sha256, f"{bits:016x}"
+
+
+class AnalysisResultCache:
+    """Кэш результатов распознавания: in-process LRU + опционально Redis"""
+
+    KEY_PREFIX = "analysis:result:"
+
+    def __init__(self, max_entries: int, ttl_seconds: int, use_redis: bool):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.use_redis = use_redis
+        self._entries: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_redis(self):
+        if not self.use_redis:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_timeout=0.2,
+                socket_connect_timeout=0.2
+            )
+        return self._redis
+
+    def _keys(self, image_hash: str, perceptual_hash: Optional[str], user_id: Optional[int]):
+        # dHash совпадает и у разных, но похожих фотографий - результат по нему
+        # переиспользуется только в пределах одного пользователя,
+        # между пользователями - только по точному совпадению SHA-256
+        keys = [f"sha256:{image_hash}"]
+        if perceptual_hash and user_id is not None:
+            keys.append(f"dhash:{user_id}:{perceptual_hash}")
+        return keys
+
+    def get(
+        self,
+        image_hash: str,
+        perceptual_hash: Optional[str] = None,
+        user_id: Optional[int] = None
+    ) -> Optional[Dict]:
+        """Поиск результата по SHA-256, затем по перцептивному хэшу пользователя"""
+        keys = self._keys(image_hash, perceptual_hash, user_id)
+        now = time.monotonic()
+
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is None:
+                    continue
+                expires_at, result = entry
+                if expires_at < now:
+                    del self._entries[key]
+                    continue
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                for key, value in zip(keys, client.mget([self.KEY_PREFIX + k for k in keys])):
+                    if value is None:
+                        continue
+                    result = json.loads(value)
+                    self._store_local(keys, result)
+                    self.redis_hits += 1
+                    return result
+        except Exception as e:
+            logger.warning(f"Redis analysis cache unavailable: {e}")
+
+        self.misses += 1
+        return None
+
+    def set(
+        self,
+        image_hash: str,
+        perceptual_hash: Optional[str],
+        result: Dict,
+        user_id: Optional[int] = None
+    ):
+        keys = self._keys(image_hash, perceptual_hash, user_id)
+        self._store_local(keys, result)
+
+        try:
+            client = self._get_redis()
+            if client is not None:
+                payload = json.dumps(result)
+                pipe = client.pipeline()
+                for key in keys:
+                    pipe.set(self.KEY_PREFIX + key, payload, ex=self.ttl_seconds)
+                pipe.execute()
+        except Exception as e:
+            logger.warning(f"Redis analysis cache unavailable: {e}")
+
+    def _store_local(self, keys, result: Dict):
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for key in keys:
+                self._entries[key] = (expires_at, result)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "redis": self.use_redis,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+
+# Глобальный кэш результатов анализа
+analysis_cache = AnalysisResultCache(
+    max_entries=settings.ANALYSIS_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.ANALYSIS_CACHE_TTL_SECONDS,
+    use_redis=settings.ANALYSIS_CACHE_REDIS
+)
@@ -2,6 +2,8 @@
 from sqlalchemy.orm import Session
 from typing import List, Dict, Optional
 from app.models.analysis import AnalysisHistory
+from app.core.config import settings
+from app.core.pagination import KeysetOrder, Page, paginate
 from sqlalchemy import func, and_
 from datetime import datetime, timedelta
 import hashlib
@@ -9,6 +11,8 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+HISTORY_ORDER = KeysetOrder("analysis_history", (AnalysisHistory.created_at, AnalysisHistory.id))
+
 class AnalysisHistoryService:
     def __init__(self, db: Session):
         self.db = db
@@ -30,21 +34,13 @@ class AnalysisHistoryService:
             hash_input = f"{user_id}_{detected_dish}_{datetime.now().timestamp()}"
             image_hash = hashlib.sha256(hash_input.encode()).hexdigest()
         
-        one_hour_ago = datetime.now() - timedelta(hours=1)
-        
-        # ВАЖНО: если в модели нет image_hash, убираем эту проверку
-        # recent_duplicate = self.db.query(AnalysisHistory).filter(
-        #     AnalysisHistory.user_id == user_id,
-        #     AnalysisHistory.image_hash == image_hash,  # Убрать если нет такого поля
-        #     AnalysisHistory.created_at >= one_hour_ago
-        # ).first()
-        # 
-        # if recent_duplicate:
-        #     return recent_duplicate
+        recent_duplicate = self.find_recent_duplicate(user_id, image_hash)
+        if recent_duplicate:
+            return recent_duplicate
         
         record = AnalysisHistory(
             user_id=user_id,
-            # image_hash=image_hash,  # Убрать если нет такого поля в модели
+            image_hash=image_hash,
             detected_dish=detected_dish,
             confidence=confidence,
             ingredients=ingredients,
@@ -56,6 +52,18 @@ class AnalysisHistoryService:
         self.db.refresh(record)
         return record
     
+    def find_recent_duplicate(self, user_id: int, image_hash: str) -> Optional[AnalysisHistory]:
+        """Поиск недавнего анализа того же изображения этим пользователем"""
+        if not image_hash:
+            return None
+        
+        window_start = datetime.now() - timedelta(minutes=settings.ANALYSIS_DUPLICATE_WINDOW_MINUTES)
+        return self.db.query(AnalysisHistory).filter(
+            AnalysisHistory.user_id == user_id,
+            AnalysisHistory.image_hash == image_hash,
+            AnalysisHistory.created_at >= window_start
+        ).order_by(AnalysisHistory.created_at.desc()).first()
+    
     # НОВЫЙ МЕТОД без image_bytes
     def create_analysis_record_simple(
         self, 
@@ -63,12 +71,14 @@ class AnalysisHistoryService:
         detected_dish: str,
         confidence: float,
         ingredients: Dict,
-        alternatives_found: Dict
+        alternatives_found: Dict,
+        image_hash: Optional[str] = None
     ) -> AnalysisHistory:
         """Создание записи анализа (новая версия без image_bytes)"""
         
         record = AnalysisHistory(
             user_id=user_id,
+            image_hash=image_hash,
             detected_dish=detected_dish,
             confidence=confidence,
             ingredients=ingredients,
@@ -112,9 +122,10 @@ class AnalysisHistoryService:
         user_id: Optional[int] = None,
         offset: int = 0, 
         limit: int = 20, 
-        min_confidence: float = None
-    ):
-        """Получение истории анализов"""
+        min_confidence: float = None,
+        cursor: Optional[str] = None
+    ) -> Page:
+        """Получение истории анализов (страница по курсору или по offset)"""
         query = self.db.query(AnalysisHistory)
         
         if user_id is not None:
@@ -123,15 +134,16 @@ class AnalysisHistoryService:
         if min_confidence is not None:
             query = query.filter(AnalysisHistory.confidence >= min_confidence)
         
-        return query.order_by(AnalysisHistory.created_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, HISTORY_ORDER, limit, cursor=cursor, skip=offset)
     
     def get_user_analysis_history(
         self,
         user_id: int,
         offset: int = 0,
         limit: int = 20,
-        min_confidence: float = None
-    ):
+        min_confidence: float = None,
+        cursor: Optional[str] = None
+    ) -> Page:
         """Получение истории анализов конкретного пользователя"""
         query = self.db.query(AnalysisHistory).filter(
             AnalysisHistory.user_id == user_id
@@ -140,7 +152,7 @@ class AnalysisHistoryService:
         if min_confidence is not None:
             query = query.filter(AnalysisHistory.confidence >= min_confidence)
         
-        return query.order_by(AnalysisHistory.created_at.desc()).offset(offset).limit(limit).all()
+        return paginate(query, HISTORY_ORDER, limit, cursor=cursor, skip=offset)
     
     def get_analysis_stats(self, user_id: int) -> Dict:
         """Статистика по анализам пользователя"""
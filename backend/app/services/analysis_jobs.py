@@ -0,0 +1,191 @@
+# app/services/analysis_jobs.py
+import asyncio
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.analysis import AnalysisJob
+from app.models.database import SessionLocal
+from app.services.analysis_cache import analysis_cache, compute_image_hashes
+from app.services.analysis_history_service import AnalysisHistoryService
+from app.services.dish_knowledge_base import dish_knowledge_base
+from app.services.analysis_pipeline import find_alternatives, build_analysis_response
+from app.services.rabbitmq import rabbitmq_client
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE = "image_processing"
+RESULTS_EXCHANGE = "ai_results"
+FINAL_STATUSES = ("done", "failed")
+
+
+class AnalysisJobService:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_job(self, user_id: int, image_url: str, image_hash: Optional[str]) -> AnalysisJob:
+        job = AnalysisJob(
+            id=str(uuid.uuid4()),
+            user_id=user_id,
+            status="queued",
+            image_url=image_url,
+            image_hash=image_hash
+        )
+        self.db.add(job)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def get_job(self, job_id: str, user_id: Optional[int] = None) -> Optional[AnalysisJob]:
+        query = self.db.query(AnalysisJob).filter(AnalysisJob.id == job_id)
+        if user_id is not None:
+            query = query.filter(AnalysisJob.user_id == user_id)
+        job = query.first()
+        if job:
+            self._expire_if_stale(job)
+        return job
+
+    def update_job(self, job: AnalysisJob, **fields) -> AnalysisJob:
+        for key, value in fields.items():
+            setattr(job, key, value)
+        self.db.commit()
+        self.db.refresh(job)
+        return job
+
+    def _expire_if_stale(self, job: AnalysisJob):
+        """Сообщения в очередях живут 60 секунд - зависшая задача уже не выполнится"""
+        if job.status in FINAL_STATUSES or not job.created_at:
+            return
+        deadline = job.created_at + timedelta(seconds=settings.ANALYSIS_JOB_TIMEOUT_SECONDS)
+        if datetime.now(timezone.utc) > deadline:
+            self.update_job(job, status="failed", error="Analysis job timed out")
+
+
+def job_to_dict(job: AnalysisJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "analysis_id": job.analysis_id,
+        "image_url": job.image_url,
+        "result": job.result,
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
+
+def process_analysis_job(message: Dict):
+    """Обработка задачи из image_processing в процессе воркера"""
+    from app.core.file_storage import add_image_reference, object_key, storage
+    from app.services.food_classification_model import food_model_registry
+    from app.services.image_preprocessing import prepare_model_input
+
+    job_id = message["job_id"]
+    db = SessionLocal()
+    try:
+        job_service = AnalysisJobService(db)
+        job = job_service.get_job(job_id)
+        if not job or job.status in FINAL_STATUSES:
+            logger.warning(f"Skipping analysis job {job_id}: not found or already finished")
+            return
+
+        job_service.update_job(job, status="processing")
+
+        try:
+            # Поток consumer'а без event loop; чтение через хранилище любого бэкенда
+            image_bytes = asyncio.run(storage.get(object_key(job.image_url)))
+            model_input = prepare_model_input(image_bytes)
+
+            image_hash = job.image_hash
+            perceptual_hash = message.get("perceptual_hash")
+            if not image_hash:
+                image_hash, perceptual_hash = compute_image_hashes(image_bytes, model_input)
+
+            dish_result = analysis_cache.get(image_hash, perceptual_hash, job.user_id)
+            if dish_result is None:
+                model = food_model_registry.get_model()
+                dish_result = model.detect_dish(model_input)
+                if dish_result["confidence"] > 0:
+                    analysis_cache.set(image_hash, perceptual_hash, dish_result, job.user_id)
+            top_k = message.get("top_k", 1)
+            dish_result = dish_knowledge_base.attach_ingredients(dish_result, top_k)
+
+            basic_alternatives, additional_alternatives = find_alternatives(db, dish_result, job.user_id)
+
+            record = AnalysisHistoryService(db).create_analysis_record_simple(
+                user_id=job.user_id,
+                detected_dish=dish_result["dish_name"],
+                confidence=dish_result["confidence"],
+                ingredients={
+                    "basic": dish_result["basic_ingredients"],
+                    "additional": dish_result["additional_ingredients"]
+                },
+                alternatives_found={
+                    "basic": basic_alternatives,
+                    "additional": additional_alternatives
+                },
+                # Дубликаты переиспользуются только в режиме одного блюда
+                image_hash=image_hash if top_k == 1 else None
+            )
+            # Задача и запись истории ссылаются на один объект - нужна вторая ссылка
+            if job.image_url and add_image_reference(db, job.image_url):
+                record.image_url = job.image_url
+            db.commit()
+
+            response = build_analysis_response(
+                job.user_id, record.id, dish_result, basic_alternatives, additional_alternatives
+            )
+            job = job_service.update_job(job, status="done", analysis_id=record.id, result=response)
+            logger.info(f"Analysis job {job_id} done: {dish_result['dish_name']}")
+
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed: {e}", exc_info=True)
+            db.rollback()
+            job = job_service.update_job(job, status="failed", error=str(e))
+
+        rabbitmq_client.publish_fanout(RESULTS_EXCHANGE, job_to_dict(job))
+
+    finally:
+        db.close()
+
+
+class AnalysisResultsHub:
+    """Раздача результатов из ai_results подписчикам SSE внутри процесса API.
+
+    Каждый процесс API получает все результаты через собственную очередь,
+    привязанную к fanout-обменнику ai_results, и раздаёт свои подписчикам.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, job_id: str) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(job_id, []).append((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, job_id: str, queue: asyncio.Queue):
+        with self._lock:
+            subscribers = [item for item in self._subscribers.get(job_id, []) if item[1] is not queue]
+            if subscribers:
+                self._subscribers[job_id] = subscribers
+            else:
+                self._subscribers.pop(job_id, None)
+
+    def publish(self, message: Dict):
+        """Вызывается из потока consumer'а RabbitMQ"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(message.get("job_id"), []))
+        for loop, queue in subscribers:
+            loop.call_soon_threadsafe(queue.put_nowait, message)
+
+
+# Глобальный хаб результатов анализа
+analysis_results_hub = AnalysisResultsHub()
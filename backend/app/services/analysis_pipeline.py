@@ -0,0 +1,132 @@
+# app/services/analysis_pipeline.py
+from sqlalchemy.orm import Session
+from typing import Dict, List
+
+from app.models.analysis import AnalysisHistory
+from app.services.dish_knowledge_base import dish_knowledge_base
+from app.services.tag_service import TagService
+
+
+def find_alternatives(db: Session, dish_result: Dict, user_id: int):
+    """Подбор товаров для основных и дополнительных ингредиентов"""
+    basic_ingredients = dish_result["basic_ingredients"]
+    additional_ingredients = dish_result["additional_ingredients"]
+
+    # Один пакетный запрос на все ингредиенты блюда. В режиме нескольких
+    # блюд число товаров на ингредиент пропорционально его весу
+    weights = dish_result.get("ingredient_weights") or {}
+
+    def limit_for(ingredient: str, limit: int) -> int:
+        if ingredient not in weights:
+            return limit
+        return max(1, min(limit, round(limit * weights[ingredient] * 2)))
+
+    limits = {ingredient: limit_for(ingredient, 3) for ingredient in additional_ingredients}
+    limits.update({ingredient: limit_for(ingredient, 5) for ingredient in basic_ingredients})
+    ingredients = basic_ingredients + additional_ingredients
+    products_by_ingredient = TagService(db).get_products_by_tags_bulk(
+        ingredients, user_id, limits,
+        tag_ids=dish_knowledge_base.get_tag_ids(db, ingredients)
+    )
+
+    def collect(ingredients: List[str]) -> List[Dict]:
+        alternatives = []
+        for ingredient in ingredients:
+            products = products_by_ingredient.get(ingredient, [])[:limits[ingredient]]
+            if products:
+                alternatives.append({
+                    "ingredient": ingredient,
+                    "products": products
+                })
+        return alternatives
+
+    return collect(basic_ingredients), collect(additional_ingredients)
+
+
+def build_analysis_response(
+    user_id: int,
+    analysis_id: int,
+    dish_result: Dict,
+    basic_alternatives: List,
+    additional_alternatives: List
+) -> Dict:
+    """Формирование ответа анализа"""
+    recommendations = generate_recommendations(dish_result, basic_alternatives, additional_alternatives)
+
+    return {
+        "success": True,
+        "user_id": user_id,
+        "analysis_id": analysis_id,
+        "detected_dish": dish_result["dish_name"],
+        "confidence": dish_result["confidence"],
+        "dishes": dish_result.get("dishes") or [{
+            "dish_name": dish_result["dish_name"],
+            "confidence": dish_result["confidence"],
+            "weight": 1.0
+        }],
+        "message": dish_result["message"],
+        "basic_ingredients": dish_result["basic_ingredients"],
+        "additional_ingredients": dish_result["additional_ingredients"],
+        "basic_alternatives": basic_alternatives,
+        "additional_alternatives": additional_alternatives,
+        "recommendations": recommendations
+    }
+
+
+def build_response_from_record(record: AnalysisHistory, user_id: int) -> Dict:
+    """Ответ по ранее сохранённой записи истории (без повторного анализа)"""
+    ingredients = record.ingredients or {}
+    alternatives = record.alternatives_found or {}
+    dish_result = {
+        "dish_name": record.detected_dish,
+        "confidence": record.confidence,
+        "message": f"Определено блюдо: {record.detected_dish}",
+        "basic_ingredients": ingredients.get("basic", []),
+        "additional_ingredients": ingredients.get("additional", [])
+    }
+
+    return build_analysis_response(
+        user_id,
+        record.id,
+        dish_result,
+        alternatives.get("basic", []),
+        alternatives.get("additional", [])
+    )
+
+
+def generate_recommendations(dish_result: Dict, basic_alts: List, additional_alts: List) -> List[str]:
+    """Генерация рекомендаций на основе результатов анализа"""
+    recommendations = []
+    
+    if dish_result["confidence"] > 0.7:
+        recommendations.append(f"Высокая уверенность в определении блюда: {dish_result['dish_name']}")
+    elif dish_result["confidence"] > 0.3:
+        recommendations.append(f"Средняя уверенность в определении блюда. Проверьте предложенные ингредиенты")
+    else:
+        recommendations.append("Низкая уверенность в определении. Попробуйте другое изображение")
+    
+    basic_found = len(basic_alts)
+    basic_total = len(dish_result["basic_ingredients"])
+    
+    if basic_found == basic_total:
+        recommendations.append("✅ Найдены все основные ингредиенты!")
+    elif basic_found > 0:
+        recommendations.append(f"🔍 Найдено {basic_found} из {basic_total} основных ингредиентов")
+    else:
+        recommendations.append("❌ Основные ингредиенты не найдены в магазине")
+    
+    additional_found = len(additional_alts)
+    if additional_found > 0:
+        recommendations.append(f"✨ Найдено {additional_found} дополнительных ингредиентов для улучшения блюда")
+    
+    # Добавляем рекомендации на основе ингредиентов
+    if "соль" in [ing.lower() for ing in dish_result["basic_ingredients"]]:
+        recommendations.append("🧂 Для этого блюда понадобится соль")
+    
+    if "перец" in [ing.lower() for ing in dish_result["basic_ingredients"]]:
+        recommendations.append("🌶️ Не забудьте про перец для вкуса")
+    
+    if len(recommendations) < 3:
+        recommendations.append("🍽️ Приятного аппетита!")
+    
+    return recommendations
@@ -0,0 +1,451 @@
+# app/services/catalog_cache.py
+"""Кэш ответов каталога: in-process LRU + Redis.
+
+Кэшируются готовые байты JSON-ответа (и заголовки, например X-Next-Cursor),
+поэтому попадание не требует ни запросов к БД, ни сериализации.
+
+Инвалидация по версиям: у каталога три версии - products, categories, tags.
+Ключ записи содержит версии тех областей, от которых зависит ответ, поэтому
+после изменения старые записи просто перестают находиться. Админские
+обработчики вызывают invalidate(): версия увеличивается в Redis (INCR) и
+рассылается через pub/sub - каждый воркер обновляет свои версии и
+удаляет устаревшие записи из памяти. Изменение версии tags заодно помечает
+устаревшим индекс тегов процесса (app/services/tag_index.py) - в том числе
+в воркере анализа, который тоже слушает канал.
+
+ETag ответа - хэш закэшированного тела, вычисляется один раз при
+сериализации: попадание в кэш с совпавшим If-None-Match получает 304 без
+БД и сериализации. ETag зависит только от содержимого, поэтому не
+повторяется для другого ответа ни после рестарта, ни в другом воркере.
+
+Версии процесса начинаются со значения времени запуска (мс), а не с 0:
+без Redis ключи записей после рестарта не совпадут со старыми.
+
+Защита от "стаи" промахов: внутри процесса одновременные запросы одного
+ключа ждут единственную загрузку, между процессами - короткая блокировка
+в Redis (SET NX), остальные воркеры ждут появления значения.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, NamedTuple, Optional, Tuple
+
+from email.utils import parsedate_to_datetime
+
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.http_cache import is_not_modified, not_modified_response, quote_etag, validator_headers
+
+logger = logging.getLogger(__name__)
+
+# Области каталога с собственной версией
+PRODUCTS = "products"
+CATEGORIES = "categories"
+TAGS = "tags"
+SCOPES = (PRODUCTS, CATEGORIES, TAGS)
+
+
+def _on_scopes_changed(scopes: Iterable[str]):
+    """Состояние процесса, построенное из каталога помимо кэша ответов"""
+    if TAGS in scopes:
+        from app.services.tag_index import tag_index
+        tag_index.mark_stale()
+
+
+def _body_etag(body: bytes) -> str:
+    return quote_etag(hashlib.sha1(body).hexdigest()[:20], weak=True)
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: Dict[str, str] = {}
+
+    @property
+    def etag(self) -> str:
+        return self.headers.get("ETag") or _body_etag(self.body)
+
+    def to_response(self, extra_headers: Optional[Dict[str, str]] = None) -> Response:
+        return Response(
+            content=self.body,
+            media_type="application/json",
+            headers={**self.headers, **(extra_headers or {})}
+        )
+
+    def dump(self) -> bytes:
+        return json.dumps(self.headers).encode() + b"\n" + self.body
+
+    @classmethod
+    def load(cls, raw: bytes) -> "CachedResponse":
+        headers, body = raw.split(b"\n", 1)
+        return cls(body, json.loads(headers))
+
+
+def serialize(adapter, data, headers: Optional[Dict[str, str]] = None) -> CachedResponse:
+    """ORM-объекты -> байты JSON по схеме ответа (pydantic TypeAdapter)"""
+    body = adapter.dump_json(adapter.validate_python(data, from_attributes=True))
+    return CachedResponse(body, {**(headers or {}), "ETag": _body_etag(body)})
+
+
+class CatalogCache:
+    """Двухуровневый кэш ответов каталога с инвалидацией по версиям"""
+
+    KEY_PREFIX = "catalog:"
+    VERSION_PREFIX = "catalog:version:"
+    CHANNEL = "catalog:invalidate"
+
+    def __init__(
+        self,
+        enabled: bool,
+        max_entries: int,
+        local_ttl_seconds: int,
+        redis_ttl_seconds: int,
+        use_redis: bool
+    ):
+        self.enabled = enabled
+        self.max_entries = max_entries
+        self.local_ttl_seconds = local_ttl_seconds
+        self.redis_ttl_seconds = redis_ttl_seconds
+        self.use_redis = use_redis
+
+        # ключ -> (истекает, области, ответ)
+        self._entries: "OrderedDict[str, Tuple[float, Tuple[str, ...], CachedResponse]]" = OrderedDict()
+        # Начало с времени запуска: после рестарта без Redis версии не повторяются
+        self._boot_version = int(time.time() * 1000)
+        self._versions: Dict[str, int] = {scope: self._boot_version for scope in SCOPES}
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._redis = None
+        self._listener: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self.hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.not_modified = 0
+
+    def _get_redis(self):
+        if not self.use_redis:
+            return None
+        if self._redis is None:
+            import redis
+            self._redis = redis.Redis.from_url(
+                settings.REDIS_URL,
+                socket_timeout=0.2,
+                socket_connect_timeout=0.2
+            )
+        return self._redis
+
+    # ------------------------------------------------------------------
+    # Чтение
+    # ------------------------------------------------------------------
+
+    def version_tag(self, scopes: Iterable[str]) -> str:
+        """Текущие версии областей, например "p3.c1" - меняется при любой инвалидации"""
+        with self._lock:
+            return ".".join(f"{scope[0]}{self._versions[scope]}" for scope in scopes)
+
+    def make_key(self, namespace: str, params: Dict, scopes: Iterable[str]) -> str:
+        version_tag = self.version_tag(scopes)
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()[:16]
+        return f"{self.KEY_PREFIX}{namespace}:{version_tag}:{digest}"
+
+    def _respond(self, request: Optional[Request], value: CachedResponse) -> Response:
+        etag = value.etag
+        headers = validator_headers(etag, cache_control=settings.CATALOG_CACHE_CONTROL)
+        if request is not None:
+            last_modified = value.headers.get("Last-Modified")
+            if is_not_modified(request, etag, parsedate_to_datetime(last_modified) if last_modified else None):
+                self.not_modified += 1
+                return not_modified_response({**value.headers, **headers})
+        return value.to_response(headers)
+
+    def _get_local(self, key: str) -> Optional[CachedResponse]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at < now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _store_local(self, key: str, scopes: Tuple[str, ...], value: CachedResponse):
+        expires_at = time.monotonic() + self.local_ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, scopes, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    async def get_or_load(
+        self,
+        namespace: str,
+        params: Dict,
+        scopes: Iterable[str],
+        loader: Callable[[], CachedResponse],
+        request: Optional[Request] = None
+    ) -> Response:
+        """Ответ из кэша или из loader (выполняется в пуле потоков).
+
+        loader должен вернуть CachedResponse; исключения (например, 404)
+        не кэшируются и передаются всем ожидающим. С request ответ условный:
+        ETag/Last-Modified и 304 по If-None-Match/If-Modified-Since.
+        """
+        if not self.enabled:
+            return self._respond(request, await run_in_threadpool(loader))
+
+        scopes = tuple(scopes)
+        key = self.make_key(namespace, params, scopes)
+
+        cached = self._get_local(key)
+        if cached is not None:
+            return self._respond(request, cached)
+
+        # Один промах на ключ в процессе - остальные ждут тот же результат
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.waits += 1
+            return self._respond(request, await asyncio.shield(inflight))
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await run_in_threadpool(self._load, key, scopes, loader)
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение уже передано ожидающим; без них - не "never retrieved"
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+        finally:
+            if not future.done():
+                future.cancel()
+            self._inflight.pop(key, None)
+        return self._respond(request, value)
+
+    def _load(self, key: str, scopes: Tuple[str, ...], loader: Callable[[], CachedResponse]) -> CachedResponse:
+        client = None
+        lock_key = key + ":lock"
+        lock_token = None
+        try:
+            client = self._get_redis()
+            if client is not None:
+                if time.monotonic() - self._synced_at > self.local_ttl_seconds:
+                    # Без работающей подписки версии сверяются здесь - запись Redis
+                    # под устаревшим ключом отдаётся не дольше local_ttl
+                    self._sync_versions(client)
+                raw = client.get(key)
+                if raw is not None:
+                    value = CachedResponse.load(raw)
+                    self._store_local(key, scopes, value)
+                    self.redis_hits += 1
+                    return value
+
+                # Между воркерами - одна загрузка; остальные ждут значение
+                lock_token = uuid.uuid4().hex
+                if not client.set(lock_key, lock_token, nx=True, px=settings.CATALOG_CACHE_LOCK_TTL_MS):
+                    lock_token = None
+                    value = self._wait_for_value(client, key)
+                    if value is not None:
+                        self._store_local(key, scopes, value)
+                        self.waits += 1
+                        return value
+        except Exception as e:
+            logger.warning(f"Redis catalog cache unavailable: {e}")
+            client = None
+
+        self.misses += 1
+        try:
+            value = loader()
+            self._store_local(key, scopes, value)
+            if client is not None:
+                try:
+                    client.set(key, value.dump(), ex=self.redis_ttl_seconds)
+                except Exception as e:
+                    logger.warning(f"Redis catalog cache unavailable: {e}")
+            return value
+        finally:
+            if client is not None and lock_token is not None:
+                try:
+                    # Снимаем только свою блокировку
+                    if client.get(lock_key) == lock_token.encode():
+                        client.delete(lock_key)
+                except Exception:
+                    pass
+
+    def _wait_for_value(self, client, key: str) -> Optional[CachedResponse]:
+        deadline = time.monotonic() + settings.CATALOG_CACHE_LOCK_WAIT_MS / 1000
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            raw = client.get(key)
+            if raw is not None:
+                return CachedResponse.load(raw)
+        # Загрузка в другом воркере не успела - грузим сами
+        return None
+
+    # ------------------------------------------------------------------
+    # Инвалидация
+    # ------------------------------------------------------------------
+
+    def invalidate(self, *scopes: str):
+        """Вызывается после commit изменений каталога"""
+        if not self.enabled:
+            _on_scopes_changed(set(scopes))
+            return
+
+        versions = None
+        try:
+            client = self._get_redis()
+            if client is not None:
+                # Начальное значение - время в мс: после потери ключей в Redis
+                # версии продолжают расти и не совпадут со старыми записями
+                seed = int(time.time() * 1000)
+                pipe = client.pipeline()
+                for scope in scopes:
+                    pipe.set(self.VERSION_PREFIX + scope, seed, nx=True)
+                    pipe.incr(self.VERSION_PREFIX + scope)
+                versions = dict(zip(scopes, pipe.execute()[1::2]))
+                client.publish(self.CHANNEL, json.dumps(versions))
+        except Exception as e:
+            logger.warning(f"Redis catalog cache unavailable: {e}")
+
+        if versions is None:
+            with self._lock:
+                versions = {scope: self._versions[scope] + 1 for scope in scopes}
+        self._apply_versions(versions)
+
+    def _apply_versions(self, versions: Dict[str, int], force: bool = False):
+        """force - принять версии Redis как есть (в том числе меньше локальных)"""
+        changed = set()
+        with self._lock:
+            for scope, version in versions.items():
+                if scope not in self._versions:
+                    continue
+                if int(version) > self._versions[scope] or (force and int(version) != self._versions[scope]):
+                    self._versions[scope] = int(version)
+                    changed.add(scope)
+            if not changed:
+                return
+            stale = [key for key, (_, scopes, _) in self._entries.items() if changed.intersection(scopes)]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += 1
+        logger.info(f"🔄 Catalog cache invalidated: {sorted(changed)}, dropped {len(stale)} entries")
+        _on_scopes_changed(changed)
+
+    def _sync_versions(self, client):
+        """Версии из Redis; отсутствующие создаются со значением времени запуска,
+        чтобы все воркеры пришли к общим версиям и общим ключам"""
+        pipe = client.pipeline()
+        for scope in SCOPES:
+            pipe.set(self.VERSION_PREFIX + scope, self._boot_version, nx=True)
+        pipe.mget([self.VERSION_PREFIX + scope for scope in SCOPES])
+        values = pipe.execute()[-1]
+        self._synced_at = time.monotonic()
+        self._apply_versions(
+            {scope: int(value) for scope, value in zip(SCOPES, values) if value is not None},
+            force=True
+        )
+
+    # ------------------------------------------------------------------
+    # Подписка на инвалидацию из других воркеров
+    # ------------------------------------------------------------------
+
+    def start_listener(self):
+        if not (self.enabled and self.use_redis) or self._listener is not None:
+            return
+        self._stop.clear()
+        self._listener = threading.Thread(target=self._listen, daemon=True, name="CatalogCache-Invalidation")
+        self._listener.start()
+
+    def stop_listener(self):
+        self._stop.set()
+        if self._listener is not None:
+            self._listener.join(timeout=2)
+            self._listener = None
+
+    def _listen(self):
+        import redis
+
+        while not self._stop.is_set():
+            pubsub = None
+            try:
+                # Отдельное соединение без socket_timeout - иначе listen обрывается
+                client = redis.Redis.from_url(settings.REDIS_URL, socket_connect_timeout=1)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.CHANNEL)
+                # Сообщения, пропущенные до подписки, подтягиваем из самих версий
+                self._sync_versions(client)
+                logger.info("✅ Catalog cache subscribed to invalidations")
+
+                # pub/sub доставляет не более одного раза: пропущенное сообщение
+                # подтягивается периодической сверкой версий не позже local_ttl
+                next_sync = time.monotonic() + self.local_ttl_seconds
+                while not self._stop.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message and message["type"] == "message":
+                        self._apply_versions(json.loads(message["data"]))
+                    if time.monotonic() >= next_sync:
+                        self._sync_versions(client)
+                        next_sync = time.monotonic() + self.local_ttl_seconds
+            except Exception as e:
+                logger.warning(f"Catalog cache invalidation listener error: {e}")
+                # Пока подписки нет, локальные записи живут не дольше local_ttl
+                self._stop.wait(settings.CATALOG_CACHE_RESUBSCRIBE_SECONDS)
+            finally:
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            versions = dict(self._versions)
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "redis": self.use_redis,
+            "versions": versions,
+            "hits": self.hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "not_modified": self.not_modified
+        }
+
+
+# Глобальный кэш ответов каталога
+catalog_cache = CatalogCache(
+    enabled=settings.CATALOG_CACHE_ENABLED,
+    max_entries=settings.CATALOG_CACHE_MAX_ENTRIES,
+    local_ttl_seconds=settings.CATALOG_CACHE_LOCAL_TTL_SECONDS,
+    redis_ttl_seconds=settings.CATALOG_CACHE_REDIS_TTL_SECONDS,
+    use_redis=settings.CATALOG_CACHE_REDIS
+)
@@ -0,0 +1,236 @@
+# app/services/dish_knowledge_base.py
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class DishIngredients:
+    key: str
+    name_ru: str
+    basic: Tuple[str, ...]
+    additional: Tuple[str, ...]
+
+    def to_dict(self) -> Dict:
+        return {"basic": list(self.basic), "additional": list(self.additional)}
+
+
+@dataclass(frozen=True)
+class _KnowledgeBase:
+    version: int
+    dishes: Mapping[str, DishIngredients]
+    default: DishIngredients
+    ingredients: Tuple[str, ...]  # все уникальные ингредиенты базы
+
+
+def _parse(data: Dict) -> _KnowledgeBase:
+    def entry(key: str, raw: Dict) -> DishIngredients:
+        return DishIngredients(
+            key=key,
+            name_ru=raw.get("name_ru", key.replace("_", " ").title()),
+            basic=tuple(raw["basic"]),
+            additional=tuple(raw.get("additional", []))
+        )
+
+    dishes = {key: entry(key, raw) for key, raw in data["dishes"].items()}
+    default = entry("default", data["default"])
+
+    ingredients = {}
+    for dish in list(dishes.values()) + [default]:
+        for ingredient in dish.basic + dish.additional:
+            ingredients.setdefault(ingredient, None)
+
+    return _KnowledgeBase(
+        version=int(data["version"]),
+        dishes=MappingProxyType(dishes),
+        default=default,
+        ingredients=tuple(ingredients)
+    )
+
+
+class DishKnowledgeBase:
+    """База "блюдо Food-101 -> ингредиенты" из data-файла, с горячей перезагрузкой"""
+
+    def __init__(self, path: str, check_seconds: int):
+        self.path = path
+        self.check_seconds = check_seconds
+        self._kb: Optional[_KnowledgeBase] = None
+        self._mtime = 0.0
+        self._checked_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        # Сопоставление ингредиентов с тегами, пересчитывается при перезагрузке
+        # базы или индекса тегов
+        self._tag_ids: Mapping[str, Optional[int]] = MappingProxyType({})
+        self._tag_ids_key: Optional[Tuple[int, int]] = None
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._kb.version if self._kb else None
+
+    def load(self) -> None:
+        """Чтение файла базы и атомарная замена снимка"""
+        with open(self.path, encoding="utf-8") as f:
+            kb = _parse(json.load(f))
+
+        with self._lock:
+            self._kb = kb
+            self._mtime = os.path.getmtime(self.path)
+            self._checked_at = time.monotonic()
+            self._generation += 1
+
+        logger.info(f"✅ Dish knowledge base v{kb.version} loaded: {len(kb.dishes)} dishes, {len(kb.ingredients)} ingredients")
+
+    def reload_if_modified(self) -> bool:
+        """Перезагрузка, если файл изменился; возвращает True при перезагрузке"""
+        try:
+            modified = os.path.getmtime(self.path) != self._mtime
+        except OSError as e:
+            logger.warning(f"Dish knowledge base not accessible: {e}")
+            return False
+        self._checked_at = time.monotonic()
+        if modified:
+            self.load()
+        return modified
+
+    def _get_kb(self) -> _KnowledgeBase:
+        if self._kb is None:
+            self.load()
+        elif time.monotonic() - self._checked_at > self.check_seconds:
+            try:
+                self.reload_if_modified()
+            except Exception as e:
+                # Битый файл не должен ломать анализ - остаётся прежняя версия
+                logger.error(f"Dish knowledge base reload failed: {e}")
+        return self._kb
+
+    def get(self, dish_key: str) -> DishIngredients:
+        """Ингредиенты блюда по ключу класса Food-101 (например, "caesar_salad")"""
+        kb = self._get_kb()
+        return kb.dishes.get(dish_key, kb.default)
+
+    def attach_ingredients(self, dish_result: Dict, top_k: int = 1) -> Dict:
+        """Добавляем ингредиенты к результату распознавания.
+
+        При top_k > 1 ингредиенты нескольких вероятных блюд объединяются
+        с весами по уверенности модели - без дополнительного инференса.
+        """
+        predictions = (dish_result.get("predictions") or [])[:top_k]
+        if top_k > 1 and len(predictions) > 1:
+            return self._attach_merged(dish_result, predictions)
+
+        dish = self.get(self._dish_key(dish_result["dish_name"]))
+        ingredients = dish.to_dict()
+
+        return {
+            **dish_result,
+            "dish_name_ru": dish.name_ru,
+            "knowledge_base_version": self.version,
+            "dishes": [{
+                "dish_name": dish_result["dish_name"],
+                "dish_name_ru": dish.name_ru,
+                "confidence": dish_result["confidence"],
+                "weight": 1.0
+            }],
+            "ingredients": ingredients,
+            "basic_ingredients": ingredients["basic"],
+            "additional_ingredients": ingredients["additional"]
+        }
+
+    def _attach_merged(self, dish_result: Dict, predictions: List[Dict]) -> Dict:
+        total = sum(prediction["confidence"] for prediction in predictions) or 1.0
+
+        dishes = []
+        weights: Dict[str, float] = {}
+        basic_set, additional_set = set(), set()
+        for prediction in predictions:
+            dish = self.get(self._dish_key(prediction["dish_name"]))
+            weight = prediction["confidence"] / total
+            dishes.append({
+                "dish_name": prediction["dish_name"],
+                "dish_name_ru": dish.name_ru,
+                "confidence": prediction["confidence"],
+                "weight": round(weight, 3)
+            })
+            if dish.key == "default":
+                continue
+            # Дополнительные ингредиенты весят вдвое меньше основных
+            for ingredient in dish.basic:
+                weights[ingredient] = weights.get(ingredient, 0.0) + weight
+                basic_set.add(ingredient)
+            for ingredient in dish.additional:
+                weights[ingredient] = weights.get(ingredient, 0.0) + weight * 0.5
+                additional_set.add(ingredient)
+
+        def ranked(candidates, limit: int) -> List[str]:
+            selected = [i for i in candidates if weights[i] >= settings.ANALYSIS_MIN_INGREDIENT_WEIGHT]
+            return sorted(selected, key=lambda i: (-weights[i], i))[:limit]
+
+        basic = ranked(basic_set, settings.ANALYSIS_MAX_BASIC_INGREDIENTS)
+        additional = ranked(additional_set - set(basic), settings.ANALYSIS_MAX_ADDITIONAL_INGREDIENTS)
+        if not basic:
+            return self.attach_ingredients(dish_result)
+
+        return {
+            **dish_result,
+            "dish_name_ru": dishes[0]["dish_name_ru"],
+            "knowledge_base_version": self.version,
+            "dishes": dishes,
+            "ingredient_weights": {i: round(weights[i], 3) for i in basic + additional},
+            "ingredients": {"basic": basic, "additional": additional},
+            "basic_ingredients": basic,
+            "additional_ingredients": additional
+        }
+
+    def _dish_key(self, dish_name: str) -> str:
+        return dish_name.lower().replace(' ', '_')
+
+    def get_tag_ids(self, db: Session, ingredients: List[str]) -> Dict[str, Optional[int]]:
+        """Заранее сопоставленные теги ингредиентов (без поиска по тегам на запрос).
+
+        None - ингредиент есть в базе, но подходящего тега нет;
+        ингредиентов не из базы в ответе нет.
+        """
+        from app.services.tag_index import tag_index
+
+        kb = self._get_kb()
+        key = (self._generation, tag_index.ensure_fresh(db))
+        if key != self._tag_ids_key:
+            resolved = tag_index.resolve_many(db, list(kb.ingredients))
+            tag_ids = {ingredient: resolved.get(ingredient) for ingredient in kb.ingredients}
+            with self._lock:
+                self._tag_ids = MappingProxyType(tag_ids)
+                self._tag_ids_key = key
+            logger.info(f"Resolved {len(resolved)}/{len(kb.ingredients)} knowledge base ingredients to tags")
+
+        tag_ids = self._tag_ids
+        return {ingredient: tag_ids[ingredient] for ingredient in ingredients if ingredient in tag_ids}
+
+    def get_stats(self) -> Dict:
+        kb = self._kb
+        return {
+            "version": kb.version if kb else None,
+            "dishes": len(kb.dishes) if kb else 0,
+            "ingredients": len(kb.ingredients) if kb else 0,
+            "resolved_ingredients": sum(1 for tag_id in self._tag_ids.values() if tag_id is not None),
+            "path": self.path
+        }
+
+
+# Глобальная база ингредиентов блюд
+dish_knowledge_base = DishKnowledgeBase(
+    path=settings.DISH_KNOWLEDGE_BASE_PATH,
+    check_seconds=settings.DISH_KNOWLEDGE_BASE_CHECK_SECONDS
+)
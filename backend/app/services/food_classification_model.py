@@ -1,25 +1,53 @@
-from transformers import pipeline
-from PIL import Image
-import io
 import logging
-from typing import List, Dict
+import os
+import threading
+import time
+from datetime import datetime
+from typing import TYPE_CHECKING, List, Dict, Optional, Union
+
+from app.core.config import settings
+from app.services.dish_knowledge_base import dish_knowledge_base
+
+if TYPE_CHECKING:
+    from PIL import Image
 
 logger = logging.getLogger(__name__)
 
 class FoodClassificationModel:
     def __init__(self):
+        self.backend = settings.FOOD_MODEL_BACKEND
         try:
-            self.classifier = pipeline(
-                "image-classification", 
-                model="prithivMLmods/Food-101-93M",
-                device=-1
-            )
-            logger.info("✅ Food101 model loaded successfully")
+            if self.backend == "onnx":
+                from app.services.onnx_food_classifier import OnnxFoodClassifier
+                self.classifier = OnnxFoodClassifier(
+                    model_dir=settings.ONNX_MODEL_DIR,
+                    model_file=settings.ONNX_MODEL_FILE,
+                    intra_op_threads=settings.ONNX_INTRA_OP_THREADS,
+                    inter_op_threads=settings.ONNX_INTER_OP_THREADS
+                )
+            else:
+                # transformers/torch импортируются только при загрузке модели
+                from transformers import pipeline
+                self.classifier = pipeline(
+                    "image-classification", 
+                    model=settings.FOOD_MODEL_NAME,
+                    device=-1
+                )
+            logger.info(f"✅ Food101 model loaded successfully ({self.backend})")
         except Exception as e:
             logger.error(f"❌ Failed to load Food101: {e}")
             self.classifier = None
 
-    def detect_dish(self, image_bytes: bytes) -> Dict:
+    def warm_up(self) -> None:
+        """Прогрев модели на пустом изображении"""
+        if self.classifier is None:
+            return
+
+        from PIL import Image
+        dummy_image = Image.new("RGB", (224, 224), color=(128, 128, 128))
+        self.classifier(dummy_image)
+
+    def detect_dish(self, image: Union[bytes, "Image.Image"]) -> Dict:
         """Определяем блюдо и возвращаем название"""
         if self.classifier is None:
             return {
@@ -29,28 +57,79 @@ class FoodClassificationModel:
             }
         
         try:
-            image = Image.open(io.BytesIO(image_bytes))
-            results = self.classifier(image)
+            results = self.classifier(self._to_model_input(image))
             
-            top_result = results[0]
-            dish_name = self._clean_dish_name(top_result['label'])
-            confidence = top_result['score']
-            
-            logger.info(f"🎯 Detected: {dish_name} (confidence: {confidence:.2f})")
-            
-            return {
-                "dish_name": dish_name,
-                "confidence": float(confidence),
-                "message": f"Определено блюдо: {dish_name}"
-            }
+            return self._build_dish_result(results)
             
         except Exception as e:
             logger.error(f"❌ Dish detection error: {e}")
-            return {
-                "dish_name": "салат",
-                "confidence": 0.0,
-                "message": f"Error: {str(e)}"
-            }
+            return self._error_result(e)
+
+    def detect_dishes_batch(self, images: List[Union[bytes, "Image.Image"]]) -> List[Dict]:
+        """Определяем блюда для пачки изображений за один проход модели"""
+        if self.classifier is None:
+            return [self.detect_dish(image) for image in images]
+
+        results: List[Optional[Dict]] = [None] * len(images)
+        model_inputs = []
+        positions = []
+
+        for position, image in enumerate(images):
+            try:
+                model_inputs.append(self._to_model_input(image))
+                positions.append(position)
+            except Exception as e:
+                logger.error(f"❌ Image decode error: {e}")
+                results[position] = self._error_result(e)
+
+        if model_inputs:
+            try:
+                batch_results = self.classifier(model_inputs, batch_size=len(model_inputs))
+                for position, image_results in zip(positions, batch_results):
+                    results[position] = self._build_dish_result(image_results)
+            except Exception as e:
+                logger.error(f"❌ Batch dish detection error: {e}")
+                for position in positions:
+                    results[position] = self._error_result(e)
+
+        return results
+
+    def _to_model_input(self, image: Union[bytes, "Image.Image"]) -> "Image.Image":
+        """Сырые байты декодируются сразу в размер входа модели"""
+        from PIL import Image
+        from app.services.image_preprocessing import prepare_model_input
+
+        if isinstance(image, Image.Image):
+            return image
+        return prepare_model_input(image)
+
+    def _build_dish_result(self, results: List[Dict]) -> Dict:
+        """Формируем ответ по результатам классификатора"""
+        top_result = results[0]
+        dish_name = self._clean_dish_name(top_result['label'])
+        confidence = top_result['score']
+
+        logger.info(f"🎯 Detected: {dish_name} (confidence: {confidence:.2f})")
+
+        # Ранжированный список классификатора - для режима нескольких блюд
+        predictions = [
+            {"dish_name": self._clean_dish_name(result['label']), "confidence": float(result['score'])}
+            for result in results
+        ]
+
+        return {
+            "dish_name": dish_name,
+            "confidence": float(confidence),
+            "message": f"Определено блюдо: {dish_name}",
+            "predictions": predictions
+        }
+
+    def _error_result(self, error: Exception) -> Dict:
+        return {
+            "dish_name": "салат",
+            "confidence": 0.0,
+            "message": f"Error: {str(error)}"
+        }
 
     def _clean_dish_name(self, label: str) -> str:
         """Очищаем название блюда"""
@@ -61,78 +140,134 @@ class FoodClassificationModel:
         """Информация о модели"""
         return {
             "status": "loaded" if self.classifier else "failed",
-            "model": "ethz/food101",
+            "model": settings.FOOD_MODEL_NAME,
+            "backend": self.backend,
             "classes": 101
         }
     
-    def _get_dish_mapping(self) -> dict:
-        return {
-            "pizza": {
-                "basic": ["тесто для пиццы", "томатный соус", "сыр моцарелла"],
-                "additional": ["пепперони", "ветчина", "грибы", "оливки", "перец", 
-                            "лук", "ананасы", "курица", "бекон", "салями"]
-            },
-            
-            "caesar_salad": {
-                "basic": ["романо", "пармезан", "сухарики"],
-                "additional": ["помидоры", "бекон", "яйцо", "креветки", "курица", "сливочный"]
-            },
-            
-            "hamburger": {
-                "basic": ["булочка для бургера", "говяжья котлета", "сыр чеддер"],
-                "additional": ["салат айсберг", "помидор", "лук", "огурцы", "бекон",
-                            "яйцо", "авокадо", "грибы", "соус"]
-            },
-            
-            "sushi": {
-                "basic": ["рис для суши", "нори", "лосось", "огурец"],
-                "additional": ["тунец", "авокадо", "икра", "угорь", "сыр филадельфия",
-                            "краб", "васаби", "имбирь", "соус соевый"]
-            },
-            
-            "spaghetti_bolognese": {
-                "basic": ["спагетти", "фарш говяжий", "томатный соус", "лук"],
-                "additional": ["морковь", "сельдерей", "сыр пармезан", "базилик",
-                            "чеснок", "грибы", "перец"]
-            },
-            
-            "chocolate_cake": {
-                "basic": ["мука", "какао", "сахар", "яйца", "разрыхлитель"],
-                "additional": ["шоколад", "сливки", "ягоды", "орехи", "кокос",
-                            "ваниль", "кофе"]
-            },
-            
-            "default": {
-                "basic": ["основа", "соус", "специи"],
-                "additional": ["дополнительные ингредиенты"]
-            }
-        }
-    
-    def detect_dish_with_ingredients(self, image_bytes: bytes) -> Dict:
+    def detect_dish_with_ingredients(self, image: Union[bytes, "Image.Image"]) -> Dict:
         """Определяем блюдо и подбираем ингредиенты"""
-        dish_result = self.detect_dish(image_bytes)
-        dish_name_key = dish_result["dish_name"].lower().replace(' ', '_')
-        
-        ingredients = self._get_ingredients_for_dish(dish_name_key)
-        
-        result = {
-            **dish_result,
-            "ingredients": ingredients,
-            "basic_ingredients": ingredients["basic"],
-            "additional_ingredients": ingredients["additional"]
+        dish_result = self.detect_dish(image)
+        return self.attach_ingredients(dish_result)
+
+    def attach_ingredients(self, dish_result: Dict) -> Dict:
+        """Добавляем ингредиенты к результату распознавания"""
+        return dish_knowledge_base.attach_ingredients(dish_result)
+
+
+class FoodModelRegistry:
+    """Реестр модели: один экземпляр FoodClassificationModel на процесс"""
+
+    def __init__(self):
+        self._model: Optional[FoodClassificationModel] = None
+        self._lock = threading.Lock()
+        self.load_time: Optional[float] = None
+        self.warmup_time: Optional[float] = None
+        self.loaded_at: Optional[datetime] = None
+        self.loaded_pid: Optional[int] = None
+        self._warmed_pid: Optional[int] = None
+        # Время (monotonic) неудачной загрузки: classifier=None не кэшируется навсегда
+        self._failed_at: Optional[float] = None
+        self.load_failures = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._model is not None
+
+    def _retry_due(self) -> bool:
+        """Модель не загрузилась, и с неудачной попытки прошло FOOD_MODEL_RETRY_SECONDS"""
+        return (
+            self._failed_at is not None
+            and time.monotonic() - self._failed_at >= settings.FOOD_MODEL_RETRY_SECONDS
+        )
+
+    def _load_locked(self) -> None:
+        logger.info(f"🔄 Loading food model {settings.FOOD_MODEL_NAME}...")
+        started = time.perf_counter()
+        model = FoodClassificationModel()
+        self.load_time = time.perf_counter() - started
+
+        self.loaded_at = datetime.now()
+        self.loaded_pid = os.getpid()
+        self._warmed_pid = None
+        self._model = model
+        if model.classifier is None:
+            self._failed_at = time.monotonic()
+            self.load_failures += 1
+            logger.warning(f"⚠️ Food model unavailable, retry in {settings.FOOD_MODEL_RETRY_SECONDS:.0f}s")
+        else:
+            self._failed_at = None
+            logger.info(f"✅ Food model ready in {self.load_time:.2f}s")
+
+    def load(self, warm_up: Optional[bool] = None) -> FoodClassificationModel:
+        """Загрузка и прогрев модели (повторные вызовы возвращают готовый экземпляр)"""
+        if self._model is None or self._retry_due():
+            with self._lock:
+                if self._model is None or self._retry_due():
+                    self._load_locked()
+
+        if settings.FOOD_MODEL_WARMUP if warm_up is None else warm_up:
+            self.warm_up()
+        return self._model
+
+    def warm_up(self) -> None:
+        """Прогрев модели - один раз в каждом процессе.
+
+        Под gunicorn --preload модель загружается в master без прогрева:
+        первый инференс поднимает пулы потоков torch, которые не переживают fork.
+        """
+        if self._model is None or self._warmed_pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._warmed_pid == os.getpid():
+                return
+            started = time.perf_counter()
+            try:
+                self._model.warm_up()
+                self.warmup_time = time.perf_counter() - started
+            except Exception as e:
+                logger.warning(f"⚠️ Food model warm-up failed: {e}")
+            self._warmed_pid = os.getpid()
+
+    def get_model(self) -> FoodClassificationModel:
+        """Получение модели (ленивая загрузка, если не было предзагрузки).
+
+        После неудачной загрузки повтор выполняет один поток; остальные
+        запросы до его окончания получают незагруженную модель и ответ
+        "Model not loaded", а не ждут загрузку.
+        """
+        if self._model is None:
+            return self.load()
+        if self._retry_due() and self._lock.acquire(blocking=False):
+            try:
+                if self._retry_due():
+                    self._load_locked()
+            finally:
+                self._lock.release()
+            if settings.FOOD_MODEL_WARMUP:
+                self.warm_up()
+        return self._model
+
+    def get_status(self) -> Dict:
+        """Статус модели для /health"""
+        if self._model is None:
+            status = "not_loaded"
+        else:
+            status = "loaded" if self._model.classifier is not None else "failed"
+
+        return {
+            "status": status,
+            "model": settings.FOOD_MODEL_NAME,
+            "backend": settings.FOOD_MODEL_BACKEND,
+            "mode": "preload" if settings.FOOD_MODEL_PRELOAD else "lazy",
+            "load_time_seconds": round(self.load_time, 3) if self.load_time is not None else None,
+            "warmup_time_seconds": round(self.warmup_time, 3) if self.warmup_time is not None else None,
+            "loaded_at": self.loaded_at.isoformat() if self.loaded_at else None,
+            "load_failures": self.load_failures,
+            # Модель загружена в master gunicorn и разделяется воркерами copy-on-write
+            "inherited_from_master": self.loaded_pid is not None and self.loaded_pid != os.getpid()
         }
-        
-        return result
 
-    def _get_ingredients_for_dish(self, dish_name_key: str) -> Dict:
-        """Получаем ингредиенты для блюда"""
-        mapping = self._get_dish_mapping()
-        
-        if dish_name_key in mapping:
-            return mapping[dish_name_key]
-        
-        for dish_key, ingredients in mapping.items():
-            if dish_key in dish_name_key or dish_name_key in dish_key:
-                return ingredients
-        
-        return mapping["default"]
\ No newline at end of file
+# Глобальный реестр модели (загрузка при старте приложения или при первом запросе)
+food_model_registry = FoodModelRegistry()
@@ -0,0 +1,60 @@
+# app/services/image_preprocessing.py
+import io
+from dataclasses import dataclass
+from typing import Tuple
+
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+
+
+@dataclass
+class PreparedImage:
+    """Однократно декодированное изображение для анализа"""
+    model_input: Image.Image      # RGB, размер входа модели
+    storage_jpeg: bytes           # JPEG для сохранения в MinIO
+    original_size: Tuple[int, int]
+
+
+def _open_scaled(image_bytes: bytes, target_size: int) -> Tuple[Image.Image, Tuple[int, int]]:
+    """Декодирование с уменьшением на этапе JPEG (draft) и поворотом по EXIF"""
+    image = Image.open(io.BytesIO(image_bytes))
+    original_size = image.size
+
+    # Для JPEG декодер сразу отдаёт 1/2, 1/4 или 1/8 разрешения,
+    # не распаковывая все пиксели исходной фотографии
+    image.draft("RGB", (target_size, target_size))
+    image = ImageOps.exif_transpose(image)
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    return image, original_size
+
+
+def _to_model_input(image: Image.Image, model_size: int) -> Image.Image:
+    return image.resize((model_size, model_size), Image.BILINEAR, reducing_gap=2.0)
+
+
+def prepare_model_input(image_bytes: bytes, model_size: int = None) -> Image.Image:
+    """Изображение сразу в размере входа модели"""
+    model_size = model_size or settings.FOOD_MODEL_INPUT_SIZE
+    image, _ = _open_scaled(image_bytes, model_size)
+    return _to_model_input(image, model_size)
+
+
+def prepare_image(image_bytes: bytes, model_size: int = None, storage_size: int = None) -> PreparedImage:
+    """Вход модели и JPEG для хранилища из одного декодирования"""
+    model_size = model_size or settings.FOOD_MODEL_INPUT_SIZE
+    storage_size = storage_size or settings.ANALYSIS_IMAGE_MAX_SIZE
+
+    image, original_size = _open_scaled(image_bytes, storage_size)
+    image.thumbnail((storage_size, storage_size), Image.LANCZOS)
+
+    output_buffer = io.BytesIO()
+    image.save(output_buffer, "JPEG", quality=settings.ANALYSIS_IMAGE_QUALITY, optimize=True)
+
+    return PreparedImage(
+        model_input=_to_model_input(image, model_size),
+        storage_jpeg=output_buffer.getvalue(),
+        original_size=original_size
+    )
@@ -0,0 +1,224 @@
+# app/services/image_variants.py
+"""Уменьшенные варианты изображений каталога (WebP, опционально AVIF).
+
+После загрузки изображения товара или категории в фоне строятся варианты
+шириной IMAGE_VARIANT_WIDTHS и сохраняются рядом с оригиналом:
+"abc.jpg" -> "variants/abc/w256.webp". Кодирование идёт в пуле процессов,
+ответ на загрузку его не ждёт.
+
+Эндпоинты изображений выбирают вариант по ?w= (наименьшая ширина не меньше
+запрошенной) и заголовку Accept; пока варианта нет, отдаётся оригинал.
+"""
+import asyncio
+import io
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from app.core.config import settings
+from app.core.file_storage import ObjectNotFound, object_key, storage
+from app.core.image_cache import image_cache
+from app.core.minio_client import variant_prefix
+
+logger = logging.getLogger(__name__)
+
+# Формат варианта -> (Content-Type, формат Pillow); порядок - предпочтение
+FORMATS = {
+    "avif": ("image/avif", "AVIF"),
+    "webp": ("image/webp", "WEBP")
+}
+
+
+def enabled_formats() -> List[str]:
+    return ["avif", "webp"] if settings.IMAGE_VARIANT_AVIF else ["webp"]
+
+
+def variant_object_name(object_name: str, width: int, fmt: str) -> str:
+    return f"{variant_prefix(object_name)}w{width}.{fmt}"
+
+
+def select_width(requested: int) -> int:
+    widths = sorted(settings.IMAGE_VARIANT_WIDTHS)
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1]
+
+
+def _accepted_types(accept: Optional[str]) -> Set[str]:
+    """Типы из Accept с q > 0 (image/* не означает поддержку WebP/AVIF)"""
+    accepted = set()
+    for part in (accept or "").lower().split(","):
+        media_type, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type and quality > 0:
+            accepted.add(media_type)
+    return accepted
+
+
+def negotiate_format(accept: Optional[str]) -> Optional[str]:
+    """Первый включённый формат, который принимает клиент; None - только оригинал"""
+    accepted = _accepted_types(accept)
+    for fmt in enabled_formats():
+        if FORMATS[fmt][0] in accepted:
+            return fmt
+    return None
+
+
+def select_variant(object_name: str, requested_width: Optional[int], accept: Optional[str]) -> Optional[str]:
+    """Ключ варианта для ?w= и Accept или None, если нужен оригинал"""
+    if not requested_width:
+        return None
+    fmt = negotiate_format(accept)
+    if fmt is None:
+        return None
+    return variant_object_name(object_name, select_width(requested_width), fmt)
+
+
+def render_variants(
+    image_bytes: bytes,
+    widths: Sequence[int],
+    formats: Sequence[str],
+    webp_quality: int,
+    avif_quality: int
+) -> List[Tuple[int, str, bytes]]:
+    """Кодирование всех вариантов (выполняется в процессе пула).
+
+    Ширины больше оригинала не увеличиваются - вариант кодируется в исходном
+    размере, чтобы для любого ?w= был готовый ключ.
+    """
+    from PIL import Image, ImageOps
+
+    Image.init()
+    formats = [fmt for fmt in formats if FORMATS[fmt][1] in Image.SAVE]
+
+    image = Image.open(io.BytesIO(image_bytes))
+    largest = max(widths)
+    # JPEG декодируется сразу в уменьшенном масштабе
+    image.draft("RGB", (largest, largest))
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if image.mode in ("LA", "P", "PA") else "RGB")
+
+    variants = []
+    current = image
+    # От большего к меньшему: каждый вариант уменьшается из предыдущего
+    for width in sorted(widths, reverse=True):
+        if current.width > width:
+            height = max(1, round(current.height * width / current.width))
+            current = current.resize((width, height), Image.LANCZOS, reducing_gap=3.0)
+
+        for fmt in formats:
+            buffer = io.BytesIO()
+            if fmt == "webp":
+                current.save(buffer, "WEBP", quality=webp_quality, method=4)
+            else:
+                current.save(buffer, "AVIF", quality=avif_quality)
+            variants.append((width, fmt, buffer.getvalue()))
+    return variants
+
+
+class ImageVariantPipeline:
+    """Фоновое построение вариантов в отдельном пуле процессов"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.generated = 0
+        self.failed = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: fork из процесса с потоками (пул хранилища, RabbitMQ,
+            # Redis) может унаследовать захваченные блокировки
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+            logger.info(f"✅ Image variant pool started (workers={self.workers})")
+        return self._executor
+
+    async def has_variants(self, object_name: str) -> bool:
+        """Есть ли уже вариант наибольшей ширины"""
+        key = variant_object_name(object_name, max(settings.IMAGE_VARIANT_WIDTHS), enabled_formats()[-1])
+        try:
+            await storage.stat(key)
+            return True
+        except ObjectNotFound:
+            return False
+
+    def schedule(self, image_url: str):
+        """Построение вариантов после ответа на загрузку.
+
+        Ключ по содержимому: при повторной загрузке того же изображения
+        варианты уже есть и не перестраиваются.
+        """
+        task = asyncio.get_running_loop().create_task(self.generate(image_url, missing_only=True))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def generate(self, image_url: str, missing_only: bool = False) -> int:
+        """Варианты для изображения по его URL; возвращает число записанных объектов"""
+        object_name = object_key(image_url)
+        try:
+            if missing_only and await self.has_variants(object_name):
+                return 0
+            image_bytes = await storage.get(object_name)
+            loop = asyncio.get_running_loop()
+            variants = await loop.run_in_executor(
+                self._get_executor(),
+                render_variants,
+                image_bytes,
+                tuple(settings.IMAGE_VARIANT_WIDTHS),
+                tuple(enabled_formats()),
+                settings.IMAGE_VARIANT_WEBP_QUALITY,
+                settings.IMAGE_VARIANT_AVIF_QUALITY
+            )
+            await asyncio.gather(*(
+                storage.put(variant_object_name(object_name, width, fmt), data, FORMATS[fmt][0])
+                for width, fmt, data in variants
+            ))
+            # Варианты перезаписываются под теми же ключами (--missing-only, новые ширины)
+            image_cache.invalidate_prefix(variant_prefix(object_name))
+        except Exception as e:
+            self.failed += 1
+            logger.warning(f"⚠️ Image variants for {object_name} failed: {e}")
+            return 0
+
+        self.generated += 1
+        saved = sum(len(data) for _, _, data in variants)
+        logger.info(
+            f"🖼️ {len(variants)} variants for {object_name} "
+            f"({len(image_bytes) // 1024} KB original, {saved // 1024} KB total)"
+        )
+        return len(variants)
+
+    def shutdown(self):
+        for task in list(self._tasks):
+            task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def get_stats(self) -> Dict:
+        return {
+            "widths": list(settings.IMAGE_VARIANT_WIDTHS),
+            "formats": enabled_formats(),
+            "workers": self.workers,
+            "pending": len(self._tasks),
+            "generated": self.generated,
+            "failed": self.failed
+        }
+
+
+# Глобальный пул построения вариантов изображений
+image_variant_pipeline = ImageVariantPipeline(workers=settings.IMAGE_VARIANT_WORKERS)
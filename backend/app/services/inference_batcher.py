@@ -0,0 +1,225 @@
+# app/services/inference_batcher.py
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.services.inference_executor import InferenceQueueFull, inference_executor
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyStats:
+    """Накопительная статистика задержек одного этапа (в миллисекундах)"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float):
+        value_ms = seconds * 1000
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2)
+        }
+
+
+class InferenceBatcher:
+    """Динамический micro-batching для классификатора блюд.
+
+    Запросы складываются в очередь; пачка уходит в модель, когда набралось
+    INFERENCE_MAX_BATCH_SIZE изображений или истекло INFERENCE_MAX_WAIT_MS
+    с момента прихода первого изображения в пачке.
+    """
+
+    def __init__(self, max_batch_size: int, max_wait_ms: float, max_queue_size: int, concurrency: int):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.concurrency = concurrency
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight = set()
+        self.rejected = 0
+
+        self.batch_sizes = Counter()
+        self.queue_wait = LatencyStats()
+        self.inference = LatencyStats()
+        self.total = LatencyStats()
+
+    @property
+    def is_running(self) -> bool:
+        return self._worker is not None and not self._worker.done()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self):
+        """Запуск фонового обработчика очереди в текущем event loop"""
+        if self.is_running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        inference_executor.start()
+        self._worker = asyncio.create_task(self._run(), name="InferenceBatcher")
+        logger.info(
+            f"✅ Inference batcher started (max_batch_size={self.max_batch_size}, "
+            f"max_wait={self.max_wait * 1000:.0f}ms, max_queue_size={self.max_queue_size}, "
+            f"concurrency={self.concurrency})"
+        )
+
+    async def stop(self):
+        """Остановка обработчика; ожидающие запросы получают ошибку"""
+        if not self.is_running:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        for task in list(self._in_flight):
+            task.cancel()
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+        pending = []
+        while not self._queue.empty():
+            pending.append(self._queue.get_nowait())
+        self._fail_batch(pending, RuntimeError("Inference batcher stopped"))
+        inference_executor.shutdown()
+        logger.info("🛑 Inference batcher stopped")
+
+    async def classify(self, image: "Image.Image") -> Dict:
+        """Распознавание блюда с ингредиентами через общую очередь.
+
+        Если очередь заполнена, сразу выбрасывает InferenceQueueFull.
+        """
+        if not self.is_running:
+            self.start()
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((image, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise InferenceQueueFull(f"Inference queue is full ({self.max_queue_size})")
+        return await future
+
+    async def _run(self):
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = await self._collect_batch()
+            except BaseException:
+                self._slots.release()
+                raise
+            task = asyncio.create_task(self._run_batch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run_batch(self, batch: List[Tuple["Image.Image", asyncio.Future, float]]):
+        try:
+            await self._process_batch(batch)
+        except asyncio.CancelledError:
+            self._fail_batch(batch, RuntimeError("Inference batcher stopped"))
+            raise
+        except Exception as e:
+            logger.error(f"❌ Inference batch failed: {e}", exc_info=True)
+            self._fail_batch(batch, e)
+        finally:
+            self._slots.release()
+
+    def _fail_batch(self, batch: List[Tuple["Image.Image", asyncio.Future, float]], error: Exception):
+        for _, future, _ in batch:
+            if not future.done():
+                future.set_exception(error)
+
+    async def _collect_batch(self) -> List[Tuple["Image.Image", asyncio.Future, float]]:
+        batch = [await self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _process_batch(self, batch: List[Tuple["Image.Image", asyncio.Future, float]]):
+        started = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            self.queue_wait.observe(started - enqueued_at)
+        self.batch_sizes[len(batch)] += 1
+
+        results = await inference_executor.run(
+            _detect_batch, [image for image, _, _ in batch]
+        )
+
+        finished = time.perf_counter()
+        self.inference.observe(finished - started)
+
+        for (_, future, enqueued_at), result in zip(batch, results):
+            self.total.observe(finished - enqueued_at)
+            if not future.done():
+                future.set_result(result)
+
+    def get_stats(self) -> Dict:
+        """Метрики очереди и пачек"""
+        return {
+            "running": self.is_running,
+            "queue_depth": self.queue_depth,
+            "max_queue_size": self.max_queue_size,
+            "batches_in_flight": len(self._in_flight),
+            "rejected": self.rejected,
+            "executor": inference_executor.get_stats(),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batch_size_histogram": {
+                str(size): count for size, count in sorted(self.batch_sizes.items())
+            },
+            "latency": {
+                "queue_wait": self.queue_wait.to_dict(),
+                "inference": self.inference.to_dict(),
+                "total": self.total.to_dict()
+            }
+        }
+
+
+def _detect_batch(images: List["Image.Image"]) -> List[Dict]:
+    """Распознавание пачки изображений (выполняется в пуле инференса)"""
+    from app.services.food_classification_model import food_model_registry
+
+    model = food_model_registry.get_model()
+    return [
+        model.attach_ingredients(dish_result)
+        for dish_result in model.detect_dishes_batch(images)
+    ]
+
+
+# Глобальный планировщик инференса (запускается при старте приложения)
+inference_batcher = InferenceBatcher(
+    max_batch_size=settings.INFERENCE_MAX_BATCH_SIZE,
+    max_wait_ms=settings.INFERENCE_MAX_WAIT_MS,
+    max_queue_size=settings.INFERENCE_MAX_QUEUE_SIZE,
+    concurrency=settings.INFERENCE_WORKERS
+)
@@ -0,0 +1,98 @@
+# app/services/inference_executor.py
+import asyncio
+import logging
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceQueueFull(Exception):
+    """Очередь инференса переполнена - запрос нужно отклонить"""
+
+
+def _init_process_worker():
+    """Каждый процесс пула загружает собственную копию модели"""
+    from app.services.food_classification_model import food_model_registry
+    food_model_registry.load()
+
+
+def _worker_pid() -> int:
+    """Пустая задача прогрева: выполняется только после загрузки модели в процессе"""
+    return os.getpid()
+
+
+class InferenceExecutor:
+    """Выделенный пул для инференса, изолированный от пула FastAPI/Starlette.
+
+    mode="thread" - потоки внутри воркера uvicorn (общая модель),
+    mode="process" - отдельные процессы, у каждого своя копия модели.
+    """
+
+    def __init__(self, mode: str, workers: int):
+        if mode not in ("thread", "process"):
+            raise ValueError(f"Unknown inference executor mode: {mode}")
+        self.mode = mode
+        self.workers = workers
+        self._executor: Optional[Executor] = None
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_process_worker
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers,
+                thread_name_prefix="Inference"
+            )
+        logger.info(f"✅ Inference executor started ({self.mode}, workers={self.workers})")
+
+    def warm_up(self):
+        """Запуск пула и загрузка модели во всех процессах до прихода запросов.
+
+        Процессы пула стартуют по требованию, поэтому задачи отправляются
+        пачками, пока каждый из workers процессов не выполнит хотя бы одну.
+        """
+        self.start()
+        if self.mode != "process":
+            return
+        pids = set()
+        while len(pids) < self.workers:
+            futures = [self._executor.submit(_worker_pid) for _ in range(self.workers)]
+            pids.update(future.result() for future in futures)
+        logger.info(f"🔥 Inference pool warmed up ({len(pids)} processes)")
+
+    def shutdown(self):
+        if self._executor is None:
+            return
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+        logger.info("🛑 Inference executor stopped")
+
+    async def run(self, func: Callable, *args):
+        """Выполнение функции в пуле инференса"""
+        if self._executor is None:
+            self.start()
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def get_stats(self) -> Dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "running": self._executor is not None
+        }
+
+
+# Глобальный пул инференса
+inference_executor = InferenceExecutor(
+    mode=settings.INFERENCE_EXECUTOR,
+    workers=settings.INFERENCE_WORKERS
+)
@@ -0,0 +1,132 @@
+# app/services/onnx_food_classifier.py
+import argparse
+import logging
+import os
+from typing import Dict, List, Union
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+FP32_MODEL_FILE = "model.onnx"
+INT8_MODEL_FILE = "model.int8.onnx"
+
+
+class OnnxFoodClassifier:
+    """Классификатор на onnxruntime с интерфейсом transformers image-classification pipeline"""
+
+    def __init__(
+        self,
+        model_dir: str,
+        model_file: str = INT8_MODEL_FILE,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        top_k: int = 5
+    ):
+        import onnxruntime as ort
+        from transformers import AutoConfig, AutoImageProcessor
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file),
+            sess_options=options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        self.processor = AutoImageProcessor.from_pretrained(model_dir)
+        self.id2label = AutoConfig.from_pretrained(model_dir).id2label
+        self.top_k = top_k
+
+    def __call__(self, images: Union[Image.Image, List[Image.Image]], batch_size: int = None):
+        single = not isinstance(images, list)
+        batch = [images] if single else images
+
+        inputs = self.processor(
+            images=[image.convert("RGB") for image in batch],
+            return_tensors="np"
+        )
+        logits = self.session.run(
+            None, {self.input_name: inputs["pixel_values"].astype(np.float32)}
+        )[0]
+
+        results = [self._top_k(row) for row in logits]
+        return results[0] if single else results
+
+    def _top_k(self, logits: np.ndarray) -> List[Dict]:
+        exp = np.exp(logits - logits.max())
+        probs = exp / exp.sum()
+        top = np.argsort(probs)[::-1][:self.top_k]
+        return [
+            {"label": self.id2label[int(index)], "score": float(probs[index])}
+            for index in top
+        ]
+
+
+def export_onnx_model(model_name: str, output_dir: str, quantize: bool = True, opset: int = 17) -> str:
+    """Экспорт модели HuggingFace в ONNX (+ динамическая int8-квантизация)"""
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    model = AutoModelForImageClassification.from_pretrained(model_name).eval()
+    processor = AutoImageProcessor.from_pretrained(model_name)
+
+    class LogitsOnly(torch.nn.Module):
+        def __init__(self, wrapped):
+            super().__init__()
+            self.wrapped = wrapped
+
+        def forward(self, pixel_values):
+            return self.wrapped(pixel_values=pixel_values).logits
+
+    size = processor.size
+    height = size.get("height") or size.get("shortest_edge", 224)
+    width = size.get("width") or size.get("shortest_edge", 224)
+    dummy_input = torch.randn(1, 3, height, width)
+
+    fp32_path = os.path.join(output_dir, FP32_MODEL_FILE)
+    torch.onnx.export(
+        LogitsOnly(model),
+        dummy_input,
+        fp32_path,
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset
+    )
+    model.config.save_pretrained(output_dir)
+    processor.save_pretrained(output_dir)
+    logger.info(f"✅ Exported ONNX model to {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    int8_path = os.path.join(output_dir, INT8_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    logger.info(f"✅ Quantized ONNX model saved to {int8_path}")
+    return int8_path
+
+
+if __name__ == "__main__":
+    # python -m app.services.onnx_food_classifier --output models/food101-onnx
+    from app.core.config import settings
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Export Food-101 classifier to ONNX")
+    parser.add_argument("--model", default=settings.FOOD_MODEL_NAME)
+    parser.add_argument("--output", default=settings.ONNX_MODEL_DIR)
+    parser.add_argument("--no-quantize", action="store_true")
+    parser.add_argument("--opset", type=int, default=17)
+    args = parser.parse_args()
+
+    export_onnx_model(args.model, args.output, quantize=not args.no_quantize, opset=args.opset)
@@ -0,0 +1,177 @@
+# app/services/product_search.py
+import re
+from typing import List, Optional
+
+from sqlalchemy import func, literal, select, text, union_all
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.query_options import product_response_options
+from app.models.order import OrderItem
+from app.models.product import Category, Product, ProductTag, Tag
+
+SEARCH_CONFIG = "russian"
+SORT_OPTIONS = ("relevance", "price_asc", "price_desc", "popularity")
+
+# Индексы поиска. Повторяют миграцию f3a8c1d5e207 - нужны, когда схема
+# создана через create_all, и в scripts/benchmark_product_search.py
+SEARCH_INDEX_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_products_search_vector ON products USING gin (search_vector)",
+    "CREATE INDEX IF NOT EXISTS ix_products_name_trgm ON products USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_products_category_id ON products (category_id)",
+    "CREATE INDEX IF NOT EXISTS ix_tags_name_trgm ON tags USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_categories_name_trgm ON categories USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_product_tags_tag_id ON product_tags (tag_id)",
+    "CREATE INDEX IF NOT EXISTS ix_order_items_product_id ON order_items (product_id)"
+]
+
+# Вклад совпадений по тегу и категории в релевантность
+TAG_MATCH_BOOST = 0.3
+CATEGORY_MATCH_BOOST = 0.2
+
+_WORD_RE = re.compile(r"[^\W_]+")
+_MAX_QUERY_WORDS = 8
+
+
+def ensure_search_indexes(connection) -> None:
+    for statement in SEARCH_INDEX_DDL:
+        connection.execute(text(statement))
+
+
+def build_prefix_tsquery(term: str) -> Optional[str]:
+    """"молок сыр" -> "молок:* & сыр:*" - поиск по мере ввода, по префиксам слов"""
+    words = _WORD_RE.findall(term.lower())[:_MAX_QUERY_WORDS]
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+class ProductSearchService:
+    """Ранжированный поиск товаров по названию, описанию, тегам и категории.
+
+    Кандидаты собираются из нескольких индексов (GIN по tsvector, триграммы
+    названия, теги и категории, похожие на запрос) и ранжируются вместе:
+    ts_rank_cd + сходство названия + бонусы за тег и категорию.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def search(
+        self,
+        term: str,
+        category_id: Optional[int] = None,
+        sort: str = "relevance",
+        limit: int = 100,
+        offset: int = 0
+    ) -> List[Product]:
+        term = term.strip()
+        tsquery_text = build_prefix_tsquery(term)
+        if not tsquery_text:
+            return []
+
+        # Порог опечаток действует только в текущей транзакции
+        self.db.execute(
+            text("SELECT set_config('pg_trgm.word_similarity_threshold', :value, true)"),
+            {"value": str(settings.SEARCH_TYPO_THRESHOLD)}
+        )
+
+        tsquery = func.to_tsquery(SEARCH_CONFIG, tsquery_text)
+        candidates = self._candidates(tsquery, literal(term), category_id)
+        relevance = (
+            func.ts_rank_cd(Product.search_vector, tsquery)
+            + func.word_similarity(term, Product.name)
+            + TAG_MATCH_BOOST * candidates.c.tag_hit
+            + CATEGORY_MATCH_BOOST * candidates.c.category_hit
+        )
+
+        query = self.db.query(Product).options(*product_response_options()).join(candidates, candidates.c.id == Product.id).filter(
+            Product.is_active == True
+        )
+        if category_id:
+            query = query.filter(Product.category_id == category_id)
+
+        if sort == "price_asc":
+            query = query.order_by(Product.price.asc(), relevance.desc())
+        elif sort == "price_desc":
+            query = query.order_by(Product.price.desc(), relevance.desc())
+        elif sort == "popularity":
+            sold = select(
+                OrderItem.product_id,
+                func.sum(OrderItem.quantity).label("sold")
+            ).where(
+                OrderItem.product_id.in_(select(candidates.c.id))
+            ).group_by(OrderItem.product_id).subquery()
+            query = query.outerjoin(sold, sold.c.product_id == Product.id).order_by(
+                func.coalesce(sold.c.sold, 0).desc(), relevance.desc()
+            )
+        else:
+            query = query.order_by(relevance.desc())
+
+        return query.order_by(Product.id).offset(offset).limit(limit).all()
+
+    def _candidates(self, tsquery, term, category_id: Optional[int] = None):
+        """id товаров из всех источников с признаками совпадения по тегу/категории.
+
+        Каждый источник использует свой индекс и ограничен
+        SEARCH_CANDIDATE_LIMIT - один OR по всем условиям Postgres
+        выполнил бы последовательным сканированием. Лимит применяется после
+        сортировки по собственной оценке источника и после фильтра по
+        категории - иначе лучшие совпадения могли бы не попасть в выборку.
+        """
+        candidate_limit = settings.SEARCH_CANDIDATE_LIMIT
+
+        # term <% name: в названии есть слово, похожее на запрос (pg_trgm);
+        # term <<-> name - расстояние по этому сходству
+        def similar_to_term(column):
+            return term.op("<%")(column)
+
+        matched_tags = select(Tag.id).where(similar_to_term(Tag.name)).order_by(
+            term.op("<<->")(Tag.name)
+        ).limit(settings.SEARCH_MAX_MATCHED_TAGS)
+        matched_categories = select(Category.id).where(similar_to_term(Category.name)).order_by(
+            term.op("<<->")(Category.name)
+        ).limit(settings.SEARCH_MAX_MATCHED_CATEGORIES)
+
+        def source(condition, rank, joins=(), tag_hit: int = 0, category_hit: int = 0):
+            query = select(
+                Product.id.label("id"),
+                literal(tag_hit).label("tag_hit"),
+                literal(category_hit).label("category_hit")
+            )
+            if joins:
+                query = query.select_from(Product)
+                for target, on in joins:
+                    query = query.join(target, on)
+            query = query.where(condition, Product.is_active == True)
+            if category_id:
+                query = query.where(Product.category_id == category_id)
+            return query.order_by(rank, Product.id).limit(candidate_limit)
+
+        sources = union_all(
+            source(
+                Product.search_vector.op("@@")(tsquery),
+                func.ts_rank_cd(Product.search_vector, tsquery).desc()
+            ),
+            source(similar_to_term(Product.name), term.op("<<->")(Product.name)),
+            source(
+                ProductTag.tag_id.in_(matched_tags),
+                term.op("<<->")(Tag.name),
+                joins=(
+                    (ProductTag, ProductTag.product_id == Product.id),
+                    (Tag, Tag.id == ProductTag.tag_id)
+                ),
+                tag_hit=1
+            ),
+            source(
+                Product.category_id.in_(matched_categories),
+                term.op("<<->")(Category.name),
+                joins=((Category, Category.id == Product.category_id),),
+                category_hit=1
+            )
+        ).subquery()
+
+        return select(
+            sources.c.id,
+            func.max(sources.c.tag_hit).label("tag_hit"),
+            func.max(sources.c.category_hit).label("category_hit")
+        ).group_by(sources.c.id).cte("search_candidates")
@@ -5,6 +5,7 @@ from datetime import datetime
 import json
 from app.models.promotions import Promotion, PromotionType
 from app.models.product import Product
+from app.core.query_options import promotion_rules_options
 
 class PromotionService:
     def __init__(self, db: Session):
@@ -51,7 +52,7 @@ class PromotionService:
     def get_active_promotions(self) -> List[Promotion]:
         """Получить активные акции"""
         now = datetime.now()
-        return self.db.query(Promotion).filter(
+        return self.db.query(Promotion).options(*promotion_rules_options()).filter(
             Promotion.is_active == True,
             Promotion.start_date <= now,
             Promotion.end_date >= now
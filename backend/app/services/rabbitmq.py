@@ -1,14 +1,22 @@
 import pika
 import json
 import logging
+import threading
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# Fanout-обменники: сообщение получает каждый подписанный процесс (своя
+# временная очередь у каждого), а не один потребитель общей очереди
+FANOUT_EXCHANGES = ('ai_results',)
+MESSAGE_TTL_MS = 60000
+
 class RabbitMQClient:
     def __init__(self):
         self.connection = None
         self.channel = None
+        # BlockingConnection не потокобезопасен, публикация идёт из разных потоков
+        self._publish_lock = threading.Lock()
         # Убираем автоматическое подключение в __init__
     
     def connect(self):
@@ -24,7 +32,6 @@ class RabbitMQClient:
                 ('image_processing', True),
                 ('order_processing', True),
                 ('user_notifications', True),
-                ('ai_results', True),
                 ('error_logs', True)
             ]
             
@@ -33,9 +40,12 @@ class RabbitMQClient:
                     queue=queue,
                     durable=durable,
                     arguments={
-                        'x-message-ttl': 60000  # TTL 60 секунд для сообщений
+                        'x-message-ttl': MESSAGE_TTL_MS  # TTL 60 секунд для сообщений
                     }
                 )
+
+            for exchange in FANOUT_EXCHANGES:
+                self.channel.exchange_declare(exchange=exchange, exchange_type='fanout', durable=True)
             
             logger.info("✅ Successfully connected to RabbitMQ")
             
@@ -48,30 +58,73 @@ class RabbitMQClient:
         if not self.connection or self.connection.is_closed:
             self.connect()
     
-    def publish_message(self, queue: str, message: dict):
+    def publish_message(self, queue: str, message: dict) -> bool:
         """Публикация сообщения в очередь"""
         try:
-            self._ensure_connected()
-                
-            self.channel.basic_publish(
-                exchange='',
-                routing_key=queue,
-                body=json.dumps(message),
-                properties=pika.BasicProperties(
-                    delivery_mode=2,  # persistent message
-                    content_type='application/json'
+            with self._publish_lock:
+                self._ensure_connected()
+                    
+                self.channel.basic_publish(
+                    exchange='',
+                    routing_key=queue,
+                    body=json.dumps(message, default=str),
+                    properties=pika.BasicProperties(
+                        delivery_mode=2,  # persistent message
+                        content_type='application/json'
+                    )
                 )
-            )
             logger.debug(f"📤 Message published to '{queue}': {message}")
+            return True
             
         except Exception as e:
             logger.error(f"❌ Failed to publish message: {e}")
             # Не пытаемся переподключиться автоматически
+            return False
     
-    def consume_messages(self, queue: str, callback):
+    def publish_fanout(self, exchange: str, message: dict) -> bool:
+        """Рассылка сообщения всем процессам, подписанным на обменник"""
+        try:
+            with self._publish_lock:
+                self._ensure_connected()
+
+                self.channel.basic_publish(
+                    exchange=exchange,
+                    routing_key='',
+                    body=json.dumps(message, default=str),
+                    properties=pika.BasicProperties(
+                        delivery_mode=1,  # очереди подписчиков временные
+                        content_type='application/json'
+                    )
+                )
+            logger.debug(f"📤 Message broadcast to '{exchange}': {message}")
+            return True
+
+        except Exception as e:
+            logger.error(f"❌ Failed to broadcast message: {e}")
+            return False
+
+    def consume_fanout(self, exchange: str, callback):
+        """Потребление из обменника через собственную очередь процесса:
+        exclusive + auto_delete - очередь удаляется вместе с соединением"""
+        self._ensure_connected()
+        result = self.channel.queue_declare(
+            queue='',
+            exclusive=True,
+            auto_delete=True,
+            arguments={'x-message-ttl': MESSAGE_TTL_MS}
+        )
+        queue = result.method.queue
+        self.channel.queue_bind(queue=queue, exchange=exchange)
+        self.consume_messages(queue, callback)
+
+    def consume_messages(self, queue: str, callback, prefetch_count: int = None):
         """Потребление сообщений из очереди"""
         try:
             self._ensure_connected()
+
+            if prefetch_count:
+                # Не забираем из очереди больше, чем успеваем обработать
+                self.channel.basic_qos(prefetch_count=prefetch_count)
                 
             def wrapped_callback(ch, method, properties, body):
                 try:
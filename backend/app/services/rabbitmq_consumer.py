@@ -1,46 +1,25 @@
 import logging
 import threading
 import time
-from app.services.rabbitmq import RabbitMQClient
-from app.services.tag_service import TagService
-from sqlalchemy.orm import Session
-from app.models.database import get_db
+from app.services.rabbitmq import FANOUT_EXCHANGES, RabbitMQClient
 
 
 logger = logging.getLogger(__name__)
 
 class MessageConsumer:
-    def __init__(self, db: Session):
+    def __init__(self):
         self.is_running = False
         self.consumer_threads = {}
-        self.db = db
     
     def handle_image_processing(self, message):
-        try:
-            # 1. Анализ в Clarifai
-            clarifai_results = self.clarifai_analyze(message['image_data'])
-            
-            # 2. Подбор альтернатив через теги
-            tag_service = TagService(self.db)
-            alternatives = tag_service.find_ingredient_alternatives(
-                clarifai_results, 
-                message['user_id']
-            )
-            
-            # 3. Отправка результата
-            self.rabbitmq_client.publish_message('ai_results', {
-                'user_id': message['user_id'],
-                'session_id': message['session_id'],
-                'alternatives': alternatives
-            })
-            
-        except Exception as e:
-            logger.error(f"Image processing error: {e}")
+        """Задача асинхронного анализа: модель, подбор товаров, запись в историю"""
+        from app.services.analysis_jobs import process_analysis_job
+        process_analysis_job(message)
 
-    def clarifai_analyze(self, image_data):
-        """Заглушка - заменить на реальный Clarifai API"""
-        # TODO: Реальная интеграция с Clarifai
-        return ["салат", "курица", "сыр", "помидор"]
+    def handle_ai_results(self, message):
+        """Результат анализа от воркера - подписчикам SSE этого процесса"""
+        from app.services.analysis_jobs import analysis_results_hub
+        analysis_results_hub.publish(message)
     
     def handle_order_processing(self, message):
         """Обработчик сообщений обработки заказов"""
@@ -84,7 +63,7 @@ class MessageConsumer:
         
         return False
     
-    def _create_consumer_for_queue(self, queue: str, handler):
+    def _create_consumer_for_queue(self, queue: str, handler, prefetch_count: int = None):
         """Создает и запускает потребителя для конкретной очереди"""
         def consumer_worker():
             logger.info(f"🚀 Starting consumer worker for queue: {queue}")
@@ -97,7 +76,11 @@ class MessageConsumer:
                     client.connect()
                     
                     logger.info(f"📥 Consumer for '{queue}' is ready and consuming...")
-                    client.consume_messages(queue, handler)
+                    if queue in FANOUT_EXCHANGES:
+                        # Каждому процессу - все сообщения (результаты для его SSE-подписчиков)
+                        client.consume_fanout(queue, handler)
+                    else:
+                        client.consume_messages(queue, handler, prefetch_count=prefetch_count)
                     client.start_consuming()  # Блокирующий вызов
                     
                 except Exception as e:
@@ -128,8 +111,8 @@ class MessageConsumer:
         
         return consumer_worker
     
-    def start_consumers(self):
-        """Запуск всех consumers в отдельных потоках"""
+    def start_consumers(self, queues: list = None):
+        """Запуск consumers в отдельных потоках (по умолчанию - всех очередей)"""
         if not self._wait_for_rabbitmq():
             logger.error("❌ Cannot start consumers - RabbitMQ unavailable")
             return
@@ -137,15 +120,20 @@ class MessageConsumer:
         self.is_running = True
         
         # Запускаем consumers для разных очередей
+        # image_processing - по одному сообщению за раз: инференс долгий,
+        # остальные задачи должны достаться другим воркерам
         queues_handlers = [
-            ('image_processing', self.handle_image_processing),
-            ('order_processing', self.handle_order_processing),
-            ('user_notifications', self.handle_user_notifications),
+            ('image_processing', self.handle_image_processing, 1),
+            ('ai_results', self.handle_ai_results, None),
+            ('order_processing', self.handle_order_processing, None),
+            ('user_notifications', self.handle_user_notifications, None),
         ]
+        if queues is not None:
+            queues_handlers = [item for item in queues_handlers if item[0] in queues]
         
-        for queue, handler in queues_handlers:
+        for queue, handler, prefetch_count in queues_handlers:
             thread = threading.Thread(
-                target=self._create_consumer_for_queue(queue, handler),
+                target=self._create_consumer_for_queue(queue, handler, prefetch_count),
                 daemon=True,
                 name=f"Consumer-{queue}"
             )
@@ -173,4 +161,4 @@ class MessageConsumer:
         logger.info("🛑 All consumers stopped")
 
 # Глобальный экземпляр consumer
-message_consumer = MessageConsumer(get_db())
\ No newline at end of file
+message_consumer = MessageConsumer()
\ No newline at end of file
@@ -0,0 +1,280 @@
+# app/services/tag_index.py
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.product import Tag
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD = re.compile(r"[^\w]+")
+
+# Окончания для упрощённой лемматизации (от длинных к коротким):
+# "помидоры" / "помидоров" / "помидор" сводятся к одной основе
+_SUFFIXES = sorted([
+    "ами", "ями", "ого", "его", "ому", "ему", "ыми", "ими",
+    "ая", "яя", "ое", "ее", "ой", "ей", "ий", "ый", "ие", "ые",
+    "ов", "ев", "ам", "ям", "ах", "ях", "ом", "ем", "ую", "юю",
+    "а", "я", "о", "е", "ы", "и", "у", "ю", "ь", "s"
+], key=len, reverse=True)
+_MIN_STEM = 3
+
+# Вес доли триграмм запроса, найденных в теге (аналог word_similarity):
+# "сыр" должен находить "сыр твердый", даже если полное сходство низкое
+_CONTAINMENT_WEIGHT = 0.8
+
+
+def _stem(word: str) -> str:
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= _MIN_STEM:
+            return word[:-len(suffix)]
+    return word
+
+
+def normalize(text: str) -> str:
+    """Регистр, ё/е, пунктуация и окончания: "Сыры  Моцарелла!" -> "сыр моцарелл" """
+    text = text.casefold().replace("ё", "е")
+    words = [word for word in _NON_WORD.split(text) if word and word != "_"]
+    return " ".join(_stem(word) for word in words)
+
+
+def trigrams(normalized: str) -> set:
+    """Триграммы по словам с дополнением пробелами, как в pg_trgm"""
+    result = set()
+    for word in normalized.split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            result.add(padded[i:i + 3])
+    return result
+
+
+def _is_padding(gram: str) -> bool:
+    """Триграммы начала слова ("  с", " со") - общие у всех слов на те же буквы"""
+    return gram.startswith(" ")
+
+
+@dataclass(frozen=True)
+class TagMatch:
+    tag_id: int
+    name: str
+    score: float
+
+
+class _Snapshot:
+    """Неизменяемый снимок индекса - заменяется целиком при перезагрузке"""
+
+    def __init__(self, tags: List[Tuple[int, str]]):
+        self.names: Dict[int, str] = {}
+        self.exact: Dict[str, int] = {}
+        self.grams: Dict[int, frozenset] = {}
+        postings = defaultdict(list)
+
+        # Сортировка по id - при равных оценках выбор детерминирован
+        for tag_id, name in sorted(tags):
+            key = normalize(name)
+            if not key:
+                continue
+            self.names[tag_id] = name
+            self.exact.setdefault(key, tag_id)
+            grams = frozenset(trigrams(key))
+            self.grams[tag_id] = grams
+            for gram in grams:
+                postings[gram].append(tag_id)
+
+        # Списки упорядочены по числу триграмм тега: для сходства Жаккара не
+        # ниже порога тег не может быть намного длиннее запроса, и хвост
+        # списка с длинными тегами отсекается двоичным поиском по sizes
+        self.postings: Dict[str, Tuple[int, ...]] = {}
+        self.sizes: Dict[str, Tuple[int, ...]] = {}
+        for gram, ids in postings.items():
+            ids.sort(key=lambda tag_id: len(self.grams[tag_id]))
+            self.postings[gram] = tuple(ids)
+            self.sizes[gram] = tuple(len(self.grams[tag_id]) for tag_id in ids)
+        self.name_lengths: Dict[int, int] = {tag_id: len(name) for tag_id, name in self.names.items()}
+
+    def search(self, query: str, limit: int, min_score: float) -> List[TagMatch]:
+        key = normalize(query)
+        if not key:
+            return []
+
+        exact_id = self.exact.get(key)
+        if exact_id is not None and limit == 1:
+            return [TagMatch(exact_id, self.names[exact_id], 1.0)]
+
+        query_grams = trigrams(key)
+        total = len(query_grams)
+        # Доля вхождения считается без триграмм начала слова: иначе короткое
+        # слово, совпадающее с тегом только первыми буквами ("соус" - "соль"),
+        # набирает порог за счёт "  с" и " со"
+        inner = frozenset(gram for gram in query_grams if not _is_padding(gram))
+        padding = query_grams - inner
+        inner_total = len(inner)
+
+        def upper_bound(remaining: int, remaining_inner: int) -> float:
+            # Тег, не встретившийся в уже просмотренных списках, делит с
+            # запросом не больше remaining триграмм, из них не больше
+            # remaining_inner внутренних
+            return max(remaining / total, _CONTAINMENT_WEIGHT * remaining_inner / inner_total)
+
+        # Триграммы запроса обходим от редких к частым: редкие триграммы начала
+        # слова (" юч") быстро находят лучший тег и поднимают порог. Как только
+        # граница оценки ниже худшего из лучших limit результатов, частые
+        # триграммы ("  с", " по") можно не просматривать. Когда внутренние
+        # триграммы закончились, обход останавливается: тег, найденный лишь по
+        # триграммам начала слова, всё равно отбрасывается.
+        ordered = sorted(query_grams, key=lambda gram: len(self.postings.get(gram, ())))
+        threshold = min_score
+        grams = self.grams
+        name_lengths = self.name_lengths
+        containment_weight = _CONTAINMENT_WEIGHT / inner_total if inner_total else 0.0
+        seen = set()
+        scored = []
+        remaining_inner = inner_total
+        for position, gram in enumerate(ordered):
+            if not remaining_inner or upper_bound(total - position, remaining_inner) < threshold:
+                break
+            ids = self.postings.get(gram, ())
+            remaining = total - position
+            if _CONTAINMENT_WEIGHT * remaining_inner / inner_total < threshold:
+                # Порог достижим только по Жаккару: c / (total + size - c) >= threshold
+                # при c <= remaining возможно лишь для size <= max_size
+                max_size = remaining * (1 + threshold) / threshold - total
+                ids = ids[:bisect.bisect_right(self.sizes[gram], max_size + 1e-9)] if ids else ids
+            if gram in inner:
+                remaining_inner -= 1
+            new_ids = set(ids) - seen
+            seen |= new_ids
+            for tag_id in new_ids:
+                tag_grams = grams[tag_id]
+                # Пересечения малых множеств запроса - без цикла на Python
+                inner_common = len(inner & tag_grams)
+                if not inner_common:
+                    # Совпадают только первые буквы слов - это не то же слово
+                    continue
+                common = inner_common + len(padding & tag_grams)
+                # Сходство Жаккара по триграммам (как similarity() в pg_trgm)
+                score = common / (total + len(tag_grams) - common)
+                containment = containment_weight * inner_common
+                if containment > score:
+                    score = containment
+                if score >= min_score:
+                    scored.append((-score, name_lengths[tag_id], tag_id))
+            if len(scored) >= limit:
+                scored = heapq.nsmallest(limit, scored)
+                threshold = max(min_score, -scored[-1][0])
+
+        scored.sort()
+        matches = [TagMatch(tag_id, self.names[tag_id], -score) for score, _, tag_id in scored[:limit]]
+
+        if exact_id is not None and (not matches or matches[0].tag_id != exact_id):
+            matches = [TagMatch(exact_id, self.names[exact_id], 1.0)] + [
+                match for match in matches if match.tag_id != exact_id
+            ][:limit - 1]
+        return matches
+
+
+class TagIndex:
+    """Индекс тегов в памяти процесса для сопоставления ингредиентов с тегами"""
+
+    def __init__(self, min_score: float, refresh_seconds: int):
+        self.min_score = min_score
+        self.refresh_seconds = refresh_seconds
+        self._snapshot: Optional[_Snapshot] = None
+        self._loaded_at = 0.0
+        self._stale = True
+        self._lock = threading.Lock()
+        # Одна перезагрузка на все запросы, пришедшие после mark_stale()
+        self._load_lock = threading.Lock()
+        # Растёт при каждой перезагрузке - по нему кэши поверх индекса понимают,
+        # что сопоставления тегов нужно пересчитать
+        self.generation = 0
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._snapshot is not None
+
+    def load(self, db: Session) -> None:
+        """Полная загрузка тегов из БД"""
+        started = time.perf_counter()
+        # Сброс до чтения: mark_stale() во время загрузки вызовет ещё одну
+        self._stale = False
+        try:
+            tags = db.query(Tag.id, Tag.name).all()
+            snapshot = _Snapshot([(tag_id, name) for tag_id, name in tags])
+        except Exception:
+            self._stale = True
+            raise
+
+        with self._lock:
+            self._snapshot = snapshot
+            self._loaded_at = time.monotonic()
+            self.generation += 1
+
+        logger.info(f"✅ Tag index loaded: {len(snapshot.names)} tags in {time.perf_counter() - started:.3f}s")
+
+    def mark_stale(self) -> None:
+        """Индекс перечитается при следующем поиске. Вызывается кэшем каталога
+        при смене версии tags - в каждом процессе, получившем инвалидацию"""
+        self._stale = True
+
+    def _needs_reload(self) -> bool:
+        expired = time.monotonic() - self._loaded_at > self.refresh_seconds
+        return self._snapshot is None or self._stale or expired
+
+    def _get_snapshot(self, db: Session) -> _Snapshot:
+        if self._needs_reload():
+            with self._load_lock:
+                # Пока ждали блокировку, индекс мог перезагрузить другой запрос
+                if self._needs_reload():
+                    self.load(db)
+        return self._snapshot
+
+    def ensure_fresh(self, db: Session) -> int:
+        """Перезагрузка при необходимости; возвращает текущее поколение индекса"""
+        self._get_snapshot(db)
+        return self.generation
+
+    def search(self, db: Session, query: str, limit: int = 5) -> List[TagMatch]:
+        """Ранжированный список похожих тегов"""
+        return self._get_snapshot(db).search(query, limit, self.min_score)
+
+    def resolve(self, db: Session, ingredient: str) -> Optional[TagMatch]:
+        """Лучший тег для ингредиента или None"""
+        matches = self.search(db, ingredient, limit=1)
+        return matches[0] if matches else None
+
+    def resolve_many(self, db: Session, ingredients: List[str]) -> Dict[str, int]:
+        """{ингредиент: id тега} для найденных ингредиентов"""
+        snapshot = self._get_snapshot(db)
+        result = {}
+        for ingredient in ingredients:
+            matches = snapshot.search(ingredient, 1, self.min_score)
+            if matches:
+                result[ingredient] = matches[0].tag_id
+        return result
+
+    def get_stats(self) -> Dict:
+        snapshot = self._snapshot
+        return {
+            "loaded": snapshot is not None,
+            "tags": len(snapshot.names) if snapshot else 0,
+            "trigrams": len(snapshot.postings) if snapshot else 0,
+            "age_seconds": round(time.monotonic() - self._loaded_at, 1) if snapshot else None,
+            "stale": self._stale
+        }
+
+
+# Глобальный индекс тегов
+tag_index = TagIndex(
+    min_score=settings.TAG_MATCH_MIN_SIMILARITY,
+    refresh_seconds=settings.TAG_INDEX_REFRESH_SECONDS
+)
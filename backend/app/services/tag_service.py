@@ -1,9 +1,10 @@
 # app/services/tag_service.py
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
-from typing import List, Dict, Optional
+from sqlalchemy import or_, func
+from typing import List, Dict, Optional, Union
 from app.models.product import Product, ProductTag, Tag
 from app.models.favorite import Favorite
+from app.services.tag_index import tag_index
 
 class TagService:
     def __init__(self, db: Session):
@@ -11,54 +12,116 @@ class TagService:
 
     def get_products_by_tag(self, tag_name: str, user_id: int, limit: int = 10) -> List[Dict]:
         """Поиск товаров по названию тега с учетом избранного"""
+        return self.get_products_by_tags_bulk([tag_name], user_id, limit).get(tag_name, [])
+
+    def get_products_by_multiple_tags(self, tag_names: List[str], user_id: int, limit: int = 5) -> List[Dict]:
+        """Поиск товаров по нескольким тегам"""
+        products_by_tag = self.get_products_by_tags_bulk(tag_names, user_id, limit)
+        return {tag_name: products for tag_name, products in products_by_tag.items() if products}
+
+    def get_products_by_tags_bulk(
+        self,
+        ingredients: List[str],
+        user_id: int,
+        limits: Union[int, Dict[str, int]] = 5,
+        tag_ids: Optional[Dict[str, Optional[int]]] = None
+    ) -> Dict[str, List[Dict]]:
+        """Товары для списка ингредиентов: теги по индексу в памяти, товары и избранное - два запроса.
+
+        limits - общий лимит или лимит для каждого ингредиента.
+        tag_ids - заранее сопоставленные теги (None - тега нет), остальные
+        ингредиенты ищутся по индексу.
+        Возвращает {ингредиент: [товары]} в порядке входного списка.
+        """
+        ingredients = list(dict.fromkeys(i for i in ingredients if i and i.strip()))
+        if not ingredients:
+            return {}
+
+        def limit_for(ingredient: str) -> int:
+            if isinstance(limits, dict):
+                return limits.get(ingredient, 0)
+            return limits
+
         try:
-            tag = self.db.query(Tag).filter(
-                or_(
-                    Tag.name.ilike(tag_name),
-                    Tag.name.ilike(f"%{tag_name}%")
-                )
-            ).first()
-            
-            if not tag:
-                return []
-            
-            products = self.db.query(Product).join(ProductTag).filter(
-                ProductTag.tag_id == tag.id,
+            known = tag_ids or {}
+            tag_ids = {ingredient: tag_id for ingredient, tag_id in known.items() if tag_id is not None}
+            missing = [ingredient for ingredient in ingredients if ingredient not in known]
+            if missing:
+                tag_ids.update(self._resolve_tags(missing))
+            if not tag_ids:
+                return {ingredient: [] for ingredient in ingredients}
+
+            # Лимит по тегу - максимальный среди ингредиентов, сопоставленных с ним
+            tag_limits: Dict[int, int] = {}
+            for ingredient, tag_id in tag_ids.items():
+                tag_limits[tag_id] = max(tag_limits.get(tag_id, 0), limit_for(ingredient))
+
+            # Первые N товаров каждого тега одним запросом (row_number по тегу)
+            ranked = self.db.query(
+                ProductTag.tag_id.label("tag_id"),
+                ProductTag.product_id.label("product_id"),
+                func.row_number().over(
+                    partition_by=ProductTag.tag_id,
+                    order_by=ProductTag.product_id
+                ).label("rank")
+            ).join(Product, Product.id == ProductTag.product_id).filter(
+                ProductTag.tag_id.in_(tag_limits.keys()),
                 Product.is_active == True
-            ).limit(limit).all()
-            
-            favorite_product_ids = {
-                fav.product_id for fav in 
-                self.db.query(Favorite).filter(Favorite.user_id == user_id).all()
-            }
-            
-            return [
-                {
-                    'id': product.id,
-                    'name': product.name,
-                    'price': float(product.price),
-                    'image_url': product.image_url or '',
-                    'in_favorites': product.id in favorite_product_ids,
-                    'stock_quantity': product.stock_quantity,
-                    'description': product.description
-                }
-                for product in products
-            ]
+            ).subquery()
+
+            rows = self.db.query(Product, ranked.c.tag_id).join(
+                ranked, Product.id == ranked.c.product_id
+            ).filter(
+                ranked.c.rank <= max(tag_limits.values())
+            ).order_by(ranked.c.tag_id, ranked.c.rank).all()
+
+            products_by_tag: Dict[int, List[Product]] = {}
+            for product, tag_id in rows:
+                if len(products_by_tag.setdefault(tag_id, [])) < tag_limits[tag_id]:
+                    products_by_tag[tag_id].append(product)
+
+            product_ids = {product.id for products in products_by_tag.values() for product in products}
+            favorite_product_ids = self._get_favorite_product_ids(user_id, product_ids)
+
+            result = {}
+            for ingredient in ingredients:
+                tag_id = tag_ids.get(ingredient)
+                products = products_by_tag.get(tag_id, [])[:limit_for(ingredient)]
+                result[ingredient] = [
+                    self._product_to_dict(product, favorite_product_ids)
+                    for product in products
+                ]
+            return result
             
         except Exception as e:
-            print(f"Error in get_products_by_tag: {e}")
-            return []
+            print(f"Error in get_products_by_tags_bulk: {e}")
+            return {}
 
-    def get_products_by_multiple_tags(self, tag_names: List[str], user_id: int, limit: int = 5) -> List[Dict]:
-        """Поиск товаров по нескольким тегам"""
-        products_by_tag = {}
-        
-        for tag_name in tag_names:
-            products = self.get_products_by_tag(tag_name, user_id, limit)
-            if products:
-                products_by_tag[tag_name] = products
-        
-        return products_by_tag
+    def _resolve_tags(self, ingredients: List[str]) -> Dict[str, int]:
+        """Сопоставление ингредиентов с тегами по индексу в памяти"""
+        return tag_index.resolve_many(self.db, ingredients)
+
+    def _get_favorite_product_ids(self, user_id: int, product_ids) -> set:
+        if not product_ids:
+            return set()
+        return {
+            product_id for (product_id,) in
+            self.db.query(Favorite.product_id).filter(
+                Favorite.user_id == user_id,
+                Favorite.product_id.in_(product_ids)
+            ).all()
+        }
+
+    def _product_to_dict(self, product: Product, favorite_product_ids: set) -> Dict:
+        return {
+            'id': product.id,
+            'name': product.name,
+            'price': float(product.price),
+            'image_url': product.image_url or '',
+            'in_favorites': product.id in favorite_product_ids,
+            'stock_quantity': product.stock_quantity,
+            'description': product.description
+        }
 
     def find_ingredient_alternatives(self, ingredients: List[str], user_id: int) -> Dict:
         """Поиск альтернатив для списка ингредиентов"""
@@ -67,8 +130,8 @@ class TagService:
             "additional_alternatives": []
         }
         
-        for ingredient in ingredients:
-            products = self.get_products_by_tag(ingredient, user_id, limit=5)
+        products_by_ingredient = self.get_products_by_tags_bulk(ingredients, user_id, limits=5)
+        for ingredient, products in products_by_ingredient.items():
             if products:
                 alternatives["basic_alternatives"].append({
                     'ingredient': ingredient,
@@ -87,6 +150,7 @@ class TagService:
                 self.db.add(tag)
                 self.db.commit()
                 self.db.refresh(tag)
+                tag_index.mark_stale()
             
             # Проверяем, нет ли уже такой связи
             existing_link = self.db.query(ProductTag).filter(
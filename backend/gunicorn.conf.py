@@ -0,0 +1,65 @@
+"""Конфигурация gunicorn для многопроцессного запуска API.
+
+Запуск из каталога backend:
+    gunicorn -c gunicorn.conf.py main:app
+
+Приложение и модель Food-101 загружаются один раз в master (preload_app),
+после чего воркеры создаются через fork и разделяют страницы с весами
+модели copy-on-write. Число воркеров - WEB_CONCURRENCY.
+"""
+import gc
+import logging
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "uvicorn.workers.UvicornWorker"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = 30
+preload_app = True
+
+logger = logging.getLogger("gunicorn.error")
+
+
+def _log_memory(label: str):
+    from app.core.process_metrics import get_memory_usage
+    usage = get_memory_usage()
+    logger.info(
+        f"{label} pid={usage['pid']} rss={usage.get('rss_mb')}MB pss={usage.get('pss_mb')}MB "
+        f"shared={usage.get('shared_clean_mb')}MB private={usage.get('private_dirty_mb')}MB"
+    )
+
+
+def when_ready(server):
+    """Master: приложение уже импортировано, воркеры ещё не созданы"""
+    from app.core.config import settings
+    from app.services.food_classification_model import food_model_registry
+
+    # Сессия onnxruntime и пул процессов инференса после fork не работают -
+    # в этих режимах модель загружает каждый воркер сам
+    if (
+        settings.FOOD_MODEL_PRELOAD
+        and settings.FOOD_MODEL_BACKEND == "transformers"
+        and settings.INFERENCE_EXECUTOR == "thread"
+    ):
+        food_model_registry.load(warm_up=False)
+
+    # Объекты, созданные до fork, больше не трогает сборщик мусора -
+    # иначе он пишет в их заголовки и страницы копируются в каждый воркер
+    gc.collect()
+    gc.freeze()
+    _log_memory("master ready:")
+
+
+def post_fork(server, worker):
+    """Воркер: соединения, открытые в master, не должны использоваться совместно"""
+    from app.core.minio_client import minio_client
+    from app.models.database import engine
+
+    engine.dispose(close=False)
+    if minio_client.is_initialized:
+        minio_client.client._http.clear()
+
+
+def post_worker_init(worker):
+    _log_memory(f"worker {worker.age} started:")
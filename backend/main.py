@@ -1,12 +1,13 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 import logging
 import threading
 
 from app.core.config import settings
-from app.models.database import engine, Base, SessionLocal
-from app.models.user import Role
+from app.core.startup import startup_manager
+from app.models.database import SessionLocal
 from app.services.rabbitmq_consumer import message_consumer
 from app.api.endpoints import auth, products, orders, cart, addresses, images, favorites, promotions, analysis, admin
 
@@ -15,23 +16,6 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
-Base.metadata.create_all(bind=engine)
-
-def create_initial_role():
-    db = SessionLocal()
-    try:
-        if not db.query(Role).filter(Role.id == 1).first():
-            role = Role(id=1, name='user', description='Regular User')
-            db.add(role)
-            db.commit()
-            print("✅ Initial role created")
-    except Exception as e:
-        print(f"⚠️ Role creation warning: {e}")
-    finally:
-        db.close()
-
-create_initial_role()
-
 app = FastAPI(
     title="Food Marketplace API",
     description="API для маркетплейса продуктов питания с ИИ распознаванием блюд",
@@ -51,8 +35,25 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+if settings.SQL_STATEMENT_COUNTING:
+    from app.core.sql_statements import install_statement_counter, count_statements, check_budget, STATEMENTS_HEADER
+    from app.models.database import engine
+    install_statement_counter(engine)
+
+    @app.middleware("http")
+    async def sql_statement_counter(request, call_next):
+        """Число SQL-запросов в заголовке ответа и предупреждение о превышении бюджета"""
+        with count_statements() as counter:
+            response = await call_next(request)
+        response.headers[STATEMENTS_HEADER] = str(counter.count)
+        route = request.scope.get("route")
+        if route is not None:
+            check_budget(route.path, counter)
+        return response
+
 app.mount("/static", StaticFiles(directory="uploads"), name="static")
 
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
@@ -73,22 +74,84 @@ async def startup_event():
     """Запуск приложения"""
     logger = logging.getLogger(__name__)
     logger.info("🚀 Starting Food Marketplace API...")
-    
+
+    from app.services.inference_batcher import inference_batcher
+    inference_batcher.start()
+
+    # Инвалидация кэша каталога из других воркеров (Redis pub/sub)
+    from app.services.catalog_cache import catalog_cache
+    catalog_cache.start_listener()
+
+    # Проверки зависимостей, подготовка БД и тяжёлые загрузки идут в фоне -
+    # каталог отвечает сразу, готовность видна в /health/ready
+    phases = {
+        "rabbitmq_consumers": _start_consumers,
+        "lookup_data": _load_lookup_data
+    }
+    # В режиме "process" модель загружают сами процессы пула инференса -
+    # прогреваем их, чтобы загрузку не оплачивали первые запросы
+    if settings.FOOD_MODEL_PRELOAD:
+        phases["food_model"] = (
+            _load_food_model if settings.INFERENCE_EXECUTOR == "thread" else _warm_up_inference_pool
+        )
+    startup_manager.start(phases)
+
+def _start_consumers():
+    # image_processing обрабатывают отдельные процессы воркеров (worker.py)
+    queues = ['ai_results', 'order_processing', 'user_notifications']
+    if settings.ANALYSIS_WORKER_IN_API:
+        queues.append('image_processing')
+
     consumer_thread = threading.Thread(
         target=message_consumer.start_consumers,
+        args=(queues,),
         daemon=True,
         name="RabbitMQ-Consumers"
     )
     consumer_thread.start()
-    logger.info("✅ RabbitMQ consumers started")
+
+def _load_food_model():
+    from app.services.food_classification_model import food_model_registry
+    food_model_registry.load()
+
+def _warm_up_inference_pool():
+    from app.services.inference_executor import inference_executor
+    inference_executor.warm_up()
+
+def _load_lookup_data():
+    """Индекс тегов и база ингредиентов с заранее сопоставленными тегами"""
+    from app.services.tag_index import tag_index
+    from app.services.dish_knowledge_base import dish_knowledge_base
+    db = SessionLocal()
+    try:
+        tag_index.load(db)
+        dish_knowledge_base.get_tag_ids(db, [])
+    finally:
+        db.close()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Остановка приложения"""
     logger = logging.getLogger(__name__)
     logger.info("🛑 Shutting down Food Marketplace API...")
+    await startup_manager.stop()
     message_consumer.stop_consumers()
 
+    from app.services.catalog_cache import catalog_cache
+    catalog_cache.stop_listener()
+
+    from app.services.image_variants import image_variant_pipeline
+    image_variant_pipeline.shutdown()
+
+    from app.core.image_cache import image_cache
+    image_cache.shutdown()
+
+    from app.core.file_storage import storage
+    storage.shutdown()
+
+    from app.services.inference_batcher import inference_batcher
+    await inference_batcher.stop()
+
 @app.get("/")
 async def root():
     return {"message": "Food Marketplace API"}
@@ -113,9 +176,49 @@ async def health_check():
     except Exception:
         rabbitmq_status = "disconnected"
     
+    from app.services.food_classification_model import food_model_registry
+    from app.services.inference_batcher import inference_batcher
+    from app.services.catalog_cache import catalog_cache
+    from app.core.image_cache import image_cache
+    from app.core.presigned_urls import presigned_urls
+
     return {
         "status": "healthy",
         "database": db_status,
-        "rabbitmq": rabbitmq_status
+        "rabbitmq": rabbitmq_status,
+        "food_model": food_model_registry.get_status(),
+        "inference": {
+            "queue_depth": inference_batcher.queue_depth,
+            "running": inference_batcher.is_running
+        },
+        "catalog_cache": catalog_cache.get_stats(),
+        "image_cache": image_cache.get_stats(),
+        "image_delivery": presigned_urls.get_stats()
     }
 
+@app.get("/health/live")
+async def liveness():
+    """Процесс жив и обрабатывает event loop - без обращения к зависимостям"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    """Готовность к трафику: БД доступна и подготовлена; MinIO/RabbitMQ - для диагностики.
+
+    Отдаёт результат фоновых проверок (STARTUP_CHECK_INTERVAL_SECONDS) - частые
+    пробы не открывают новых соединений к зависимостям.
+    """
+    status = startup_manager.get_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+@app.get("/health/memory")
+async def memory_usage():
+    """RSS/PSS текущего воркера и всех воркеров gunicorn (общие страницы модели видны в PSS)"""
+    from app.core.process_metrics import get_memory_usage, get_workers_memory
+    from app.services.food_classification_model import food_model_registry
+
+    return {
+        "process": get_memory_usage(),
+        "model_inherited_from_master": food_model_registry.get_status()["inherited_from_master"],
+        **get_workers_memory()
+    }
@@ -0,0 +1,99 @@
+"""Сравнение бэкендов классификатора блюд: transformers pipeline vs ONNX Runtime.
+
+Запуск из каталога backend:
+    python -m scripts.benchmark_food_model --images ./samples --runs 3
+
+Выводит задержку на изображение (mean/p50/p95) для каждого бэкенда
+и долю совпадений top-1 предсказаний ONNX с эталонным pipeline.
+"""
+import argparse
+import os
+import statistics
+import time
+from typing import Dict, List
+
+from PIL import Image
+from transformers import pipeline
+
+from app.core.config import settings
+from app.services.onnx_food_classifier import OnnxFoodClassifier
+
+
+def load_images(images_dir: str, limit: int) -> List[Image.Image]:
+    if not images_dir:
+        # Без датасета - синтетические изображения (только для оценки задержки)
+        return [
+            Image.effect_noise((512, 512), 64).convert("RGB")
+            for _ in range(limit)
+        ]
+
+    images = []
+    for name in sorted(os.listdir(images_dir)):
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp")):
+            images.append(Image.open(os.path.join(images_dir, name)).convert("RGB"))
+        if len(images) >= limit:
+            break
+    return images
+
+
+def benchmark(classifier, images: List[Image.Image], runs: int) -> Dict:
+    classifier(images[0])  # прогрев
+
+    latencies = []
+    predictions = []
+    for run in range(runs):
+        for image in images:
+            started = time.perf_counter()
+            result = classifier(image)
+            latencies.append((time.perf_counter() - started) * 1000)
+            if run == 0:
+                predictions.append(result[0]["label"])
+
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1],
+        "predictions": predictions
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark food classifier backends")
+    parser.add_argument("--images", default="", help="Каталог с тестовыми фото блюд")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--onnx-dir", default=settings.ONNX_MODEL_DIR)
+    parser.add_argument("--onnx-file", default=settings.ONNX_MODEL_FILE)
+    parser.add_argument("--intra-op-threads", type=int, default=settings.ONNX_INTRA_OP_THREADS)
+    parser.add_argument("--inter-op-threads", type=int, default=settings.ONNX_INTER_OP_THREADS)
+    args = parser.parse_args()
+
+    images = load_images(args.images, args.limit)
+    print(f"Images: {len(images)}, runs: {args.runs}")
+
+    backends = {
+        "transformers": pipeline("image-classification", model=settings.FOOD_MODEL_NAME, device=-1),
+        "onnx": OnnxFoodClassifier(
+            model_dir=args.onnx_dir,
+            model_file=args.onnx_file,
+            intra_op_threads=args.intra_op_threads,
+            inter_op_threads=args.inter_op_threads
+        )
+    }
+
+    results = {name: benchmark(classifier, images, args.runs) for name, classifier in backends.items()}
+
+    print(f"{'backend':<14}{'mean, ms':>10}{'p50, ms':>10}{'p95, ms':>10}")
+    for name, result in results.items():
+        print(f"{name:<14}{result['mean_ms']:>10.1f}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+
+    reference = results["transformers"]["predictions"]
+    candidate = results["onnx"]["predictions"]
+    agreement = sum(a == b for a, b in zip(reference, candidate)) / len(reference)
+    speedup = results["transformers"]["mean_ms"] / results["onnx"]["mean_ms"]
+    print(f"top-1 agreement: {agreement:.1%}, speedup: x{speedup:.2f}")
+
+
+if __name__ == "__main__":
+    main()
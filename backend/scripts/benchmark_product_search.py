@@ -0,0 +1,224 @@
+"""Поиск товаров: ILIKE по названию против полнотекстового поиска с pg_trgm.
+
+Запуск из каталога backend (нужен Postgres из DATABASE_URL):
+    python -m scripts.benchmark_product_search --rows 1000000 --queries 200
+
+Каталог генерируется на стороне сервера (generate_series) в отдельной
+схеме search_benchmark, рабочие таблицы не затрагиваются. Запросы -
+слова из словаря каталога целиком, префиксом (ввод по буквам) и с
+опечаткой. Для каждого режима выводит задержку (mean/p50/p95) и долю
+запросов с непустым результатом. Схема удаляется после замера (--keep
+оставляет её для EXPLAIN ANALYZE).
+"""
+import argparse
+import random
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.models.database import Base
+from app.models.product import Product
+from app.services.product_search import ProductSearchService, ensure_search_indexes
+
+# Все модели нужны create_all из-за внешних ключей между таблицами
+import app.models.user  # noqa: F401
+import app.models.order  # noqa: F401
+import app.models.promotions  # noqa: F401
+import app.models.favorite  # noqa: F401
+import app.models.cart  # noqa: F401
+import app.models.analysis  # noqa: F401
+
+NOUNS = [
+    "молоко", "сыр", "творог", "кефир", "йогурт", "сметана", "масло", "хлеб",
+    "батон", "колбаса", "сосиски", "ветчина", "курица", "говядина", "свинина",
+    "лосось", "треска", "креветки", "рис", "гречка", "макароны", "мука", "сахар",
+    "чай", "кофе", "шоколад", "печенье", "сок", "вода", "яблоки", "бананы",
+    "апельсины", "картофель", "морковь", "лук", "помидоры", "огурцы", "яйца",
+    "мед", "варенье", "орехи", "грибы", "пельмени", "мороженое", "майонез"
+]
+ADJECTIVES = [
+    "свежий", "домашний", "фермерский", "натуральный", "отборный", "копченый",
+    "сливочный", "молочный", "цельнозерновой", "органический", "острый",
+    "сладкий", "классический", "деревенский", "пшеничный", "ржаной"
+]
+BRANDS = [
+    "Простоквашино", "Домик в деревне", "Вкусвилл", "Савушкин", "Черкизово",
+    "Мираторг", "Агуша", "Макфа", "Мистраль", "Бабаевский", "Красный Октябрь",
+    "Global Village", "Любятово", "Петелинка", "Экомилк", "Село Зеленое"
+]
+CATEGORIES = [
+    "Молочные продукты", "Хлеб и выпечка", "Мясо и птица", "Рыба и морепродукты",
+    "Крупы и макароны", "Бакалея", "Напитки", "Сладости", "Овощи и фрукты",
+    "Замороженные продукты", "Соусы", "Готовая еда"
+]
+
+POPULATE_SQL = [
+    """
+    INSERT INTO categories (id, name, description)
+    SELECT i, c[i], 'Категория ' || c[i]
+    FROM (SELECT CAST(:categories AS text[]) AS c) w, generate_series(1, cardinality(c)) AS s(i)
+    """,
+    """
+    INSERT INTO tags (name, description, created_at)
+    SELECT DISTINCT ON (name) name, NULL, now()
+    FROM (
+        SELECT a[1 + i % cardinality(a)] || ' ' || n[1 + (i / cardinality(a)) % cardinality(n)] AS name
+        FROM (SELECT CAST(:adjectives AS text[]) AS a, CAST(:nouns AS text[]) AS n) w,
+             generate_series(0, cardinality(a) * cardinality(n) - 1) AS s(i)
+        UNION ALL
+        SELECT unnest(CAST(:nouns AS text[]))
+    ) t
+    """,
+    """
+    INSERT INTO products (name, description, price, category_id, stock_quantity, is_active, created_at)
+    SELECT
+        initcap(a[1 + (i * 31) % cardinality(a)]) || ' ' || n[1 + (i * 17) % cardinality(n)]
+            || ' ' || b[1 + (i * 7) % cardinality(b)] || ' ' || (100 + i % 900) || ' г',
+        'Продукт ' || n[1 + (i * 17) % cardinality(n)] || ' от ' || b[1 + (i * 7) % cardinality(b)]
+            || ', ' || a[1 + (i * 13) % cardinality(a)] || ' вкус, хранить при температуре до '
+            || (2 + i % 20) || ' градусов',
+        round((30 + random() * 2000)::numeric, 2),
+        1 + i % cardinality(c),
+        i % 100,
+        i % 50 <> 0,
+        now() - make_interval(secs => i)
+    FROM (
+        SELECT CAST(:adjectives AS text[]) AS a, CAST(:nouns AS text[]) AS n,
+               CAST(:brands AS text[]) AS b, CAST(:categories AS text[]) AS c
+    ) w, generate_series(1, :rows) AS s(i)
+    """,
+    """
+    INSERT INTO product_tags (product_id, tag_id, created_at)
+    SELECT p.id, t.id, now()
+    FROM products p
+    JOIN tags t ON t.name = split_part(p.description, ' ', 2)
+    """,
+    """
+    INSERT INTO order_items (order_id, product_id, quantity, price, discount_price)
+    SELECT NULL, 1 + floor(power(random(), 3) * :rows)::int, 1 + (random() * 4)::int, 100, 0
+    FROM generate_series(1, :rows / 5)
+    """
+]
+
+
+def make_typo(word: str, rng: random.Random) -> str:
+    if len(word) < 5:
+        return word
+    position = rng.randrange(1, len(word) - 1)
+    if rng.random() < 0.5:
+        return word[:position] + word[position + 1:]  # пропущенная буква
+    return word[:position] + word[position + 1] + word[position] + word[position + 2:]  # перестановка
+
+
+def build_queries(count: int, seed: int) -> Dict[str, List[str]]:
+    rng = random.Random(seed)
+    words = [rng.choice(NOUNS + ADJECTIVES) for _ in range(count)]
+    return {
+        "exact": words,
+        "prefix": [word[:max(3, len(word) // 2)] for word in words],
+        "typo": [make_typo(word, rng) for word in words],
+        "two_words": [f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}" for _ in range(count)]
+    }
+
+
+def create_catalog(engine, rows: int):
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    params = {
+        "rows": rows, "nouns": NOUNS, "adjectives": ADJECTIVES,
+        "brands": BRANDS, "categories": CATEGORIES
+    }
+    with engine.begin() as connection:
+        for statement in POPULATE_SQL:
+            connection.execute(text(statement), params)
+    print(f"Catalog generated: {rows} products in {time.perf_counter() - started:.1f} s")
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        ensure_search_indexes(connection)
+        connection.execute(text("ANALYZE"))
+    print(f"Search indexes built in {time.perf_counter() - started:.1f} s")
+
+
+def ilike_search(db: Session, term: str, limit: int) -> List[Product]:
+    """Прежняя реализация get_products/search_products"""
+    return db.query(Product).filter(
+        Product.is_active == True,
+        Product.name.ilike(f"%{term}%")
+    ).offset(0).limit(limit).all()
+
+
+def measure(db: Session, search: Callable[[str], List[Product]], queries: List[str]) -> Dict:
+    search(queries[0])  # прогрев кэша страниц
+    latencies, found = [], 0
+    for query in queries:
+        started = time.perf_counter()
+        products = search(query)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found += bool(products)
+        db.rollback()  # set_config(..., true) и identity map не переживают запрос
+    latencies.sort()
+    return {
+        "mean": statistics.mean(latencies),
+        "p50": latencies[len(latencies) // 2],
+        "p95": latencies[int(len(latencies) * 0.95) - 1],
+        "found": found / len(queries)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--schema", default="search_benchmark")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="не удалять схему после замера")
+    args = parser.parse_args()
+
+    admin_engine = create_engine(settings.DATABASE_URL)
+    with admin_engine.begin() as connection:
+        connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {args.schema}"))
+
+    # pg_trgm остаётся в public, таблицы каталога - в схеме бенчмарка
+    engine = create_engine(
+        settings.DATABASE_URL,
+        connect_args={"options": f"-csearch_path={args.schema},public"}
+    )
+    try:
+        create_catalog(engine, args.rows)
+
+        db = sessionmaker(bind=engine)()
+        service = ProductSearchService(db)
+        modes = {
+            "ilike": lambda term: ilike_search(db, term, args.limit),
+            "fts relevance": lambda term: service.search(term, limit=args.limit),
+            "fts price_asc": lambda term: service.search(term, sort="price_asc", limit=args.limit),
+            "fts popularity": lambda term: service.search(term, sort="popularity", limit=args.limit)
+        }
+
+        print(f"\n{'queries':<10} {'mode':<16} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'found':>7}")
+        for kind, queries in build_queries(args.queries, args.seed).items():
+            for mode, search in modes.items():
+                result = measure(db, search, queries)
+                print(
+                    f"{kind:<10} {mode:<16} {result['mean']:9.1f} {result['p50']:9.1f} "
+                    f"{result['p95']:9.1f} {result['found']:7.0%}"
+                )
+        db.close()
+    finally:
+        engine.dispose()
+        if not args.keep:
+            with admin_engine.begin() as connection:
+                connection.execute(text(f"DROP SCHEMA IF EXISTS {args.schema} CASCADE"))
+        admin_engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Нагрузочная проверка индекса тегов на синтетическом корпусе.
+
+Запуск из каталога backend:
+    python -m scripts.benchmark_tag_index --tags 50000 --queries 2000
+
+Корпус строится из словаря продуктовых названий с прилагательными и
+случайными суффиксами; запросы - те же названия в другой форме, с ё,
+другим регистром и опечатками. Выводит время построения, задержку
+поиска (mean/p50/p95/p99) и долю запросов, для которых лучшим найден
+исходный тег; код выхода 1, если для какого-то запроса это не так.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from app.services.tag_index import _Snapshot, normalize
+
+BASE_WORDS = [
+    "сыр", "моцарелла", "пармезан", "помидоры", "огурцы", "курица", "говядина",
+    "свинина", "лосось", "креветки", "рис", "макароны", "мука", "сахар", "соль",
+    "перец", "лук", "чеснок", "морковь", "картофель", "грибы", "шампиньоны",
+    "сливки", "молоко", "масло", "яйца", "базилик", "укроп", "петрушка", "лимон"
+]
+ADJECTIVES = [
+    "свежий", "копченый", "твердый", "сливочный", "оливковое", "репчатый",
+    "молодой", "домашний", "фермерский", "острый", "сладкий", "вяленый"
+]
+ALPHABET = "абвгдежзийклмнопрстуфхцчшщыэюя"
+
+
+def build_corpus(size: int, rng: random.Random):
+    # Уникальны нормализованные имена: иначе у запроса два одинаково верных тега
+    names = {}
+    while len(names) < size:
+        parts = [rng.choice(BASE_WORDS)]
+        if rng.random() < 0.6:
+            parts.insert(0, rng.choice(ADJECTIVES))
+        parts.append("".join(rng.choice(ALPHABET) for _ in range(rng.randint(3, 7))))
+        name = " ".join(parts)
+        names.setdefault(normalize(name), name)
+    return list(enumerate(sorted(names.values()), start=1))
+
+
+def make_query(name: str, rng: random.Random) -> str:
+    words = name.split()
+    if rng.random() < 0.3:
+        # Опечатка (пропуск буквы) в названии продукта; прилагательное и
+        # случайный суффикс различают соседние теги, их не трогаем
+        word = words[-2]
+        position = rng.randrange(len(word))
+        words[-2] = word[:position] + word[position + 1:]
+    query = " ".join(words)
+    query = query.upper() if rng.random() < 0.2 else query
+    query = query.replace("е", "ё", 1) if rng.random() < 0.3 else query
+    return query
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark in-memory tag index")
+    parser.add_argument("--tags", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--min-score", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = build_corpus(args.tags, rng)
+
+    started = time.perf_counter()
+    snapshot = _Snapshot(corpus)
+    build_seconds = time.perf_counter() - started
+
+    # (запрос, id исходного тега); None - короткие "ингредиенты" из словаря,
+    # для них исходного тега нет, замеряется только задержка
+    queries = []
+    for _ in range(args.queries):
+        tag_id, name = rng.choice(corpus)
+        queries.append((make_query(name, rng), tag_id))
+    queries += [(word, None) for word in rng.sample(BASE_WORDS, len(BASE_WORDS))]
+
+    latencies = []
+    expected = 0
+    found = 0
+    mismatches = []
+    for query, tag_id in queries:
+        started = time.perf_counter()
+        matches = snapshot.search(query, 1, args.min_score)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if tag_id is None:
+            continue
+        expected += 1
+        if matches and matches[0].tag_id == tag_id:
+            found += 1
+        else:
+            mismatches.append((query, snapshot.names[tag_id], matches[0].name if matches else None))
+
+    latencies.sort()
+    print(f"tags: {len(corpus)}, trigrams: {len(snapshot.postings)}, build: {build_seconds:.2f}s")
+    print(f"queries: {len(queries)}, source tag ranked first: {found / expected:.1%}")
+    print(
+        f"latency ms: mean {statistics.mean(latencies):.3f}, "
+        f"p50 {latencies[len(latencies) // 2]:.3f}, "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1]:.3f}, "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.3f}, "
+        f"max {latencies[-1]:.3f}"
+    )
+    for query, source, top in mismatches[:20]:
+        print(f"MISS  {query!r}: expected {source!r}, got {top!r}")
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Проверка бюджетов SQL-запросов эндпоинтов списков (регрессии N+1).
+
+Запуск из каталога backend на базе с данными (DATABASE_URL):
+    python -m scripts.check_sql_statements --token <JWT> --admin-token <JWT> \
+        --product-id 1 --tag-id 1 --order-id 1
+
+Приложение вызывается в процессе через TestClient с включённым
+SQL_STATEMENT_COUNTING. Для каждого эндпоинта из STATEMENT_BUDGETS
+выводится число запросов на странице из --limit строк; при превышении
+бюджета код выхода 1. Эндпоинты без нужного токена или id пропускаются.
+"""
+import argparse
+import os
+import sys
+
+os.environ["SQL_STATEMENT_COUNTING"] = "true"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.core.sql_statements import STATEMENT_BUDGETS, STATEMENTS_HEADER  # noqa: E402
+from main import app  # noqa: E402
+
+# Эндпоинт -> (нужна авторизация: None/"user"/"admin", параметры пути)
+ENDPOINTS = {
+    "/products/": (None, ()),
+    "/products/search": (None, ()),
+    "/products/search/by-tags": (None, ()),
+    "/products/items/{product_id}": (None, ("product_id",)),
+    "/products/tags/{tag_id}/products": (None, ("tag_id",)),
+    "/products/admin/products": ("admin", ()),
+    "/products/admin/tags/{tag_id}/products": ("admin", ("tag_id",)),
+    "/cart/": ("user", ()),
+    "/orders/": ("user", ()),
+    "/orders/{order_id}": ("user", ("order_id",)),
+    "/orders/admin/orders": ("admin", ()),
+    "/favorites/": ("user", ())
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--token", help="JWT обычного пользователя")
+    parser.add_argument("--admin-token", help="JWT администратора")
+    parser.add_argument("--product-id", type=int)
+    parser.add_argument("--tag-id", type=int)
+    parser.add_argument("--order-id", type=int)
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--search", default="молоко")
+    parser.add_argument("--tag", default="молоко")
+    args = parser.parse_args()
+
+    tokens = {None: None, "user": args.token, "admin": args.admin_token}
+    path_values = {"product_id": args.product_id, "tag_id": args.tag_id, "order_id": args.order_id}
+    query = {
+        "/products/search": {"name": args.search},
+        "/products/search/by-tags": {"tags": [args.tag]}
+    }
+
+    client = TestClient(app)
+    failed = False
+    for route, (auth, path_params) in ENDPOINTS.items():
+        token = tokens[auth]
+        if (auth and not token) or any(path_values[name] is None for name in path_params):
+            print(f"SKIP  {route}")
+            continue
+
+        url = route.format(**{name: path_values[name] for name in path_params})
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        params = {"limit": args.limit, **query.get(route, {})}
+        response = client.get(url, params=params, headers=headers)
+
+        count = int(response.headers.get(STATEMENTS_HEADER, -1))
+        budget = STATEMENT_BUDGETS[route]
+        ok = response.status_code == 200 and 0 <= count <= budget
+        failed |= not ok
+        print(f"{'OK' if ok else 'FAIL':<5} {route}: HTTP {response.status_code}, {count} statements (budget {budget})")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
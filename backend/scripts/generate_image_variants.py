@@ -0,0 +1,67 @@
+"""Построение вариантов (WebP/AVIF) для уже загруженных изображений каталога.
+
+Запуск из каталога backend (нужны DATABASE_URL и хранилище STORAGE_BACKEND):
+    python -m scripts.generate_image_variants --concurrency 4
+
+Новые загрузки получают варианты автоматически; скрипт нужен один раз для
+изображений, загруженных до появления вариантов, и после изменения
+IMAGE_VARIANT_WIDTHS. --missing-only пропускает изображения, у которых
+уже есть вариант наибольшей ширины.
+"""
+import argparse
+import asyncio
+import time
+
+from app.core.config import settings
+from app.core.file_storage import storage
+from app.models.database import SessionLocal
+from app.models.product import Category, Product
+from app.services.image_variants import enabled_formats, image_variant_pipeline
+
+
+def _image_urls():
+    db = SessionLocal()
+    try:
+        urls = [url for (url,) in db.query(Product.image_url).filter(Product.image_url.isnot(None))]
+        urls += [url for (url,) in db.query(Category.image_url).filter(Category.image_url.isnot(None))]
+    finally:
+        db.close()
+    return sorted(set(url for url in urls if url))
+
+
+async def run(concurrency: int, missing_only: bool):
+    urls = _image_urls()
+    print(f"{len(urls)} images, widths {settings.IMAGE_VARIANT_WIDTHS}, formats {enabled_formats()}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    async def process(url: str) -> int:
+        async with semaphore:
+            return await image_variant_pipeline.generate(url, missing_only=missing_only)
+
+    results = await asyncio.gather(*(process(url) for url in urls))
+    image_variant_pipeline.shutdown()
+    storage.shutdown()
+
+    elapsed = time.perf_counter() - started
+    stats = image_variant_pipeline.get_stats()
+    print(
+        f"Done in {elapsed:.1f}s: {sum(results)} variants, "
+        f"{stats['generated']} images ok, {stats['failed']} failed"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--missing-only", action="store_true")
+    args = parser.parse_args()
+
+    # Пул процессов кодирования - по числу одновременных изображений
+    image_variant_pipeline.workers = args.concurrency
+    asyncio.run(run(args.concurrency, args.missing_only))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Профиль времени импорта приложения (python -X importtime).
+
+Запуск из каталога backend:
+    python -m scripts.profile_imports --module main --top 25
+
+Импорт выполняется в отдельном интерпретаторе, чтобы кэш модулей текущего
+процесса не искажал замер. Выводит общее время импорта и самые дорогие
+модули по накопленному времени (cumulative, вместе с зависимостями) и по
+собственному времени (self). torch, transformers и PIL не должны попадать
+в этот список - они импортируются при первом использовании.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+HEAVY_MODULES = ("torch", "transformers", "onnxruntime", "PIL", "numpy")
+
+
+def run_importtime(module: str) -> Tuple[float, str]:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        # Последние строки stderr - трейсбек ошибки импорта
+        tail = "\n".join(result.stderr.strip().splitlines()[-10:])
+        raise SystemExit(f"Import of '{module}' failed:\n{tail}")
+    return elapsed, result.stderr
+
+
+def parse_importtime(output: str) -> List[Tuple[str, int, int]]:
+    """Строки вида "import time:  self [us] | cumulative | imported package" """
+    rows = []
+    for line in output.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue
+        rows.append((parts[2].strip(), int(parts[0]), int(parts[1])))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+
+    elapsed, output = run_importtime(args.module)
+    rows = parse_importtime(output)
+
+    print(f"import {args.module}: {elapsed * 1000:.0f} ms wall (interpreter start included), {len(rows)} modules")
+
+    print(f"\nTop {args.top} by cumulative time:")
+    for name, _, cumulative in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f"  {cumulative / 1000:9.1f} ms  {name}")
+
+    print(f"\nTop {args.top} by self time:")
+    for name, self_us, _ in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"  {self_us / 1000:9.1f} ms  {name}")
+
+    heavy = sorted({name.split(".")[0] for name, _, _ in rows if name.split(".")[0] in HEAVY_MODULES})
+    if heavy:
+        print(f"\n⚠️ Heavy modules imported eagerly: {', '.join(heavy)}")
+    else:
+        print("\n✅ No heavy ML/imaging modules imported at startup")
+
+
+if __name__ == "__main__":
+    main()
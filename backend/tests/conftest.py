@@ -0,0 +1,137 @@
+"""Фикстуры тестов на базе Postgres из DATABASE_URL (схема - alembic upgrade head).
+
+Запуск из каталога backend: python -m pytest tests
+Нужны pytest и httpx (TestClient). Без доступной базы тесты пропускаются.
+"""
+import os
+import uuid
+
+# До импорта приложения: кэш каталога отвечал бы без SQL и скрыл бы N+1
+os.environ["CATALOG_CACHE_ENABLED"] = "false"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.core.security import create_access_token  # noqa: E402
+from app.core.sql_statements import count_statements, install_statement_counter  # noqa: E402
+from app.models.cart import CartItem  # noqa: E402
+from app.models.database import SessionLocal, engine  # noqa: E402
+from app.models.favorite import Favorite  # noqa: E402
+from app.models.order import Order, OrderItem  # noqa: E402
+from app.models.product import Category, Product, ProductTag, Tag  # noqa: E402
+from app.models.user import Role, User  # noqa: E402
+
+# Строк на каждую связь: с N+1 число запросов росло бы вместе с ними
+SEED_ROWS = 5
+
+
+@pytest.fixture(scope="session")
+def db():
+    try:
+        with engine.connect():
+            pass
+    except OperationalError as e:
+        pytest.skip(f"Database unavailable: {e}")
+    install_statement_counter(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(scope="session")
+def client(db):
+    from main import app
+
+    # Без with: события startup (Redis, RabbitMQ, модель) не запускаются
+    return TestClient(app)
+
+
+def _role(db, name: str) -> Role:
+    role = db.query(Role).filter(Role.name == name).first()
+    if role is None:
+        role = Role(name=name)
+        db.add(role)
+        db.flush()
+    return role
+
+
+@pytest.fixture(scope="session")
+def seeded(db):
+    """Категория, теги, товары, корзина, избранное и заказы; удаляются после тестов"""
+    suffix = uuid.uuid4().hex[:8]
+    user = User(
+        email=f"budget-user-{suffix}@example.com",
+        password_hash="-",
+        role_id=_role(db, "user").id
+    )
+    admin = User(
+        email=f"budget-admin-{suffix}@example.com",
+        password_hash="-",
+        role_id=_role(db, "admin").id
+    )
+    category = Category(name=f"Молочные продукты {suffix}")
+    tags = [Tag(name=f"молоко-{suffix}-{i}") for i in range(SEED_ROWS)]
+    db.add_all([user, admin, category, *tags])
+    db.flush()
+
+    products = [
+        Product(
+            name=f"Молоко {suffix} {i}",
+            description="Пастеризованное молоко",
+            price=80.0 + i,
+            category_id=category.id,
+            stock_quantity=100
+        )
+        for i in range(SEED_ROWS)
+    ]
+    db.add_all(products)
+    db.flush()
+
+    orders = [Order(user_id=user.id, total_amount=0.0, final_amount=0.0) for _ in range(SEED_ROWS)]
+    db.add_all(orders)
+    db.flush()
+
+    rows = []
+    for product in products:
+        rows += [ProductTag(product_id=product.id, tag_id=tag.id) for tag in tags]
+        rows.append(CartItem(user_id=user.id, product_id=product.id, quantity=1))
+        rows.append(Favorite(user_id=user.id, product_id=product.id))
+        rows += [
+            OrderItem(order_id=order.id, product_id=product.id, quantity=1, price=product.price)
+            for order in orders
+        ]
+    db.add_all(rows)
+    db.commit()
+
+    yield {
+        "user_token": create_access_token({"sub": str(user.id)}),
+        "admin_token": create_access_token({"sub": str(admin.id)}),
+        "product_id": products[0].id,
+        "tag_id": tags[0].id,
+        "tag_name": tags[0].name,
+        "order_id": orders[0].id,
+        "search": "молоко"
+    }
+
+    db.rollback()
+    product_ids = [product.id for product in products]
+    order_ids = [order.id for order in orders]
+    db.query(OrderItem).filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    db.query(Order).filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+    for model in (ProductTag, CartItem, Favorite):
+        db.query(model).filter(model.product_id.in_(product_ids)).delete(synchronize_session=False)
+    db.query(Product).filter(Product.id.in_(product_ids)).delete(synchronize_session=False)
+    db.query(Tag).filter(Tag.id.in_([tag.id for tag in tags])).delete(synchronize_session=False)
+    db.query(Category).filter(Category.id == category.id).delete(synchronize_session=False)
+    db.query(User).filter(User.id.in_([user.id, admin.id])).delete(synchronize_session=False)
+    db.commit()
+
+
+@pytest.fixture
+def sql_statements():
+    """Счётчик SQL-запросов, выполненных внутри теста"""
+    with count_statements() as counter:
+        yield counter
@@ -0,0 +1,37 @@
+"""Бюджеты SQL-запросов эндпоинтов списков (регрессии N+1)"""
+import pytest
+
+from app.core.sql_statements import STATEMENT_BUDGETS
+
+# Эндпоинт -> (токен: None/"user"/"admin", параметры пути, query-параметры)
+ENDPOINTS = {
+    "/products/": (None, (), {}),
+    "/products/search": (None, (), {"name": "search"}),
+    "/products/search/by-tags": (None, (), {"tags": "tag_name"}),
+    "/products/items/{product_id}": (None, ("product_id",), {}),
+    "/products/tags/{tag_id}/products": (None, ("tag_id",), {}),
+    "/products/admin/products": ("admin", (), {}),
+    "/products/admin/tags/{tag_id}/products": ("admin", ("tag_id",), {}),
+    "/cart/": ("user", (), {}),
+    "/orders/": ("user", (), {}),
+    "/orders/{order_id}": ("user", ("order_id",), {}),
+    "/orders/admin/orders": ("admin", (), {}),
+    "/favorites/": ("user", (), {})
+}
+
+
+def test_every_budget_is_checked():
+    assert set(ENDPOINTS) == set(STATEMENT_BUDGETS)
+
+
+@pytest.mark.parametrize("route", sorted(ENDPOINTS))
+def test_statement_budget(route, client, seeded, sql_statements):
+    auth, path_params, query = ENDPOINTS[route]
+    url = route.format(**{name: seeded[name] for name in path_params})
+    headers = {"Authorization": f"Bearer {seeded[f'{auth}_token']}"} if auth else {}
+    params = {"limit": 100, **{name: seeded[key] for name, key in query.items()}}
+
+    response = client.get(url, params=params, headers=headers)
+
+    assert response.status_code == 200, response.text
+    assert 0 < sql_statements.count <= STATEMENT_BUDGETS[route], "\n".join(sql_statements.statements)
@@ -0,0 +1,53 @@
+"""Воркер асинхронного анализа изображений.
+
+Запуск из каталога backend:
+    python worker.py
+
+Забирает задачи из очереди image_processing (POST /ai/jobs), выполняет
+распознавание и подбор товаров, пишет AnalysisHistory и публикует
+результат в fanout-обменник ai_results (его получает каждый процесс API).
+Масштабируется числом процессов независимо от API.
+"""
+import logging
+import signal
+import threading
+
+from app.core.config import settings
+from app.services.catalog_cache import catalog_cache
+from app.services.food_classification_model import food_model_registry
+from app.services.rabbitmq_consumer import message_consumer
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("analysis-worker")
+
+
+def main():
+    stop_event = threading.Event()
+
+    def handle_signal(signum, frame):
+        logger.info(f"🛑 Received signal {signum}, stopping worker...")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+
+    if settings.FOOD_MODEL_PRELOAD:
+        food_model_registry.load()
+
+    # Инвалидации каталога: индекс тегов перечитывается при изменении тегов
+    catalog_cache.start_listener()
+    message_consumer.start_consumers(['image_processing'])
+    if not message_consumer.is_running:
+        raise SystemExit(1)
+    logger.info("🚀 Analysis worker started")
+
+    stop_event.wait()
+    message_consumer.stop_consumers()
+    catalog_cache.stop_listener()
+
+
+if __name__ == "__main__":
+    main()